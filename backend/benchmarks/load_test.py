@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Load test for the chat endpoint
+Fires concurrent chat requests at a running backend (typically pointed at
+benchmarks/openai_stub.py) and reports throughput and tail latency.
+
+Usage (from backend/):
+    python benchmarks/load_test.py --requests 200 --concurrency 16 --output load.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.stats import percentile
+
+QUESTIONS = [
+    "What is the statute of limitations for sanctioning administrative violations?",
+    "Under what conditions can a fine be paid in installments?",
+    "What are the aggravating circumstances when handling a violation?",
+    "When can a violation be sanctioned without a written record?",
+    "Thời hiệu xử phạt vi phạm hành chính là bao lâu?",
+]
+
+
+def run_load_test(base_url: str, total_requests: int, concurrency: int,
+                  conversations: int, timeout: float) -> Dict[str, Any]:
+    """Create conversations, then send chat requests with bounded concurrency"""
+    api = f"{base_url}/api/conversation"
+    conversation_ids = []
+    for i in range(conversations):
+        response = requests.post(f"{api}/conversations", json={"title": f"Load test {i + 1}"}, timeout=timeout)
+        response.raise_for_status()
+        conversation_ids.append(response.json()["conversation"]["id"])
+
+    latencies = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+    session_local = threading.local()
+
+    def send(i: int):
+        session = getattr(session_local, "session", None)
+        if session is None:
+            session = session_local.session = requests.Session()
+        conversation_id = conversation_ids[i % len(conversation_ids)]
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                f"{api}/conversations/{conversation_id}/chat",
+                json={"message": QUESTIONS[i % len(QUESTIONS)]},
+                timeout=timeout
+            )
+            status = str(response.status_code)
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed_ms)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(total_requests)))
+    wall_seconds = time.perf_counter() - start
+
+    # Clean up the conversations created for the run
+    for conversation_id in conversation_ids:
+        try:
+            requests.delete(f"{api}/conversations/{conversation_id}", timeout=timeout)
+        except requests.RequestException:
+            pass
+
+    successes = statuses.get("200", 0)
+    return {
+        "created_at": datetime.now().isoformat(),
+        "base_url": base_url,
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "conversations": conversations,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(total_requests / wall_seconds, 2) if wall_seconds else 0.0,
+        "success_rps": round(successes / wall_seconds, 2) if wall_seconds else 0.0,
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p90": round(percentile(latencies, 90), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies), 1) if latencies else 0.0
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat endpoint load test")
+    parser.add_argument("--url", default="http://localhost:5000", help="Backend base URL")
+    parser.add_argument("--requests", type=int, default=100, help="Total chat requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--conversations", type=int, default=8, help="Conversations to spread requests over")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    try:
+        report = run_load_test(args.url, args.requests, args.concurrency, args.conversations, args.timeout)
+    except requests.exceptions.ConnectionError:
+        print(f"❌ Could not connect to the server. Make sure the Flask app is running on {args.url}")
+        return
+
+    latency = report["latency_ms"]
+    print(f"🏁 {report['requests']} requests, concurrency {report['concurrency']}, {report['wall_seconds']}s")
+    print(f"   throughput {report['throughput_rps']} req/s (success {report['success_rps']} req/s)")
+    print(f"   latency p50 {latency['p50']}ms p95 {latency['p95']}ms p99 {latency['p99']}ms max {latency['max']}ms")
+    print(f"   statuses {report['statuses']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
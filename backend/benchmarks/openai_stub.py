@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub server for offline end-to-end load testing
+Serves chat completions (streaming and non-streaming) and embeddings with
+configurable latency distributions, token rates and error injection.
+
+Both OpenAI-style (/v1/chat/completions) and Azure-style
+(/openai/deployments/<deployment>/chat/completions) routes are served, so the
+backend can point at it with:
+
+    OPENAI_ENDPOINT=http://localhost:8001
+    OPENAI_BASE_URL=http://localhost:8001/v1
+    OPENAI_API_KEY=stub
+
+Usage (from backend/):
+    python benchmarks/openai_stub.py --port 8001 --latency lognormal:400,0.5 \\
+        --tokens-per-second 60 --error-rate 0.02 --error-codes 429,503
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from typing import Dict, Any, List
+
+from flask import Flask, Response, jsonify, request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils.embedder import HashingEmbeddingFunction
+
+DEFAULT_REPLY = (
+    "Theo quy định của Luật Xử lý vi phạm hành chính, thời hiệu xử lý vi phạm hành chính "
+    "là 01 năm, trừ một số trường hợp đặc biệt có thời hiệu 02 năm. Cá nhân, tổ chức bị xử phạt "
+    "phải chấp hành quyết định xử phạt trong thời hạn 10 ngày kể từ ngày nhận được quyết định. "
+    "Bạn nên tham khảo ý kiến luật sư nếu cần tư vấn cho trường hợp cụ thể."
+)
+
+
+class LatencyDistribution:
+    """
+    Latency sampler parsed from a spec string (milliseconds):
+        fixed:200 | uniform:100,300 | normal:200,50 | lognormal:200,0.5 (median, sigma)
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Sample a latency in seconds"""
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0] if p else 0.0
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        else:
+            value = rng.lognormvariate(0, p[1] if len(p) > 1 else 0.5) * p[0]
+        return max(0.0, value) / 1000
+
+
+class StubState:
+    """Runtime configuration and counters, adjustable through /_stub/config"""
+
+    def __init__(self, args):
+        self.lock = threading.Lock()
+        self.rng = random.Random(args.seed)
+        self.latency = LatencyDistribution(args.latency)
+        self.embedding_latency = LatencyDistribution(args.embedding_latency)
+        self.tokens_per_second = args.tokens_per_second
+        self.completion_tokens = args.completion_tokens
+        self.error_rate = args.error_rate
+        self.error_codes = [int(code) for code in args.error_codes.split(",") if code]
+        self.embedding = HashingEmbeddingFunction(args.embedding_dimensions)
+        self.stats = {"chat": 0, "chat_stream": 0, "embeddings": 0, "errors": 0}
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def draw(self, distribution: LatencyDistribution) -> float:
+        with self.lock:
+            return distribution.sample(self.rng)
+
+    def should_fail(self) -> int:
+        """Return an HTTP status to inject, or 0"""
+        with self.lock:
+            if self.error_codes and self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return self.rng.choice(self.error_codes)
+        return 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency.spec,
+            "embedding_latency": self.embedding_latency.spec,
+            "tokens_per_second": self.tokens_per_second,
+            "completion_tokens": self.completion_tokens,
+            "error_rate": self.error_rate,
+            "error_codes": self.error_codes,
+            "embedding_dimensions": self.embedding.dimensions,
+            "stats": dict(self.stats)
+        }
+
+
+def reply_tokens(count: int) -> List[str]:
+    """Build a reply of `count` word tokens by cycling the canned answer"""
+    words = DEFAULT_REPLY.split()
+    return [words[i % len(words)] for i in range(count)]
+
+
+def error_response(status: int):
+    return jsonify({
+        "error": {
+            "message": f"Injected error {status}",
+            "type": "stub_injected_error",
+            "code": status
+        }
+    }), status
+
+
+def create_stub_app(state: StubState) -> Flask:
+    """Create the stub Flask application"""
+    app = Flask(__name__)
+
+    def chat_completions(deployment=None):
+        body = request.get_json(silent=True) or {}
+        model = body.get("model") or deployment or "stub-model"
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        completion_tokens = min(body.get("max_tokens") or state.completion_tokens, state.completion_tokens)
+        tokens = reply_tokens(completion_tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        status = state.should_fail()
+        time.sleep(state.draw(state.latency))  # time to first token
+        if status:
+            return error_response(status)
+
+        token_delay = 1.0 / state.tokens_per_second if state.tokens_per_second > 0 else 0.0
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)
+        }
+
+        if body.get("stream"):
+            state.count("chat_stream")
+
+            def generate():
+                for i, token in enumerate(tokens):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"role": "assistant", "content": token} if i == 0 else {"content": " " + token},
+                            "finish_reason": None
+                        }]
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    if token_delay:
+                        time.sleep(token_delay)
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    final["usage"] = usage
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return Response(generate(), mimetype="text/event-stream")
+
+        state.count("chat")
+        if token_delay:
+            time.sleep(token_delay * len(tokens))
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(tokens)},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    def embeddings(deployment=None):
+        body = request.get_json(silent=True) or {}
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        status = state.should_fail()
+        time.sleep(state.draw(state.embedding_latency))
+        if status:
+            return error_response(status)
+
+        state.count("embeddings")
+        data = [
+            {"object": "embedding", "index": i, "embedding": state.embedding(str(text))}
+            for i, text in enumerate(inputs)
+        ]
+        tokens = sum(len(str(text).split()) for text in inputs)
+        return jsonify({
+            "object": "list",
+            "data": data,
+            "model": body.get("model") or deployment or "stub-embedding",
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    # OpenAI-style routes
+    for prefix in ("", "/v1"):
+        app.add_url_rule(f"{prefix}/chat/completions", f"chat{prefix}", chat_completions, methods=["POST"])
+        app.add_url_rule(f"{prefix}/embeddings", f"embeddings{prefix}", embeddings, methods=["POST"])
+
+    # Azure-style routes
+    app.add_url_rule("/openai/deployments/<deployment>/chat/completions", "azure_chat",
+                     chat_completions, methods=["POST"])
+    app.add_url_rule("/openai/deployments/<deployment>/embeddings", "azure_embeddings",
+                     embeddings, methods=["POST"])
+
+    @app.route("/_stub/config", methods=["GET", "POST"])
+    def stub_config():
+        """Inspect or change the stub behaviour at runtime"""
+        if request.method == "POST":
+            data = request.get_json(silent=True) or {}
+            with state.lock:
+                if "latency" in data:
+                    state.latency = LatencyDistribution(data["latency"])
+                if "embedding_latency" in data:
+                    state.embedding_latency = LatencyDistribution(data["embedding_latency"])
+                for key in ("tokens_per_second", "completion_tokens", "error_rate"):
+                    if key in data:
+                        setattr(state, key, type(getattr(state, key))(data[key]))
+                if "error_codes" in data:
+                    state.error_codes = [int(code) for code in data["error_codes"]]
+        return jsonify(state.to_dict())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:300,0.4",
+                        help="Chat time-to-first-token distribution in ms (fixed|uniform|normal|lognormal)")
+    parser.add_argument("--embedding-latency", default="fixed:20", help="Embedding latency distribution in ms")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Completion token rate, 0 = instant")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="Tokens per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-codes", default="429,500,503", help="Status codes used for injected errors")
+    parser.add_argument("--embedding-dimensions", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=42, help="Seed for latency and error sampling")
+    args = parser.parse_args()
+
+    state = StubState(args)
+    app = create_stub_app(state)
+    print(f"🧪 OpenAI stub listening on http://{args.host}:{args.port} ({json.dumps(state.to_dict())})")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval benchmark for the law corpus
+Measures recall@k, MRR and per-query latency of EmbeddingService / RAGService
+against a labeled question -> article/page set, and writes a JSON report.
+
+Usage (from backend/):
+    python benchmarks/retrieval/run_benchmark.py
+    python benchmarks/retrieval/run_benchmark.py --output report.json --compare previous.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, BACKEND_DIR)
+from utils.stats import percentile
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), "law_qa.json")
+K_VALUES = [1, 3, 5, 10]
+
+_PAGE_PATTERN = re.compile(r"^\[Page (\d+)\]")
+
+
+def is_relevant(chunk: str, query: Dict[str, Any]) -> bool:
+    """A chunk is relevant if it comes from an expected page or contains an expected article heading"""
+    match = _PAGE_PATTERN.match(chunk)
+    if match and int(match.group(1)) in query.get("pages", []):
+        return True
+    return any(f"Article {article}." in chunk for article in query.get("articles", []))
+
+
+def evaluate(name: str, search, queries: List[Dict[str, Any]], max_k: int) -> Dict[str, Any]:
+    """
+    Run every query through a search function and compute metrics
+
+    Args:
+        name (str): Configuration name
+        search (Callable): Function (question, k) -> List[str]
+        queries (List[Dict]): Labeled queries
+        max_k (int): Number of results requested per query
+    """
+    per_query = []
+    latencies = []
+    hits_at_k = {k: 0 for k in K_VALUES if k <= max_k}
+    reciprocal_ranks = []
+
+    for query in queries:
+        start = time.perf_counter()
+        results = search(query["question"], max_k)
+        latency_ms = (time.perf_counter() - start) * 1000
+        latencies.append(latency_ms)
+
+        first_rank = next(
+            (rank for rank, chunk in enumerate(results, start=1) if is_relevant(chunk, query)),
+            None
+        )
+        for k in hits_at_k:
+            if first_rank is not None and first_rank <= k:
+                hits_at_k[k] += 1
+        reciprocal_ranks.append(1.0 / first_rank if first_rank else 0.0)
+
+        per_query.append({
+            "id": query["id"],
+            "first_relevant_rank": first_rank,
+            "latency_ms": round(latency_ms, 3),
+            "retrieved_pages": [
+                int(m.group(1)) for m in (_PAGE_PATTERN.match(chunk) for chunk in results) if m
+            ]
+        })
+
+    total = len(queries) or 1
+    return {
+        "name": name,
+        "metrics": {
+            **{f"recall@{k}": round(hits / total, 4) for k, hits in hits_at_k.items()},
+            "mrr": round(sum(reciprocal_ranks) / total, 4)
+        },
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0
+        },
+        "per_query": per_query
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Current commit hash, if available"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def compare_reports(current: Dict[str, Any], previous: Dict[str, Any]):
+    """Print metric deltas against a previous report"""
+    print("\nComparison with previous report:")
+    previous_results = {r["name"]: r for r in previous.get("results", [])}
+    for result in current["results"]:
+        old = previous_results.get(result["name"])
+        if not old:
+            print(f"  {result['name']}: no previous result")
+            continue
+        deltas = []
+        for metric, value in result["metrics"].items():
+            if metric in old["metrics"]:
+                deltas.append(f"{metric} {value:.4f} ({value - old['metrics'][metric]:+.4f})")
+        p50, old_p50 = result["latency_ms"]["p50"], old["latency_ms"]["p50"]
+        deltas.append(f"p50 {p50:.2f}ms ({p50 - old_p50:+.2f}ms)")
+        print(f"  {result['name']}: " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark for the law corpus")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Labeled question set (JSON)")
+    parser.add_argument("--pdf", default=None, help="PDF to index (defaults to the dataset document)")
+    parser.add_argument("--k", type=int, default=10, help="Results requested per query")
+    parser.add_argument("--embedding", choices=["hashing", "openai"], default="hashing",
+                        help="Embedding backend; 'hashing' is deterministic and offline")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--compare", default=None, help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    # Configure before importing services, they read the config at import time
+    os.environ["EMBEDDING_BACKEND"] = args.embedding
+    os.chdir(BACKEND_DIR)
+
+    from utils.embedder import embedding_service
+    from services.rag_service import rag_service
+
+    with open(args.dataset, encoding="utf-8") as f:
+        dataset = json.load(f)
+    queries = dataset["queries"]
+    pdf_path = os.path.abspath(args.pdf or dataset["document"])
+
+    start = time.perf_counter()
+    load_result = rag_service.load_documents(pdf_path)
+    index_build_ms = (time.perf_counter() - start) * 1000
+    if not load_result.get("success"):
+        print(f"❌ Could not build index: {load_result.get('error')}")
+        sys.exit(1)
+
+    configurations = [
+        ("embedding_search", lambda q, k: embedding_service.search(q, rag_service.collection, k)),
+        ("rag_search", lambda q, k: rag_service.search_documents(q, k=k, rerank=False)),
+        ("rag_search_rerank", lambda q, k: rag_service.search_documents(q, k=k, rerank=True)),
+    ]
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "dataset": os.path.relpath(args.dataset, BACKEND_DIR),
+        "document": os.path.relpath(pdf_path, BACKEND_DIR),
+        "embedding_backend": args.embedding,
+        "k": args.k,
+        "query_count": len(queries),
+        "index": {
+            "chunks": load_result.get("chunks_count"),
+            "build_ms": round(index_build_ms, 1)
+        },
+        "results": [evaluate(name, search, queries, args.k) for name, search in configurations]
+    }
+
+    print(f"📚 {report['index']['chunks']} chunks indexed in {report['index']['build_ms']}ms, "
+          f"{len(queries)} queries, embedding={args.embedding}")
+    for result in report["results"]:
+        metrics = ", ".join(f"{name} {value:.3f}" for name, value in result["metrics"].items())
+        latency = result["latency_ms"]
+        print(f"  {result['name']:<20} {metrics} | p50 {latency['p50']:.2f}ms p95 {latency['p95']:.2f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📝 Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare_reports(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -32,10 +32,90 @@ class Config:
     OPENAI_ENDPOINT = os.environ.get('OPENAI_ENDPOINT')
     OPENAI_API_KEY_EMBEDDING = os.environ.get('OPENAI_API_KEY_EMBEDDING')
     
+    EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'openai')  # 'openai' or 'hashing' (offline)
+    
+    # Retrieval and reranking configuration for RAG features
+    RAG_MAX_SEARCH_RESULTS = int(os.environ.get('RAG_MAX_SEARCH_RESULTS', '50'))
+    RAG_RERANK_ENABLED = os.environ.get('RAG_RERANK_ENABLED', 'false').lower() == 'true'  # Opt-in
+    RAG_RERANK_CANDIDATES = int(os.environ.get('RAG_RERANK_CANDIDATES', '50'))
+    RAG_RERANK_BUDGET_MS = float(os.environ.get('RAG_RERANK_BUDGET_MS', '300'))
+    RAG_RERANK_BATCH_SIZE = int(os.environ.get('RAG_RERANK_BATCH_SIZE', '16'))  # Budget is checked between batches
+    RAG_RERANK_MODEL_PATH = os.environ.get('RAG_RERANK_MODEL_PATH')  # Local cross-encoder dir, lexical if unset
+    
+    # Storage backend for conversations/messages: 'tinydb', 'sqlite' or 'log'
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'tinydb')
+    
     # Database paths for TinyDB
     CONVERSATIONS_DB = os.environ.get('CONVERSATIONS_DB', 'data/conversations.json')
     MESSAGES_DB = os.environ.get('MESSAGES_DB', 'data/messages.json')
     DATA_FILES_DB = os.environ.get('DATA_FILES_DB', 'data/data_files.json')
+    
+    # Database path for SQLite (WAL mode)
+    SQLITE_DB = os.environ.get('SQLITE_DB', 'data/chat.db')
+    
+    # Write-behind (tắt mặc định): ghi conversations/messages qua một writer thread, request không chờ
+    # disk I/O nhưng trả về thành công trước khi record được ghi. Record ghi lỗi được lưu vào
+    # DB_WRITE_BEHIND_DEAD_LETTERS để xem/ghi lại qua /api/conversation/storage/dead-letters
+    DB_WRITE_BEHIND = os.environ.get('DB_WRITE_BEHIND', 'false').lower() == 'true'
+    DB_WRITE_BEHIND_FLUSH_MS = int(os.environ.get('DB_WRITE_BEHIND_FLUSH_MS', '50'))
+    DB_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('DB_WRITE_BEHIND_BATCH_SIZE', '500'))
+    DB_WRITE_BEHIND_DEAD_LETTERS = os.environ.get('DB_WRITE_BEHIND_DEAD_LETTERS', 'data/write_behind_dead_letters.ndjson')
+    
+    # Append-only log backend (DB_BACKEND=log)
+    LOG_DB = os.environ.get('LOG_DB', 'data/chat.log')
+    LOG_FSYNC = os.environ.get('LOG_FSYNC', 'interval')  # 'always', 'interval' or 'never'
+    LOG_FSYNC_INTERVAL_MS = int(os.environ.get('LOG_FSYNC_INTERVAL_MS', '1000'))
+    LOG_GROUP_COMMIT_MS = float(os.environ.get('LOG_GROUP_COMMIT_MS', '0'))
+    LOG_COMPACT_MIN_BYTES = int(os.environ.get('LOG_COMPACT_MIN_BYTES', str(4 * 1024 * 1024)))
+    LOG_COMPACT_RATIO = float(os.environ.get('LOG_COMPACT_RATIO', '0.5'))
+    
+    # Archive: messages của conversations không hoạt động quá ARCHIVE_AFTER_DAYS ngày được chuyển sang
+    # file nén trong ARCHIVE_DIR và nạp lại khi được mở. Tắt mặc định (0); bật bằng số ngày, ví dụ ARCHIVE_AFTER_DAYS=7
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'data/archive')
+    ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', '0'))
+    ARCHIVE_INTERVAL_MINUTES = float(os.environ.get('ARCHIVE_INTERVAL_MINUTES', '60'))
+    
+    # Change feed (GET /conversations/<id>/changes): số thay đổi gần nhất giữ lại cho mỗi conversation,
+    # thời gian long-poll tối đa và số request long-poll được chờ cùng lúc
+    CHANGE_FEED_HISTORY = int(os.environ.get('CHANGE_FEED_HISTORY', '200'))
+    CHANGE_FEED_MAX_WAIT_SECONDS = float(os.environ.get('CHANGE_FEED_MAX_WAIT_SECONDS', '30'))
+    CHANGE_FEED_MAX_WAITERS = int(os.environ.get('CHANGE_FEED_MAX_WAITERS', '100'))
+    
+    # TTS: văn bản dài được tách thành câu (tối đa TTS_MAX_SEGMENT_CHARS ký tự), tổng hợp theo batch
+    # TTS_BATCH_SIZE câu mỗi lần và nối lại bằng crossfade TTS_CROSSFADE_MS mili giây
+    TTS_BATCH_SIZE = int(os.environ.get('TTS_BATCH_SIZE', '4'))
+    TTS_MAX_SEGMENT_CHARS = int(os.environ.get('TTS_MAX_SEGMENT_CHARS', '300'))
+    TTS_CROSSFADE_MS = float(os.environ.get('TTS_CROSSFADE_MS', '30'))
+    
+    # Cache audio TTS theo hash của (model, sampling rate, văn bản đã chuẩn hóa), xóa file ít dùng nhất
+    # khi vượt TTS_CACHE_MAX_MB (0 để tắt); mặc định nằm trong thư mục tạm của hệ thống
+    TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR')
+    TTS_CACHE_MAX_MB = float(os.environ.get('TTS_CACHE_MAX_MB', '256'))
+    
+    # Tối ưu inference TTS trên CPU (mặc định giữ nguyên float32 + no_grad; so sánh bằng tools/benchmark_tts.py):
+    # TTS_INFERENCE_MODE: no_grad | inference_mode, TTS_QUANTIZE: none | int8 (dynamic quantization các lớp Linear),
+    # TTS_COMPILE: bọc model bằng torch.compile, TTS_NUM_THREADS: số intra-op threads của torch (0 = mặc định)
+    TTS_INFERENCE_MODE = os.environ.get('TTS_INFERENCE_MODE', 'no_grad')
+    TTS_QUANTIZE = os.environ.get('TTS_QUANTIZE', 'none')
+    TTS_COMPILE = os.environ.get('TTS_COMPILE', 'false').lower() == 'true'
+    TTS_NUM_THREADS = int(os.environ.get('TTS_NUM_THREADS', '0'))
+    
+    # Backend chạy model TTS: torch (transformers) hoặc onnx (ONNX Runtime, cần export trước bằng
+    # tools/export_tts_onnx.py vào TTS_ONNX_DIR)
+    TTS_BACKEND = os.environ.get('TTS_BACKEND', 'torch')
+    TTS_ONNX_DIR = os.environ.get('TTS_ONNX_DIR', 'models/mms-tts-vie-onnx')
+    
+    # Job TTS bất đồng bộ (/api/tts/jobs): tắt mặc định (0). Với TTS_WORKERS > 0, inference chạy trong
+    # TTS_WORKERS process riêng, mỗi process giữ một bản model; các endpoint đồng bộ (/convert,
+    # /messages/<id>/tts) và /stream cũng chạy qua pool, server không nạp model.
+    # Quá TTS_QUEUE_MAX job/stream chưa xong thì trả 429. Job đã xong được giữ TTS_JOB_TTL_SECONDS
+    # giây để client lấy kết quả; ?wait= chờ tối đa TTS_JOB_MAX_WAIT_SECONDS giây. Endpoint đồng bộ chờ tối đa
+    # TTS_SYNC_TIMEOUT_SECONDS giây rồi trả 504 kèm status_url (/api/tts/jobs/<id>) để client poll tiếp
+    TTS_WORKERS = int(os.environ.get('TTS_WORKERS', '0'))
+    TTS_QUEUE_MAX = int(os.environ.get('TTS_QUEUE_MAX', '16'))
+    TTS_JOB_TTL_SECONDS = float(os.environ.get('TTS_JOB_TTL_SECONDS', '900'))
+    TTS_JOB_MAX_WAIT_SECONDS = float(os.environ.get('TTS_JOB_MAX_WAIT_SECONDS', '30'))
+    TTS_SYNC_TIMEOUT_SECONDS = float(os.environ.get('TTS_SYNC_TIMEOUT_SECONDS', '120'))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -0,0 +1,120 @@
+"""
+Background warm-up of slow subsystems (RAG ingest, TTS model)
+Lets the server accept traffic immediately while models and indexes load
+"""
+import threading
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Subsystem states
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+DISABLED = "disabled"
+
+TERMINAL_STATES = (READY, FAILED, DISABLED)
+
+
+class WarmupTask:
+    """State of one subsystem warm-up"""
+
+    def __init__(self, name: str, func: Callable, enabled: bool = True):
+        self.name = name
+        self.func = func
+        self.state = PENDING if enabled else DISABLED
+        self.progress = 0.0
+        self.message = None if enabled else "Dependencies missing"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.thread = None
+
+    def report(self, progress: float, message: Optional[str] = None):
+        """Progress callback handed to the warm-up function (0.0 - 1.0)"""
+        self.progress = max(0.0, min(1.0, progress))
+        if message:
+            self.message = message
+
+    def run(self):
+        """Run the warm-up function; it returns True on success"""
+        self.state = RUNNING
+        self.started_at = datetime.now().isoformat()
+        logger.info(f"🔥 Warming up {self.name}...")
+        try:
+            ok = self.func(self.report)
+            if ok is False:
+                self.state = FAILED
+                self.error = self.message or "Warm-up returned failure"
+                logger.warning(f"⚠️  Warm-up of {self.name} failed")
+            else:
+                self.state = READY
+                self.progress = 1.0
+                logger.info(f"✅ {self.name} is ready")
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            logger.error(f"❌ Warm-up of {self.name} failed: {e}")
+        finally:
+            self.finished_at = datetime.now().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class WarmupManager:
+    """Registry of subsystem warm-ups, each run in its own daemon thread"""
+
+    def __init__(self):
+        self.tasks: Dict[str, WarmupTask] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, func: Callable, enabled: bool = True) -> WarmupTask:
+        """
+        Register a subsystem warm-up
+
+        Args:
+            name (str): Subsystem name reported by the readiness endpoint
+            func (Callable): Function taking a progress callback, returns False on failure
+            enabled (bool): Disabled subsystems are reported but never run
+        """
+        with self._lock:
+            task = WarmupTask(name, func, enabled)
+            self.tasks[name] = task
+            return task
+
+    def start_all(self):
+        """Start every pending warm-up in a background thread"""
+        with self._lock:
+            for task in self.tasks.values():
+                if task.state != PENDING or task.thread is not None:
+                    continue
+                task.thread = threading.Thread(target=task.run, name=f"warmup-{task.name}", daemon=True)
+                task.thread.start()
+
+    def is_ready(self) -> bool:
+        """True once every subsystem reached a terminal state"""
+        return all(task.state in TERMINAL_STATES for task in self.tasks.values())
+
+    def get_status(self) -> Dict[str, Any]:
+        """Readiness report for every registered subsystem"""
+        subsystems = {name: task.to_dict() for name, task in self.tasks.items()}
+        return {
+            "ready": self.is_ready(),
+            "degraded": any(task.state == FAILED for task in self.tasks.values()),
+            "subsystems": subsystems
+        }
+
+
+# Global warm-up manager
+warmup_manager = WarmupManager()
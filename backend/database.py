@@ -1,44 +1,538 @@
 # ========== IMPORTS ==========
-from tinydb import TinyDB, Query
+import atexit
+import itertools
+from contextlib import contextmanager, ExitStack
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Tuple, Iterator, Iterable
+from tinydb import TinyDB
 from config.config import Config
+from storage.search_index import MessageSearchIndex, make_snippet
+from storage.archive import ConversationArchive
+from storage.aggregates import VERSION_FIELD
+from storage.change_feed import (
+    ChangeFeed, MESSAGE_ADDED, MESSAGE_DELETED, CONVERSATION_UPDATED, CONVERSATION_DELETED, RESET
+)
+from utils.context_refs import compact_message
+from storage.cursors import (
+    CONVERSATION_ORDER_FIELDS, OLDEST_TIMESTAMP_CURSOR,
+    encode_conversation_cursor, decode_conversation_cursor, conversation_sort_key
+)
 import logging
 
 # ========== LOGGER SETUP ==========
 logger = logging.getLogger(__name__)
 
+# Số lock chia theo conversation id
+CONVERSATION_LOCK_STRIPES = 64
+
+def create_store(config):
+    """Tạo storage backend cho conversations/messages theo config.DB_BACKEND"""
+    backend = (config.DB_BACKEND or 'tinydb').lower()
+
+    if backend == 'sqlite':
+        from storage.sqlite_store import SQLiteStore
+        return SQLiteStore(config.SQLITE_DB)
+
+    if backend == 'log':
+        from storage.log_store import LogStore
+        return LogStore(
+            config.LOG_DB,
+            fsync_policy=config.LOG_FSYNC,
+            fsync_interval_ms=config.LOG_FSYNC_INTERVAL_MS,
+            group_commit_ms=config.LOG_GROUP_COMMIT_MS,
+            compact_min_bytes=config.LOG_COMPACT_MIN_BYTES,
+            compact_ratio=config.LOG_COMPACT_RATIO
+        )
+
+    if backend == 'tinydb':
+        from storage.tinydb_store import TinyDBStore
+        return TinyDBStore(config.CONVERSATIONS_DB, config.MESSAGES_DB)
+
+    raise ValueError(f"Unknown DB_BACKEND: {config.DB_BACKEND}")
+
 class DatabaseManager:
     """Quản lý database tập trung"""
-    
+
     def __init__(self, config=None):
         """Khởi tạo database manager"""
         if config is None:
             config = Config
-        
-        self.conversations_db = TinyDB(config.CONVERSATIONS_DB)
-        self.messages_db = TinyDB(config.MESSAGES_DB)
+
+        self.store = create_store(config)
+        if config.DB_WRITE_BEHIND:
+            from storage.write_behind import WriteBehindStore
+            self.store = WriteBehindStore(
+                self.store,
+                flush_interval_ms=config.DB_WRITE_BEHIND_FLUSH_MS,
+                max_batch_size=config.DB_WRITE_BEHIND_BATCH_SIZE,
+                dead_letter_path=config.DB_WRITE_BEHIND_DEAD_LETTERS
+            )
+            # Ghi nốt hàng đợi khi process thoát
+            atexit.register(self.close_all)
         self.data_files_db = TinyDB(config.DATA_FILES_DB)
-        
+
+        # Full-text index trên messages, build lúc warm-up hoặc lần search đầu tiên
+        self.search_index = MessageSearchIndex()
+
+        # Lock theo conversation (chia stripe): tuần tự hóa ghi, archive/nạp lại và publish change feed
+        # của cùng một conversation mà không chặn ghi của các conversation khác (group commit của log store)
+        self._conversation_locks = [threading.RLock() for _ in range(CONVERSATION_LOCK_STRIPES)]
+
+        # Nhật ký thay đổi gần đây cho long-polling, đánh số theo version của conversation
+        self.change_feed = ChangeFeed(
+            history_size=config.CHANGE_FEED_HISTORY,
+            max_waiters=config.CHANGE_FEED_MAX_WAITERS
+        )
+
+        # Kho lạnh cho messages của conversations không hoạt động; record conversation vẫn ở store
+        self.archive = ConversationArchive(config.ARCHIVE_DIR)
+        self._archiver = None
+        self._archiver_stop = threading.Event()
+        self._recover_archive()
+
+        # Version của danh sách conversations: tăng ở mỗi lần ghi qua DatabaseManager; epoch khác nhau
+        # giữa các lần khởi động nên ETag cũ không bao giờ khớp nhầm sau restart
+        self._list_epoch = uuid.uuid4().hex[:8]
+        self._list_changes = itertools.count(1)
+        self._list_version = 0
+
         logger.info(f"📊 Initialized databases:")
-        logger.info(f"   - Conversations: {config.CONVERSATIONS_DB}")
-        logger.info(f"   - Messages: {config.MESSAGES_DB}")
+        if self.store.name == 'sqlite':
+            logger.info(f"   - Conversations/Messages (SQLite): {config.SQLITE_DB}")
+        elif self.store.name == 'log':
+            logger.info(f"   - Conversations/Messages (append-only log, fsync={config.LOG_FSYNC}): {config.LOG_DB}")
+        else:
+            logger.info(f"   - Conversations: {config.CONVERSATIONS_DB}")
+            logger.info(f"   - Messages: {config.MESSAGES_DB}")
         logger.info(f"   - Data Files: {config.DATA_FILES_DB}")
-    
-    def get_conversations_db(self):
-        """Lấy conversations database"""
-        return self.conversations_db
-    
-    def get_messages_db(self):
-        """Lấy messages database"""
-        return self.messages_db
-    
+        logger.info(f"   - Archive: {config.ARCHIVE_DIR} ({len(self.archive.ids())} conversations)")
+        if config.DB_WRITE_BEHIND:
+            logger.info(f"   - Write-behind: flush mỗi {config.DB_WRITE_BEHIND_FLUSH_MS}ms, "
+                        f"batch tối đa {config.DB_WRITE_BEHIND_BATCH_SIZE}, "
+                        f"dead letters: {config.DB_WRITE_BEHIND_DEAD_LETTERS}")
+
+    # ========== LOCKS ==========
+
+    def _conversation_lock(self, conversation_id: str) -> threading.RLock:
+        return self._conversation_locks[hash(conversation_id) % len(self._conversation_locks)]
+
+    @contextmanager
+    def _locked_conversations(self, conversation_ids: Iterable[str]):
+        """Giữ lock của nhiều conversations cùng lúc (lấy theo thứ tự stripe để không deadlock)"""
+        stripes = sorted({hash(c) % len(self._conversation_locks) for c in conversation_ids})
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._conversation_locks[stripe])
+            yield
+
+    # ========== CONVERSATIONS ==========
+
+    def insert_conversation(self, conversation: Dict[str, Any]):
+        """Thêm conversation mới"""
+        self.store.insert_conversation(conversation)
+        self._touch()
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy conversation theo ID"""
+        return self.store.get_conversation(conversation_id)
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả conversations, mới nhất trước"""
+        return self.store.list_conversations()
+
+    def list_conversations_page(self, limit: int, order_by: str = 'updated_at', cursor: Optional[str] = None,
+                                fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Lấy một trang conversations mới nhất trước, trả về (conversations, next_cursor)
+
+        `fields` giới hạn các field trả về (projection); next_cursor là None khi đã hết.
+        """
+        if order_by not in CONVERSATION_ORDER_FIELDS:
+            raise ValueError(f"order_by phải là một trong {', '.join(CONVERSATION_ORDER_FIELDS)}")
+        after = decode_conversation_cursor(cursor) if cursor else None
+        conversations, has_more = self.store.list_conversations_page(limit, order_by, after)
+
+        next_cursor = None
+        if has_more and conversations:
+            next_cursor = encode_conversation_cursor(*conversation_sort_key(conversations[-1], order_by))
+        if fields:
+            conversations = [{field: c.get(field) for field in fields} for c in conversations]
+        return conversations, next_cursor
+
+    def update_conversation(self, conversation_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cập nhật conversation, trả về None nếu không tồn tại"""
+        with self._conversation_lock(conversation_id):
+            updated = self.store.update_conversation(conversation_id, fields)
+            if updated is not None:
+                self.change_feed.publish(conversation_id, updated.get(VERSION_FIELD) or 0, CONVERSATION_UPDATED)
+        self._touch()
+        return updated
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Xóa conversation và tất cả messages của nó (kể cả bản archive)"""
+        with self._conversation_lock(conversation_id):
+            version = self.conversation_version(conversation_id)
+            self.archive.delete(conversation_id)
+            deleted = self.store.delete_conversation(conversation_id)
+            if deleted and version is not None:
+                # Đánh thức các long-poll đang chờ; lần đọc tiếp theo của chúng sẽ thấy 404
+                self.change_feed.publish(conversation_id, version + 1, CONVERSATION_DELETED)
+        self.search_index.remove_conversation(conversation_id)
+        self._touch()
+        return deleted
+
+    # ========== MESSAGES ==========
+
+    def insert_message(self, message: Dict[str, Any]):
+        """Thêm message mới; message_count, last_message_at, total_tokens được cập nhật cùng lúc"""
+        message = compact_message(message)
+        # Giữ lock của conversation để job archive không chuyển nó đi giữa chừng
+        conversation_id = message.get('conversation_id')
+        with self._conversation_lock(conversation_id):
+            self._ensure_hot(conversation_id)
+            self.store.insert_message(message)
+            self._publish(conversation_id, MESSAGE_ADDED, message.get('id'))
+        self.search_index.add_message(message)
+        self._touch()
+
+    def delete_message(self, message_id: str) -> bool:
+        """Xóa một message và cập nhật các field tổng hợp của conversation (nạp lại nếu đã archive)"""
+        message = self.store.get_message(message_id)
+        if message is None:
+            archived_in = self.archive.conversation_of(message_id)
+            if archived_in is None:
+                return False
+            self._ensure_hot(archived_in)
+            message = self.store.get_message(message_id)
+            if message is None:
+                return False
+        conversation_id = message.get('conversation_id')
+        with self._conversation_lock(conversation_id):
+            deleted = self.store.delete_message(message_id)
+            if deleted:
+                self._publish(conversation_id, MESSAGE_DELETED, message_id)
+        self.search_index.remove_message(message_id)
+        self._touch()
+        return deleted
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy message theo ID; message đã archive được đọc thẳng từ archive, không nạp lại"""
+        message = self.store.get_message(message_id)
+        if message is None and self.archive.conversation_of(message_id):
+            message = self.archive.read_message(message_id)
+        return message
+
+    def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Lấy tất cả messages của conversation theo thứ tự thời gian"""
+        self._ensure_hot(conversation_id)
+        return self.store.get_messages(conversation_id)
+
+    def get_messages_page(self, conversation_id: str, limit: int,
+                          before: Optional[str] = None, after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Lấy một trang messages theo cursor (message id hoặc timestamp), trả về (messages, has_more)"""
+        self._ensure_hot(conversation_id)
+        return self.store.get_messages_page(conversation_id, limit, before=before, after=after)
+
+    def get_recent_messages(self, conversation_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Lấy `limit` messages gần nhất theo thứ tự thời gian, không đọc toàn bộ lịch sử"""
+        self._ensure_hot(conversation_id)
+        messages, _ = self.store.get_messages_page(conversation_id, limit)
+        return messages
+
+    def iter_conversation_messages(self, conversation_id: str, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Duyệt messages của conversation theo thứ tự thời gian; bản archive được đọc thẳng, không nạp lại"""
+        record = self.archive.read(conversation_id)
+        if record is not None:
+            yield from record['messages']
+            return
+
+        cursor, has_more = OLDEST_TIMESTAMP_CURSOR, True
+        while has_more:
+            messages, has_more = self.store.get_messages_page(conversation_id, page_size, after=cursor)
+            yield from messages
+            if messages:
+                cursor = messages[-1]['id']
+
+    def count_messages(self, conversation_id: str) -> int:
+        """Đếm số messages của conversation"""
+        record = self.archive.read(conversation_id)
+        if record is not None:
+            return len(record['messages'])
+        return self.store.count_messages(conversation_id)
+
+    # ========== BULK ==========
+
+    def bulk_insert(self, conversations: List[Dict[str, Any]] = None, messages: List[Dict[str, Any]] = None) -> int:
+        """Thêm nhiều records trong một lần ghi; records đã tồn tại (cùng id) được bỏ qua"""
+        # Export cũ còn nhúng context_snippets trong metadata: chuyển sang context_refs khi ghi
+        messages = [compact_message(m) for m in messages] if messages else messages
+        touched = {m.get('conversation_id') for m in messages or []}
+        with self._locked_conversations(touched):
+            for conversation_id in touched:
+                self._ensure_hot(conversation_id)
+            existing = [c for c in touched if self.store.get_conversation(c) is not None]
+            inserted = self.store.bulk_insert(conversations=conversations, messages=messages)
+
+            # bulk_insert không đi qua aggregates: tăng version của các conversation đã có để ETag đổi,
+            # và báo reset trên change feed (không liệt kê từng message được import)
+            if inserted:
+                for conversation_id in existing:
+                    updated = self.store.update_conversation(conversation_id, {})
+                    self.change_feed.publish(conversation_id, updated.get(VERSION_FIELD) or 0, RESET, clear=True)
+        self._touch()
+        # Index chưa build thì bỏ qua: lần build đầu tiên sẽ đọc các messages này từ store
+        if self.search_index.accepts_updates:
+            for message in messages or []:
+                self.search_index.add_message(message)
+        return inserted
+
+    # ========== WRITE-BEHIND ==========
+
+    def dead_letter_stats(self) -> Optional[Dict[str, Any]]:
+        """Record write-behind ghi lỗi (số record chờ ghi lại, lỗi gần nhất), None nếu write-behind tắt"""
+        if not hasattr(self.store, 'dead_letter_stats'):
+            return None
+        return self.store.dead_letter_stats()
+
+    def replay_dead_letters(self) -> Optional[Dict[str, int]]:
+        """Ghi lại các record write-behind đã lỗi, None nếu write-behind tắt"""
+        if not hasattr(self.store, 'replay_dead_letters'):
+            return None
+        # Giữ lock của mọi conversation như close_all: archive không được chạy xen giữa lúc ghi lại
+        with ExitStack() as stack:
+            for lock in self._conversation_locks:
+                stack.enter_context(lock)
+            result = self.store.replay_dead_letters()
+        if result["replayed"]:
+            self._touch()
+        return result
+
+    # ========== VERSIONS ==========
+
+    def _touch(self):
+        """Đánh dấu danh sách conversations đã thay đổi"""
+        self._list_version = next(self._list_changes)
+
+    def list_etag(self) -> str:
+        """ETag của danh sách conversations, không cần đọc store"""
+        return f"{self._list_epoch}-{self._list_version}"
+
+    def conversation_version(self, conversation_id: str) -> Optional[int]:
+        """Version hiện tại của conversation, None nếu không tồn tại"""
+        conversation = self.store.get_conversation(conversation_id)
+        if conversation is None:
+            return None
+        return conversation.get(VERSION_FIELD) or 0
+
+    def conversation_etag(self, conversation_id: str, version: Optional[int] = None) -> Optional[str]:
+        """ETag của conversation và messages của nó theo version, None nếu conversation không tồn tại"""
+        if version is None:
+            version = self.conversation_version(conversation_id)
+        return None if version is None else f"{conversation_id}-{version}"
+
+    # ========== CHANGE FEED ==========
+
+    def _publish(self, conversation_id: str, change_type: str, record_id: Optional[str] = None):
+        """Publish thay đổi với version hiện tại của conversation (gọi khi giữ lock của conversation)"""
+        version = self.conversation_version(conversation_id)
+        if version is not None:
+            self.change_feed.publish(conversation_id, version, change_type, record_id)
+
+    def get_changes(self, conversation_id: str, since: int) -> Optional[Dict[str, Any]]:
+        """
+        Các thay đổi của conversation sau version `since`: {version, reset, changes}
+
+        reset=True khi lịch sử trong bộ nhớ không còn đủ để tính từ `since` (restart, import, quá cũ):
+        client cần tải lại messages rồi theo dõi tiếp từ version trả về. None nếu conversation không tồn tại.
+        """
+        conversation = self.store.get_conversation(conversation_id)
+        if conversation is None:
+            return None
+        version = conversation.get(VERSION_FIELD) or 0
+        entries = self.change_feed.changes_since(conversation_id, since)
+        if entries is None or since > version or (not entries and since < version):
+            return {"version": version, "reset": True, "changes": []}
+
+        changes = []
+        for entry_version, change_type, record_id in entries:
+            change = {"version": entry_version, "type": change_type}
+            if change_type == MESSAGE_ADDED:
+                message = self.store.get_message(record_id)
+                if message is None:
+                    # Message đã bị xóa sau đó; entry message_deleted nằm phía sau trong feed
+                    continue
+                change["message"] = message
+            elif change_type == MESSAGE_DELETED:
+                change["message_id"] = record_id
+            elif change_type == CONVERSATION_UPDATED:
+                change["conversation"] = conversation
+            changes.append(change)
+        return {"version": max(version, entries[-1][0]) if entries else version, "reset": False, "changes": changes}
+
+    def wait_for_changes(self, conversation_id: str, since: int, timeout: float) -> bool:
+        """Chờ (long-poll) tới khi conversation có thay đổi sau `since` hoặc hết timeout"""
+        return self.change_feed.wait(conversation_id, since, timeout)
+
+    # ========== ARCHIVE ==========
+
+    def _recover_archive(self):
+        """Đồng bộ archive với store sau khi process dừng giữa lúc archive/nạp lại"""
+        for conversation_id in self.archive.ids():
+            conversation = self.store.get_conversation(conversation_id)
+            if conversation is None:
+                # Dừng giữa lúc xóa khỏi store và ghi lại record conversation
+                record = self.archive.read(conversation_id)
+                if record:
+                    self.store.bulk_insert(conversations=[record['conversation']])
+            elif not conversation.get('archived_at'):
+                # Store vẫn giữ bản đầy đủ (archive chưa xong hoặc đã nạp lại xong): bỏ file archive
+                self.archive.delete(conversation_id)
+
+    def _ensure_hot(self, conversation_id: str):
+        """Nạp lại messages của conversation đã archive vào store trước khi đọc/ghi"""
+        if conversation_id not in self.archive:
+            return
+        with self._conversation_lock(conversation_id):
+            record = self.archive.read(conversation_id)
+            if record is None:
+                return
+            start = time.perf_counter()
+            messages = record['messages']
+            self.store.bulk_insert(messages=messages)
+            if self.store.get_conversation(conversation_id) is None:
+                self.store.bulk_insert(conversations=[record['conversation']])
+            # rehydrated_at giữ conversation khỏi bị archive lại ngay ở lần chạy kế tiếp;
+            # messages không đổi nên giữ nguyên version (ETag client đang giữ vẫn hợp lệ)
+            version = (self.store.get_conversation(conversation_id) or {}).get(VERSION_FIELD)
+            self.store.update_conversation(conversation_id, {
+                'archived_at': None,
+                'rehydrated_at': datetime.now().isoformat(),
+                VERSION_FIELD: version
+            })
+            if self.search_index.accepts_updates:
+                for message in messages:
+                    self.search_index.add_message(message)
+            self.archive.delete(conversation_id)
+        self._touch()
+        logger.info(f"♻️  Rehydrated conversation {conversation_id} ({len(messages)} messages) "
+                    f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    def _archive_conversation(self, conversation_id: str, cutoff: str) -> Optional[Tuple[int, int]]:
+        """Chuyển messages của một conversation sang archive, trả về (số messages, bytes) hoặc None nếu bỏ qua"""
+        with self._conversation_lock(conversation_id):
+            conversation = self.store.get_conversation(conversation_id)
+            if conversation is None or conversation_id in self.archive or (conversation.get('updated_at') or '') >= cutoff:
+                return None
+            messages = self.store.get_messages(conversation_id)
+            archived = dict(conversation, archived_at=datetime.now().isoformat(), rehydrated_at=None)
+            size = self.archive.write(archived, messages)
+
+            # File archive đã fsync nên giờ mới xóa khỏi store, rồi ghi lại record conversation (không kèm messages)
+            self.store.delete_conversation(conversation_id)
+            self.store.bulk_insert(conversations=[archived])
+            # Version giữ nguyên nên client đang theo dõi vẫn tiếp tục được sau khi nạp lại
+            self.change_feed.forget(conversation_id)
+        # Messages vẫn nằm trong search index: archive chỉ đổi nơi lưu, không đổi kết quả tìm kiếm
+        self._touch()
+        return len(messages), size
+
+    def archive_idle_conversations(self, max_idle_days: float, batch_size: int = 500) -> Dict[str, Any]:
+        """Archive mọi conversation không có hoạt động trong max_idle_days ngày, trả về thống kê"""
+        start = time.perf_counter()
+        cutoff = (datetime.now() - timedelta(days=max_idle_days)).isoformat()
+
+        # Khóa (updated_at, id) nhỏ hơn (cutoff, '') nghĩa là updated_at < cutoff
+        candidates, after = [], (cutoff, '')
+        while True:
+            page, has_more = self.store.list_conversations_page(batch_size, 'updated_at', after)
+            candidates += [
+                c['id'] for c in page
+                if c.get('message_count') != 0 and c['id'] not in self.archive
+                and (c.get('rehydrated_at') or '') < cutoff
+            ]
+            if not has_more or not page:
+                break
+            after = conversation_sort_key(page[-1], 'updated_at')
+
+        stats = {"archived": 0, "messages": 0, "bytes": 0}
+        for conversation_id in candidates:
+            if self._archiver_stop.is_set():
+                break
+            result = self._archive_conversation(conversation_id, cutoff)
+            if result:
+                stats["archived"] += 1
+                stats["messages"] += result[0]
+                stats["bytes"] += result[1]
+        stats["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+
+        if stats["archived"]:
+            logger.info(f"🗄️  Archived {stats['archived']} conversations ({stats['messages']} messages, "
+                        f"{stats['bytes'] / 1024:.0f}KB compressed) in {stats['elapsed_seconds']}s")
+        return stats
+
+    def start_archiver(self, max_idle_days: float, interval_minutes: float):
+        """Chạy archive_idle_conversations định kỳ trong một daemon thread (max_idle_days <= 0 để tắt)"""
+        if max_idle_days <= 0 or self._archiver is not None:
+            return
+
+        def run():
+            while not self._archiver_stop.is_set():
+                try:
+                    self.archive_idle_conversations(max_idle_days)
+                except Exception as e:
+                    logger.error(f"Lỗi khi archive conversations: {e}")
+                self._archiver_stop.wait(interval_minutes * 60)
+
+        self._archiver = threading.Thread(target=run, name="conversation-archiver", daemon=True)
+        self._archiver.start()
+        logger.info(f"🗄️  Archiving conversations idle for more than {max_idle_days:g} days "
+                    f"every {interval_minutes:g} minutes")
+
+    # ========== SEARCH ==========
+
+    def build_search_index(self, progress_callback=None):
+        """Build full-text index từ toàn bộ messages (chỉ chạy một lần)"""
+        self.search_index.ensure_built(
+            lambda: itertools.chain(self.store.iter_messages(), self.archive.iter_messages()),
+            progress_callback
+        )
+
+    def search_messages(self, query: str, limit: int = 20, conversation_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Tìm messages theo nội dung, kèm snippet quanh các từ khớp"""
+        self.build_search_index()
+        hits = self.search_index.search(query, limit=limit, conversation_id=conversation_id)
+        archived = {}
+        for hit in hits:
+            message = self.store.get_message(hit["message_id"])
+            archived_in = self.archive.conversation_of(hit["message_id"]) if message is None else None
+            if archived_in:
+                # Giải nén mỗi archive một lần cho mọi hit của cùng conversation
+                if archived_in not in archived:
+                    record = self.archive.read(archived_in) or {"messages": []}
+                    archived[archived_in] = {m.get('id'): m for m in record['messages']}
+                message = archived[archived_in].get(hit["message_id"])
+            message = message or {}
+            hit["role"] = message.get("role")
+            hit["timestamp"] = message.get("timestamp")
+            hit["snippet"] = make_snippet(message.get("content", ""), query)
+        return hits
+
+    # ========== DATA FILES ==========
+
     def get_data_files_db(self):
         """Lấy data files database"""
         return self.data_files_db
-    
+
     def close_all(self):
         """Đóng tất cả database connections"""
-        self.conversations_db.close()
-        self.messages_db.close()
+        self._archiver_stop.set()
+        with ExitStack() as stack:
+            for lock in self._conversation_locks:
+                stack.enter_context(lock)
+            self.store.close()
         self.data_files_db.close()
         logger.info("📊 Closed all database connections")
 
@@ -27,6 +27,23 @@ def create_app():
             'message': 'Flask API is running successfully'
         })
     
+    # Liveness: the process is up and serving requests
+    @app.route('/health/live')
+    def liveness_check():
+        return jsonify({
+            'status': 'alive'
+        })
+    
+    # Readiness: every subsystem finished warming up
+    @app.route('/health/ready')
+    def readiness_check():
+        from core.warmup import warmup_manager
+        status = warmup_manager.get_status()
+        return jsonify({
+            'status': 'ready' if status['ready'] else 'warming_up',
+            **status
+        }), 200 if status['ready'] else 503
+    
     # Root endpoint
     @app.route('/')
     def root():
@@ -35,20 +52,34 @@ def create_app():
             'version': '2.0.0',
             'endpoints': {
                 'health': '/health',
+                'liveness': '/health/live',
+                'readiness': '/health/ready',
                 'api': '/api',
                 'tts': {
                     'convert': '/api/tts/convert',
+                    'stream': '/api/tts/stream?text=<text>',
+                    'jobs': '/api/tts/jobs',
+                    'job_status': '/api/tts/jobs/<job_id>?wait=<seconds>',
+                    'job_metrics': '/api/tts/jobs/metrics',
                     'download': '/api/tts/download/<filename>',
                     'info': '/api/tts/info',
                     'cleanup': '/api/tts/cleanup'
                 },
+                'rag': {
+                    'info': '/api/rag/info',
+                    'reload': '/api/rag/reload'
+                },
                 'conversation': {
                     'list': '/api/conversation/conversations',
                     'create': '/api/conversation/conversations',
                     'delete': '/api/conversation/conversations/<conversation_id>',
                     'update': '/api/conversation/conversations/<conversation_id>',
                     'messages': '/api/conversation/conversations/<conversation_id>/messages',
-                    'chat': '/api/conversation/conversations/<conversation_id>/chat'
+                    'changes': '/api/conversation/conversations/<conversation_id>/changes?since=<version>',
+                    'chat': '/api/conversation/conversations/<conversation_id>/chat',
+                    'search': '/api/conversation/search?q=<query>',
+                    'export': '/api/conversation/export',
+                    'import': '/api/conversation/import'
                 },
             }
         })
@@ -69,6 +100,14 @@ def create_app():
     except Exception as e:
         logger.warning(f"⚠️  Could not register TTS routes: {e}")
     
+    # Register RAG blueprints
+    try:
+        from routes.rag_routes import rag_bp
+        app.register_blueprint(rag_bp, url_prefix='/api/rag')
+        logger.info("✅ RAG routes registered successfully")
+    except Exception as e:
+        logger.warning(f"⚠️  Could not register RAG routes: {e}")
+    
     # Register Conversation blueprints
     try:
         from routes.conversation_router import conversation_bp
@@ -105,6 +144,43 @@ def check_conversation_dependencies():
         logger.warning("Conversation features will be disabled. Install with: pip install tinydb openai requests")
         return False
 
+def warm_up_tts(progress_callback):
+    """Load the TTS model in the background"""
+    from services.tts_service import tts_service
+    from services.tts_jobs import tts_job_queue
+    if tts_job_queue.enabled:
+        # Worker processes load their own copy of the model; this process never loads it
+        progress_callback(0.0, f"Starting {tts_job_queue.workers} TTS worker processes")
+        return tts_job_queue.warm_up()
+    progress_callback(0.0, f"Loading {tts_service.model_name}")
+    return tts_service.ensure_loaded()
+
+def warm_up_rag(progress_callback):
+    """Extract and embed the law documents in the background"""
+    from config.config import Config
+    from utils.rag_init import initialize_rag_service
+    if Config.RAG_RERANK_ENABLED:
+        # Load the cross-encoder now rather than inside the first request's rerank budget
+        from utils.reranker import reranker
+        progress_callback(0.0, "Loading reranker")
+        logger.info(f"Reranker ready: {reranker.warm_up()}")
+    return initialize_rag_service(progress_callback)
+
+def warm_up_search(progress_callback):
+    """Build the full-text message index in the background"""
+    from database import db_manager
+    progress_callback(0.0, "Indexing messages")
+    db_manager.build_search_index(lambda count: progress_callback(0.0, f"Indexed {count} messages"))
+    return True
+
+def start_warmup(tts_available, rag_available, search_available=True):
+    """Register subsystem warm-ups and run them in background threads"""
+    from core.warmup import warmup_manager
+    warmup_manager.register('tts', warm_up_tts, enabled=tts_available)
+    warmup_manager.register('rag', warm_up_rag, enabled=rag_available)
+    warmup_manager.register('search', warm_up_search, enabled=search_available)
+    warmup_manager.start_all()
+
 def check_rag_dependencies():
     """Check if RAG dependencies are available"""
     try:
@@ -142,22 +218,26 @@ if __name__ == '__main__':
         
     if rag_available:
         logger.info("🧠 RAG features enabled")
-        # Initialize RAG service with documents
-        try:
-            from utils.rag_init import initialize_rag_service
-            initialize_rag_service()
-        except Exception as e:
-            logger.warning(f"⚠️  Could not auto-initialize RAG service: {e}")
     else:
         logger.info("📝 RAG features disabled")
     
     app = create_app()
     
+    # Warm up RAG index and TTS model (and start the conversation archiver) in background threads
+    # so the server listens immediately.
+    # With the debug reloader only the serving child process (WERKZEUG_RUN_MAIN) warms up.
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warmup(tts_available, rag_available, conversation_available)
+        if conversation_available:
+            from database import db_manager
+            db_manager.start_archiver(Config.ARCHIVE_AFTER_DAYS, Config.ARCHIVE_INTERVAL_MINUTES)
+    
     logger.info("🌐 Server starting at http://localhost:5000")
     logger.info("📚 API Documentation:")
     logger.info("  - TTS: Check /api/tts/info for TTS status")
     logger.info("  - Conversation: Check /api/conversation/conversations for conversation features")
     logger.info("  - RAG: Check /api/rag/info for RAG capabilities")
+    logger.info("  - Readiness: Check /health/ready for warm-up progress")
     
     try:
         app.run(debug=True, host='0.0.0.0', port=5000)
@@ -2,16 +2,20 @@
 import os
 import json
 import uuid
+import time
 from datetime import datetime
 from typing import List, Dict, Optional, Any
-from flask import Blueprint, request, jsonify
-from tinydb import Query
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from openai import OpenAI
 import logging
 
 # Import config và database
 from config.config import Config
 from database import db_manager
+from storage.cursors import parse_page_size, CONVERSATION_SUMMARY_FIELDS
+from storage.ndjson_transfer import export_ndjson, import_ndjson, iter_chunks, NDJSON_MIMETYPE
+from storage.change_feed import ChangeFeedBusy
+from utils.context_refs import resolve_context_snippets
 
 # Import function calling services
 from services.function_calling_service import (
@@ -21,8 +25,8 @@ from services.function_calling_service import (
     function_tools
 )
 
-# Import TTS service
-from services.tts_service import TTSService
+# Import TTS service (instance dùng chung cho cả app, model được load một lần khi warm-up hoặc dùng lần đầu)
+from services.tts_service import tts_service
 
 # Import RAG service
 from services.rag_service import rag_service
@@ -33,14 +37,6 @@ logger = logging.getLogger(__name__)
 # ========== BLUEPRINT SETUP ==========
 conversation_bp = Blueprint('conversation', __name__)
 
-# ========== DATABASE INITIALIZATION ==========
-# Sử dụng database manager
-conversations_db = db_manager.get_conversations_db()
-messages_db = db_manager.get_messages_db()
-
-# ========== TTS SERVICE INITIALIZATION ==========
-tts_service = TTSService()
-
 # ========== CLIENT INITIALIZATION ==========
 try:
     client = OpenAI(
@@ -55,17 +51,51 @@ except Exception as e:
 
 @conversation_bp.route('/conversations', methods=['GET'])
 def get_conversations():
-    """Lấy danh sách tất cả conversations"""
+    """Lấy danh sách conversations, hỗ trợ phân trang bằng cursor (limit, cursor, order_by, fields)"""
     try:
-        conversations = conversations_db.all()
-        
-        # Sắp xếp conversations theo thời gian tạo từ mới nhất đến cũ nhất
-        conversations.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
-        return jsonify({
+        # Đọc ETag trước dữ liệu: nếu có ghi xen giữa, ETag cũ hơn dữ liệu chứ không bao giờ ngược lại
+        etag = db_manager.list_etag()
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+
+        paging_args = ('limit', 'cursor', 'order_by', 'fields')
+        # Không có tham số phân trang: giữ hành vi cũ, trả về toàn bộ conversations theo thời gian tạo
+        if not any(request.args.get(arg) for arg in paging_args):
+            conversations = db_manager.list_conversations()
+            return _with_etag(jsonify({
+                "success": True,
+                "conversations": conversations
+            }), etag)
+
+        order_by = request.args.get('order_by') or 'updated_at'
+        fields = request.args.get('fields')
+        if fields == 'summary':
+            fields = list(CONVERSATION_SUMMARY_FIELDS)
+        elif fields:
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+
+        try:
+            page_size = parse_page_size(request.args.get('limit'))
+            conversations, next_cursor = db_manager.list_conversations_page(
+                page_size, order_by=order_by, cursor=request.args.get('cursor') or None, fields=fields or None
+            )
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+
+        return _with_etag(jsonify({
             "success": True,
-            "conversations": conversations
-        })
+            "conversations": conversations,
+            "paging": {
+                "limit": page_size,
+                "order_by": order_by,
+                "has_more": next_cursor is not None,
+                "next_cursor": next_cursor
+            }
+        }), etag)
     except Exception as e:
         return jsonify({
             "success": False,
@@ -84,10 +114,12 @@ def create_conversation():
             "title": data.get("title", f"Cuộc trò chuyện {datetime.now().strftime('%H:%M %d/%m')}"),
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat(),
-            "message_count": 0
+            "message_count": 0,
+            "last_message_at": None,
+            "total_tokens": 0
         }
         
-        conversations_db.insert(conversation)
+        db_manager.insert_conversation(conversation)
         
         return jsonify({
             "success": True,
@@ -104,14 +136,8 @@ def create_conversation():
 def delete_conversation(conversation_id):
     """Xóa conversation và tất cả messages của nó"""
     try:
-        Conversation = Query()
-        Message = Query()
-        
-        # Xóa conversation
-        conversations_db.remove(Conversation.id == conversation_id)
-        
-        # Xóa tất cả messages của conversation
-        messages_db.remove(Message.conversation_id == conversation_id)
+        # Xóa conversation cùng tất cả messages của nó
+        db_manager.delete_conversation(conversation_id)
         
         return jsonify({
             "success": True,
@@ -137,26 +163,20 @@ def update_conversation(conversation_id):
                 "error": "Title không được để trống"
             }), 400
         
-        Conversation = Query()
-        conversation = conversations_db.search(Conversation.id == conversation_id)
-        
-        if not conversation:
-            return jsonify({
-                "success": False,
-                "error": "Conversation không tồn tại"
-            }), 404
-        
         # Cập nhật title và updated_at
-        conversations_db.update(
+        updated_conversation = db_manager.update_conversation(
+            conversation_id,
             {
                 "title": new_title.strip(),
                 "updated_at": datetime.now().isoformat()
-            },
-            Conversation.id == conversation_id
+            }
         )
         
-        # Lấy conversation đã cập nhật
-        updated_conversation = conversations_db.search(Conversation.id == conversation_id)[0]
+        if not updated_conversation:
+            return jsonify({
+                "success": False,
+                "error": "Conversation không tồn tại"
+            }), 404
         
         return jsonify({
             "success": True,
@@ -172,20 +192,266 @@ def update_conversation(conversation_id):
 
 @conversation_bp.route('/conversations/<conversation_id>/messages', methods=['GET'])
 def get_messages(conversation_id):
-    """Lấy tất cả messages trong một conversation"""
+    """
+    Lấy messages trong một conversation, hỗ trợ phân trang bằng cursor (limit, before, after)
+
+    Messages chỉ lưu tham chiếu tới tài liệu (metadata.context_refs); thêm include_snippets=true
+    để nhận kèm nội dung (metadata.context_snippets) đọc từ index tài liệu hiện tại.
+    """
     try:
-        Message = Query()
-        messages = messages_db.search(Message.conversation_id == conversation_id)
-        
-        # Sắp xếp theo thời gian
-        messages.sort(key=lambda x: x['timestamp'])
+        before = request.args.get('before')
+        after = request.args.get('after')
+        limit = request.args.get('limit')
+        include_snippets = request.args.get('include_snippets', '').lower() in ('1', 'true', 'yes')
+
+        if before and after:
+            return jsonify({
+                "success": False,
+                "error": "Chỉ được dùng một trong hai cursor: before hoặc after"
+            }), 400
+
+        # Version của conversation đổi mỗi khi có message mới/bị xóa, nên 304 không cần đọc messages.
+        # Version được đọc trước messages và trả về để client theo dõi tiếp qua change feed
+        version = db_manager.conversation_version(conversation_id)
+        etag = db_manager.conversation_etag(conversation_id, version)
+        if include_snippets and etag is not None:
+            # Snippets được đọc từ index tài liệu hiện tại: reload index với nội dung khác thì ETag cũng đổi
+            etag = f"{etag}-s{rag_service.index_fingerprint or 'none'}"
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+
+        # Không có tham số phân trang: giữ hành vi cũ, trả về toàn bộ messages
+        if not (before or after or limit):
+            messages = db_manager.get_messages(conversation_id)
+            if include_snippets:
+                messages = resolve_context_snippets(messages, rag_service.resolve_chunks)
+            return _with_etag(jsonify({
+                "success": True,
+                "messages": messages,
+                "version": version
+            }), etag)
+
+        try:
+            page_size = parse_page_size(limit)
+            messages, has_more = db_manager.get_messages_page(
+                conversation_id, page_size, before=before or None, after=after or None
+            )
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        if include_snippets:
+            messages = resolve_context_snippets(messages, rag_service.resolve_chunks)
+
+        # Cursor trỏ tới message đầu/cuối trang để lấy trang cũ hơn/mới hơn
+        return _with_etag(jsonify({
+            "success": True,
+            "messages": messages,
+            "version": version,
+            "paging": {
+                "limit": page_size,
+                "has_more": has_more,
+                "before": messages[0]["id"] if messages else None,
+                "after": messages[-1]["id"] if messages else None
+            }
+        }), etag)
         
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@conversation_bp.route('/conversations/<conversation_id>/changes', methods=['GET'])
+def get_changes(conversation_id):
+    """
+    Change feed của conversation: các thay đổi sau version `since`
+
+    Nếu chưa có thay đổi, request được giữ lại (long-poll) tối đa `wait` giây.
+    reset=true nghĩa là client phải tải lại messages rồi theo dõi tiếp từ version trả về.
+    """
+    try:
+        try:
+            since = int(request.args.get('since', ''))
+            wait = float(request.args.get('wait') or 0)
+        except ValueError:
+            since, wait = -1, 0
+        if since < 0 or not wait >= 0:
+            return jsonify({
+                "success": False,
+                "error": "since phải là số nguyên >= 0 và wait là số giây >= 0"
+            }), 400
+        wait = min(wait, Config.CHANGE_FEED_MAX_WAIT_SECONDS)
+
+        feed = db_manager.get_changes(conversation_id, since)
+        if feed is not None and wait and not feed["changes"] and not feed["reset"]:
+            try:
+                if db_manager.wait_for_changes(conversation_id, since, wait):
+                    feed = db_manager.get_changes(conversation_id, since)
+            except ChangeFeedBusy:
+                response = jsonify({
+                    "success": False,
+                    "error": "Quá nhiều request đang chờ thay đổi, thử lại sau"
+                })
+                response.headers['Retry-After'] = '1'
+                return response, 503
+
+        if feed is None:
+            return jsonify({
+                "success": False,
+                "error": "Conversation không tồn tại"
+            }), 404
+
         return jsonify({
             "success": True,
-            "messages": messages
+            "conversation_id": conversation_id,
+            "since": since,
+            **feed
         })
-        
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@conversation_bp.route('/search', methods=['GET'])
+def search_messages():
+    """Tìm kiếm toàn văn trong messages của mọi conversation (không phân biệt dấu)"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({
+                "success": False,
+                "error": "Tham số q không được để trống"
+            }), 400
+
+        try:
+            limit = parse_page_size(request.args.get('limit'), default=20)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+
+        start = time.perf_counter()
+        results = db_manager.search_messages(
+            query,
+            limit=limit,
+            conversation_id=request.args.get('conversation_id') or None
+        )
+
+        return jsonify({
+            "success": True,
+            "query": query,
+            "results": results,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2)
+        })
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@conversation_bp.route('/storage/dead-letters', methods=['GET'])
+def get_dead_letters():
+    """Số record write-behind ghi lỗi đang chờ ghi lại và các lỗi gần nhất"""
+    try:
+        stats = db_manager.dead_letter_stats()
+        return jsonify({
+            "success": True,
+            "write_behind": stats is not None,
+            "dead_letters": stats
+        })
+
+    except Exception as e:
+        logger.error(f"Lỗi khi đọc dead letters: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@conversation_bp.route('/storage/dead-letters/replay', methods=['POST'])
+def replay_dead_letters():
+    """Ghi lại các record write-behind đã lỗi; record vẫn lỗi được giữ lại trong file dead letter"""
+    try:
+        result = db_manager.replay_dead_letters()
+        if result is None:
+            return jsonify({
+                "success": False,
+                "error": "Write-behind đang tắt (DB_WRITE_BEHIND=false)"
+            }), 400
+
+        return jsonify({
+            "success": True,
+            "replay": result,
+            "dead_letters": db_manager.dead_letter_stats()
+        })
+
+    except Exception as e:
+        logger.error(f"Lỗi khi replay dead letters: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@conversation_bp.route('/export', methods=['GET'])
+def export_conversations():
+    """Export conversations kèm messages dạng NDJSON (stream, không dựng toàn bộ dữ liệu trong bộ nhớ)"""
+    try:
+        conversation_ids = request.args.getlist('conversation_id') or None
+        filename = f"conversations-{datetime.now().strftime('%Y%m%d-%H%M%S')}.ndjson"
+
+        chunks = iter_chunks(export_ndjson(db_manager, conversation_ids))
+        # Đọc trước chunk đầu tiên (gồm các trang dữ liệu đầu) để lỗi khi bắt đầu đọc database
+        # trả về JSON 500; lỗi sau khi đã stream chỉ có thể ghi log (client nhận file bị cắt)
+        first_chunk = next(chunks, "")
+
+        def generate():
+            yield first_chunk
+            try:
+                yield from chunks
+            except Exception as e:
+                logger.error(f"Lỗi khi export (đang stream): {str(e)}")
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype=NDJSON_MIMETYPE,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+
     except Exception as e:
+        logger.error(f"Lỗi khi export: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@conversation_bp.route('/import', methods=['POST'])
+def import_conversations():
+    """Import NDJSON (định dạng của /export) từ request body theo từng batch"""
+    try:
+        batch_size = request.args.get('batch_size', '1000')
+        if not batch_size.isdigit() or int(batch_size) <= 0:
+            return jsonify({
+                "success": False,
+                "error": "batch_size phải là số nguyên dương"
+            }), 400
+        batch_size = int(batch_size)
+
+        # Đọc body từng dòng thay vì request.get_data() để không giữ cả file trong bộ nhớ
+        stats = import_ndjson(db_manager, request.stream, batch_size=batch_size)
+
+        return jsonify({
+            "success": True,
+            "import": stats
+        })
+
+    except Exception as e:
+        logger.error(f"Lỗi khi import: {str(e)}")
         return jsonify({
             "success": False,
             "error": str(e)
@@ -218,35 +484,44 @@ def chat(conversation_id):
             "content": user_message,
             "timestamp": datetime.now().isoformat()
         }
-        messages_db.insert(user_msg)
+        db_manager.insert_message(user_msg)
         
-        # Lấy lịch sử conversation
-        Message = Query()
-        conversation_messages = messages_db.search(Message.conversation_id == conversation_id)
-        conversation_messages.sort(key=lambda x: x['timestamp'])
+        # Chỉ đọc 10 tin nhắn gần nhất, không load toàn bộ lịch sử
+        conversation_messages = db_manager.get_recent_messages(conversation_id, 10)
         
         assistant_content = ""
         response_metadata = {}
+        context_snippets = []
         
         try:
             # Chuẩn bị conversation history cho RAG
             rag_history = []
 
-            for msg in conversation_messages[-10:]:  # Lấy 10 tin nhắn gần nhất
+            for msg in conversation_messages:
                 rag_history.append({
                     "role": msg["role"],
                     "content": msg["content"]
                 })
             
-            # Gọi RAG service
-            rag_result = rag_service.chat_with_context(user_message, rag_history)
+            # Gọi RAG service (client có thể bật/tắt rerank cho từng request, không gửi thì theo config)
+            rerank = data.get("rerank")
+            if rerank is not None:
+                rerank = str(rerank).lower() in ('1', 'true', 'yes')
+            rag_result = rag_service.chat_with_context(
+                user_message,
+                rag_history,
+                rerank=rerank
+            )
             
             if rag_result["success"]:
                 assistant_content = rag_result["response"]
+                # Chỉ lưu tham chiếu tới chunk (id, trang, điểm); nội dung được trả về ngay nhưng không lưu
+                context_snippets = rag_result.get("context_snippets", [])
                 response_metadata = {
                     "mode": "rag",
                     "context_used": rag_result.get("context_used", 0),
-                    "context_snippets": rag_result.get("context_snippets", []),
+                    "context_refs": rag_result.get("context_refs", []),
+                    "context_score": rag_result.get("context_score"),
                     "response_type": rag_result.get("response_type", "rag"),
                     "tokens_used": rag_result.get("tokens_used")
                 }
@@ -279,24 +554,16 @@ def chat(conversation_id):
             "timestamp": datetime.now().isoformat(),
             "metadata": response_metadata  # Lưu metadata về cách tạo response
         }
-        messages_db.insert(assistant_msg)
-        
-        # Cập nhật conversation
-        Conversation = Query()
-        conversations_db.update(
-            {
-                "updated_at": datetime.now().isoformat(),
-                "message_count": len(messages_db.search(Message.conversation_id == conversation_id))
-            },
-            Conversation.id == conversation_id
-        )
+        # message_count, last_message_at, total_tokens và updated_at của conversation
+        # được storage cập nhật cùng lúc với insert
+        db_manager.insert_message(assistant_msg)
         
         return jsonify({
             "success": True,
             "response": assistant_content,
             "user_message": user_msg,
             "assistant_message": assistant_msg,
-            "metadata": response_metadata
+            "metadata": {**response_metadata, "context_snippets": context_snippets} if context_snippets else response_metadata
         })
         
     except Exception as e:
@@ -306,20 +573,43 @@ def chat(conversation_id):
             "error": str(e)
         }), 500
 
+@conversation_bp.route('/messages/<message_id>', methods=['DELETE'])
+def delete_message(message_id):
+    """Xóa một message (các field tổng hợp của conversation được cập nhật theo)"""
+    try:
+        if not db_manager.delete_message(message_id):
+            return jsonify({
+                "success": False,
+                "error": "Message không tồn tại"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "message": "Message đã được xóa"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @conversation_bp.route('/messages/<message_id>/tts', methods=['POST'])
 def text_to_speech_message(message_id):
     """Convert message content to speech"""
     try:
-        # Kiểm tra TTS service có available không
-        if not tts_service.is_available:
+        from routes.tts_routes import tts_available, synthesize, queue_full_response, job_timeout_response
+        from services.tts_jobs import TTSQueueFull, TTSTimeout
+
+        # Kiểm tra TTS service có available không (model chỉ nạp trong server khi không dùng worker pool)
+        if not tts_available():
             return jsonify({
                 "success": False,
                 "error": "Text-to-Speech service không khả dụng. Vui lòng cài đặt dependencies."
             }), 503
         
         # Tìm message theo ID
-        Message = Query()
-        message = messages_db.search(Message.id == message_id)
+        message = db_manager.get_message(message_id)
         
         if not message:
             return jsonify({
@@ -327,7 +617,6 @@ def text_to_speech_message(message_id):
                 "error": "Message không tồn tại"
             }), 404
         
-        message = message[0]
         message_content = message.get("content", "")
         
         if not message_content.strip():
@@ -344,11 +633,13 @@ def text_to_speech_message(message_id):
         # Xử lý nội dung trước khi TTS (loại bỏ markdown, emoji, etc.)
         processed_content = _clean_text_for_tts(message_content)
         
-        # Generate speech
-        result = tts_service.text_to_speech(
-            text=processed_content,
-            output_filename=None
-        )
+        # Generate speech (trong worker process nếu pool được bật)
+        try:
+            result = synthesize(processed_content)
+        except TTSQueueFull as e:
+            return queue_full_response(e)
+        except TTSTimeout as e:
+            return job_timeout_response(e)
         
         if result["success"]:
             return jsonify({
@@ -378,19 +669,92 @@ def text_to_speech_message(message_id):
             "error": str(e)
         }), 500
 
+@conversation_bp.route('/messages/<message_id>/tts/jobs', methods=['POST'])
+def submit_message_tts_job(message_id):
+    """Đưa message vào hàng đợi TTS (chạy trong worker process), trả job id để poll /api/tts/jobs/<job_id>"""
+    try:
+        from routes.tts_routes import submit_job_response
+
+        message = db_manager.get_message(message_id)
+        if not message:
+            return jsonify({
+                "success": False,
+                "error": "Message không tồn tại"
+            }), 404
+
+        processed_content = _clean_text_for_tts(message.get("content", ""))
+        if not processed_content:
+            return jsonify({
+                "success": False,
+                "error": "Message không có nội dung để đọc"
+            }), 400
+
+        return submit_job_response(processed_content)
+
+    except Exception as e:
+        logger.error(f"Lỗi khi tạo TTS job: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@conversation_bp.route('/messages/<message_id>/tts/stream', methods=['GET'])
+def stream_message_tts(message_id):
+    """Stream giọng đọc của message theo từng câu (?format=wav|pcm), có thể gán thẳng vào thẻ <audio>"""
+    try:
+        from routes.tts_routes import audio_stream_response, tts_available, STREAM_MIMETYPES
+
+        audio_format = request.args.get('format') or 'wav'
+        if audio_format not in STREAM_MIMETYPES:
+            return jsonify({
+                "success": False,
+                "error": f"format phải là một trong: {', '.join(STREAM_MIMETYPES)}"
+            }), 400
+
+        if not tts_available():
+            return jsonify({
+                "success": False,
+                "error": "Text-to-Speech service không khả dụng. Vui lòng cài đặt dependencies."
+            }), 503
+
+        message = db_manager.get_message(message_id)
+        if not message:
+            return jsonify({
+                "success": False,
+                "error": "Message không tồn tại"
+            }), 404
+
+        processed_content = _clean_text_for_tts(message.get("content", ""))
+        if not processed_content:
+            return jsonify({
+                "success": False,
+                "error": "Message không có nội dung để đọc"
+            }), 400
+
+        return audio_stream_response(processed_content, audio_format)
+
+    except Exception as e:
+        logger.error(f"Lỗi trong stream text-to-speech: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @conversation_bp.route('/conversations/<conversation_id>/messages/tts', methods=['POST'])
 def text_to_speech_conversation(conversation_id):
     """Convert toàn bộ conversation thành speech (chỉ assistant messages)"""
     try:
-        if not tts_service.is_available:
+        from routes.tts_routes import tts_available, synthesize, queue_full_response, job_timeout_response
+        from services.tts_jobs import TTSQueueFull, TTSTimeout
+
+        if not tts_available():
             return jsonify({
                 "success": False,
                 "error": "Text-to-Speech service không khả dụng"
             }), 503
         
         # Lấy tất cả messages của conversation
-        Message = Query()
-        messages = messages_db.search(Message.conversation_id == conversation_id)
+        messages = db_manager.get_messages(conversation_id)
         
         if not messages:
             return jsonify({
@@ -398,9 +762,8 @@ def text_to_speech_conversation(conversation_id):
                 "error": "Conversation không có messages"
             }), 404
         
-        # Chỉ lấy assistant messages và sắp xếp theo thời gian
+        # Chỉ lấy assistant messages (đã sắp xếp theo thời gian)
         assistant_messages = [msg for msg in messages if msg.get("role") == "assistant"]
-        assistant_messages.sort(key=lambda x: x['timestamp'])
         
         if not assistant_messages:
             return jsonify({
@@ -422,10 +785,12 @@ def text_to_speech_conversation(conversation_id):
         # Xử lý và generate speech
         processed_content = _clean_text_for_tts(combined_content)
         
-        result = tts_service.text_to_speech(
-            text=processed_content,
-            output_filename=None
-        )
+        try:
+            result = synthesize(processed_content)
+        except TTSQueueFull as e:
+            return queue_full_response(e)
+        except TTSTimeout as e:
+            return job_timeout_response(e)
         
         if result["success"]:
             return jsonify({
@@ -454,6 +819,22 @@ def text_to_speech_conversation(conversation_id):
             "error": str(e)
         }), 500
 
+def _not_modified(etag: Optional[str]) -> Optional[Response]:
+    """Trả về 304 nếu If-None-Match của request khớp etag"""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def _with_etag(response: Response, etag: Optional[str]) -> Response:
+    """Gắn ETag vào response; no-cache để trình duyệt luôn hỏi lại server bằng If-None-Match"""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
 def _clean_text_for_tts(text: str) -> str:
     """Clean text for better TTS output"""
     import re
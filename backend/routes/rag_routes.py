@@ -0,0 +1,58 @@
+from flask import Blueprint, jsonify, request
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Create blueprint for RAG routes
+rag_bp = Blueprint('rag', __name__)
+
+@rag_bp.route('/info', methods=['GET'])
+def get_rag_info():
+    """Get RAG service status, including the live index generation"""
+    try:
+        from services.rag_service import rag_service
+        return jsonify({
+            'success': True,
+            'data': rag_service.get_status(),
+            'message': 'RAG status retrieved successfully'
+        })
+    except Exception as e:
+        logger.error(f"RAG info error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to retrieve RAG status'
+        }), 500
+
+@rag_bp.route('/reload', methods=['POST'])
+def reload_documents():
+    """Rebuild the document index in the background and swap it in when ready"""
+    try:
+        data = request.get_json(silent=True) or {}
+        # JSON booleans and "false"/"0" strings alike; background unless asked otherwise
+        background = str(data.get('background', True)).lower() in ('1', 'true', 'yes')
+
+        from services.rag_service import rag_service
+        result = rag_service.reload_documents(background=background)
+
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'data': result,
+                'message': result.get('message', 'Documents reloaded successfully')
+            }), 202 if background else 200
+        else:
+            return jsonify({
+                'success': False,
+                'error': result.get('error', 'Unknown error'),
+                'message': 'Failed to reload documents'
+            }), 409 if rag_service.is_reloading() else 500
+
+    except Exception as e:
+        logger.error(f"RAG reload error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to reload documents'
+        }), 500
@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request, send_file, Response, stream_with_context
 import os
 import logging
+from typing import Optional, Dict
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -8,13 +9,150 @@ logger = logging.getLogger(__name__)
 # Create blueprint for TTS routes
 tts_bp = Blueprint('tts', __name__)
 
+# Streaming formats: WAV with an open-ended header, or raw 16-bit little-endian mono PCM
+STREAM_MIMETYPES = {
+    'wav': 'audio/wav',
+    'pcm': 'application/octet-stream'
+}
+
+def audio_stream_response(text: str, audio_format: str = 'wav'):
+    """
+    Build a chunked response that streams synthesized audio sentence by sentence
+    
+    With the worker pool enabled a worker synthesizes the stream (the stream takes a
+    queue slot, so a full queue answers 429); otherwise the model runs in the request
+    thread and must already be loaded (check tts_available() first). Answers 503 when
+    the workers cannot load the model. Errors after the first chunk can only be logged:
+    the client gets truncated audio.
+    """
+    from services.tts_service import tts_service
+    from services.tts_jobs import tts_job_queue, TTSQueueFull
+    
+    if tts_job_queue.enabled:
+        try:
+            sampling_rate, chunks = tts_job_queue.open_stream(text, audio_format)
+        except TTSQueueFull as e:
+            return queue_full_response(e)
+        except RuntimeError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'message': 'Failed to stream text-to-speech'
+            }), 503
+    else:
+        sampling_rate = tts_service.model.config.sampling_rate
+        chunks = tts_service.stream_audio(text, audio_format)
+    
+    def generate():
+        try:
+            yield from chunks
+        except Exception as e:
+            logger.error(f"TTS streaming error: {e}")
+        finally:
+            # Client disconnected: release the worker stream's queue registration
+            chunks.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=STREAM_MIMETYPES[audio_format],
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Ask reverse proxies not to buffer the stream
+            'X-Sample-Rate': str(sampling_rate),
+            'X-Channels': '1',
+            'X-Sample-Format': 's16le'
+        }
+    )
+
+def job_response(job, status: int = 200):
+    """JSON body of a TTS job, with a download link once the audio is ready"""
+    data = job.to_dict()
+    if data['result']:
+        data['result']['download_url'] = f"/api/tts/download/{data['result']['filename']}"
+    data['status_url'] = f"/api/tts/jobs/{job.id}"
+    return jsonify({
+        'success': True,
+        'data': data
+    }), status
+
+def queue_full_response(error, message: str = 'Too many text-to-speech jobs, retry later'):
+    """429 answer for a full TTS queue, with Retry-After"""
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'message': message
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def job_timeout_response(error):
+    """504 answer for a synchronous request whose job is still running, with the URL to poll it"""
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'message': 'Text-to-speech is still running, poll status_url for the result',
+        'job_id': error.job.id,
+        'status_url': f"/api/tts/jobs/{error.job.id}"
+    }), 504
+
+def tts_available() -> bool:
+    """
+    Whether synchronous synthesis can run
+    
+    With the worker pool enabled the workers load their own model, so the model is
+    not loaded in this process; otherwise it is loaded here on first use.
+    """
+    from services.tts_jobs import tts_job_queue
+    if tts_job_queue.enabled:
+        return True
+    from services.tts_service import tts_service
+    return tts_service.ensure_loaded()
+
+def synthesize(text: str, output_filename: Optional[str] = None) -> Dict:
+    """
+    Convert text to speech for a synchronous endpoint
+    
+    Runs in a worker process (the request waits for it) when the pool is enabled,
+    else in the request thread. Raises TTSQueueFull when the queue is full and
+    TTSTimeout when the job outlives TTS_SYNC_TIMEOUT_SECONDS.
+    """
+    from services.tts_jobs import tts_job_queue
+    if tts_job_queue.enabled:
+        return tts_job_queue.text_to_speech(text, output_filename)
+    from services.tts_service import tts_service
+    return tts_service.text_to_speech(text, output_filename)
+
+def submit_job_response(text: str, output_filename: Optional[str] = None):
+    """
+    Queue a TTS job and answer 202 with its id (200 if it was served from the cache)
+    
+    Answers 503 when the worker pool is disabled and 429 with Retry-After when the queue is full.
+    """
+    from services.tts_jobs import tts_job_queue, TTSQueueFull
+    
+    if not tts_job_queue.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'TTS job queue is disabled (TTS_WORKERS=0)',
+            'message': 'Failed to submit text-to-speech job'
+        }), 503
+    
+    try:
+        job = tts_job_queue.submit(text, output_filename)
+    except TTSQueueFull as e:
+        return queue_full_response(e)
+    
+    return job_response(job, 200 if job.done.is_set() else 202)
+
 @tts_bp.route('/info', methods=['GET'])
 def get_tts_info():
     """Get TTS model information"""
     try:
         # Import TTS service only when needed
         from services.tts_service import tts_service
+        from services.tts_jobs import tts_job_queue
         info = tts_service.get_model_info()
+        info['jobs'] = tts_job_queue.get_metrics()
         return jsonify({
             'success': True,
             'data': info,
@@ -49,11 +187,15 @@ def text_to_speech():
                 'message': 'Text cannot be empty'
             }), 400
         
-        # Import TTS service only when needed
-        from services.tts_service import tts_service
+        from services.tts_jobs import TTSQueueFull, TTSTimeout
         
         # Convert text to speech
-        result = tts_service.text_to_speech(text, output_filename)
+        try:
+            result = synthesize(text, output_filename)
+        except TTSQueueFull as e:
+            return queue_full_response(e)
+        except TTSTimeout as e:
+            return job_timeout_response(e)
         
         if result['success']:
             # Remove file_path from response for security
@@ -78,6 +220,109 @@ def text_to_speech():
             'message': 'Failed to process text-to-speech request'
         }), 500
 
+@tts_bp.route('/stream', methods=['GET', 'POST'])
+def stream_text_to_speech():
+    """Stream speech for a text over chunked transfer (playback can start after the first sentence)"""
+    try:
+        data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+        text = (data.get('text') or '').strip()
+        audio_format = data.get('format') or 'wav'
+        
+        if not text:
+            return jsonify({
+                'success': False,
+                'message': 'Text is required'
+            }), 400
+        
+        if audio_format not in STREAM_MIMETYPES:
+            return jsonify({
+                'success': False,
+                'message': f"Unsupported format, use one of: {', '.join(STREAM_MIMETYPES)}"
+            }), 400
+        
+        if not tts_available():
+            return jsonify({
+                'success': False,
+                'error': 'TTS service is not available',
+                'message': 'Failed to stream text-to-speech'
+            }), 503
+        
+        return audio_stream_response(text, audio_format)
+        
+    except Exception as e:
+        logger.error(f"TTS streaming error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to process text-to-speech stream request'
+        }), 500
+
+@tts_bp.route('/jobs', methods=['POST'])
+def submit_tts_job():
+    """Queue text for synthesis in a worker process; poll the returned status_url for the result"""
+    try:
+        data = request.get_json(silent=True) or {}
+        text = (data.get('text') or '').strip()
+        
+        if not text:
+            return jsonify({
+                'success': False,
+                'message': 'Text is required in request body'
+            }), 400
+        
+        return submit_job_response(text, data.get('filename'))
+        
+    except Exception as e:
+        logger.error(f"TTS job submit error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to submit text-to-speech job'
+        }), 500
+
+@tts_bp.route('/jobs/metrics', methods=['GET'])
+def get_tts_job_metrics():
+    """Queue depth, job counters, queue wait and synthesis time percentiles"""
+    from services.tts_jobs import tts_job_queue
+    return jsonify({
+        'success': True,
+        'data': tts_job_queue.get_metrics()
+    })
+
+@tts_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_tts_job(job_id):
+    """Job status and result; ?wait=<seconds> blocks until the job finishes or the wait runs out"""
+    try:
+        from config.config import Config
+        from services.tts_jobs import tts_job_queue
+        
+        try:
+            wait = float(request.args.get('wait') or 0)
+        except ValueError:
+            wait = -1
+        if not wait >= 0:
+            return jsonify({
+                'success': False,
+                'message': 'wait must be a number of seconds >= 0'
+            }), 400
+        
+        job = tts_job_queue.get(job_id, min(wait, Config.TTS_JOB_MAX_WAIT_SECONDS))
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'Job not found or expired'
+            }), 404
+        
+        return job_response(job)
+        
+    except Exception as e:
+        logger.error(f"TTS job status error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to retrieve text-to-speech job'
+        }), 500
+
 @tts_bp.route('/download/<filename>', methods=['GET'])
 def download_audio(filename):
     """Download generated audio file"""
@@ -92,11 +337,11 @@ def download_audio(filename):
         # Import TTS service only when needed
         from services.tts_service import tts_service
         
-        # Construct file path
-        file_path = os.path.join(tts_service.output_dir, filename)
+        # Generated files live in the output directory, cached ones in the cache directory
+        file_path = tts_service.find_audio_file(filename)
         
         # Check if file exists
-        if not os.path.exists(file_path):
+        if not file_path:
             return jsonify({
                 'success': False,
                 'message': 'File not found'
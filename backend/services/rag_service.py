@@ -3,26 +3,118 @@ RAG (Retrieval-Augmented Generation) Service
 Integrates PDF processing, embeddings, and AI chat for legal document Q&A
 """
 import os
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from openai import AzureOpenAI
+from config.config import Config
 from utils.pdf_processor import extract_chunks_from_pdf, validate_pdf_file
 from utils.embedder import embedding_service
+from utils.reranker import reranker
+from utils.context_refs import chunk_id, make_context_ref
 from utils.prompts import build_law_prompt, build_system_prompt, build_search_prompt
 
 logger = logging.getLogger(__name__)
 
+class IndexGeneration:
+    """One immutable build of the document index, shared by concurrent readers"""
+    
+    def __init__(self, number: int, collection_name: str, chunks: List[str], collection, source: str):
+        self.number = number
+        self.collection_name = collection_name
+        self.chunks = chunks
+        self.chunks_by_id = {chunk_id(chunk): chunk for chunk in chunks}
+        # Same chunks give the same fingerprint, so reloading an unchanged PDF keeps client caches valid
+        self.fingerprint = hashlib.sha1("".join(sorted(self.chunks_by_id)).encode("utf-8")).hexdigest()[:12]
+        self.collection = collection
+        self.source = source
+        self.created_at = datetime.now().isoformat()
+        self.readers = 0
+        self.retired = False
+
 class RAGService:
     """Service for RAG-based legal document Q&A"""
     
     def __init__(self):
         """Initialize the RAG service"""
         self.client = None
-        self.documents_loaded = False
-        self.document_chunks = []
-        self.collection = None
+        self._live_generation = None
+        self._generation_counter = 0
+        self._generation_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self.last_reload = None
         self._initialize_openai_client()
     
+    @property
+    def documents_loaded(self) -> bool:
+        """True once a generation of the index is live"""
+        return self._live_generation is not None
+    
+    @property
+    def document_chunks(self) -> List[str]:
+        """Chunks of the live index generation"""
+        generation = self._live_generation
+        return generation.chunks if generation else []
+    
+    @property
+    def index_fingerprint(self) -> Optional[str]:
+        """Content fingerprint of the live index generation, None before the first load"""
+        generation = self._live_generation
+        return generation.fingerprint if generation else None
+    
+    @property
+    def collection(self):
+        """Vector collection of the live index generation"""
+        generation = self._live_generation
+        return generation.collection if generation else None
+    
+    @contextmanager
+    def _acquire_generation(self):
+        """Pin the live generation so a concurrent swap cannot drop it mid-query"""
+        with self._generation_lock:
+            generation = self._live_generation
+            if generation:
+                generation.readers += 1
+        try:
+            yield generation
+        finally:
+            if generation:
+                self._release_generation(generation)
+    
+    def _release_generation(self, generation: IndexGeneration):
+        """Drop a reader; free the generation once it is retired and unused"""
+        with self._generation_lock:
+            generation.readers -= 1
+            drop = generation.retired and generation.readers == 0
+        if drop:
+            self._drop_generation(generation)
+    
+    def _drop_generation(self, generation: IndexGeneration):
+        """Release the vector collection of a retired generation"""
+        embedding_service.drop_collection(generation.collection_name)
+        generation.collection = None
+        generation.chunks = []
+        generation.chunks_by_id = {}
+        logger.info(f"Released index generation {generation.number}")
+    
+    def _swap_generation(self, generation: IndexGeneration):
+        """Atomically make a freshly built generation live and retire the old one"""
+        with self._generation_lock:
+            old_generation = self._live_generation
+            self._live_generation = generation
+            embedding_service.collection = generation.collection
+            drop = False
+            if old_generation:
+                old_generation.retired = True
+                drop = old_generation.readers == 0
+        logger.info(f"🔁 Index generation {generation.number} is live")
+        if drop:
+            self._drop_generation(old_generation)
+    
     def _initialize_openai_client(self):
         """Initialize Azure OpenAI client for chat completion"""
         try:
@@ -43,12 +135,14 @@ class RAGService:
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {e}")
     
-    def load_documents(self, pdf_path: str) -> Dict[str, Any]:
+    def load_documents(self, pdf_path: str,
+                       progress_callback: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
         """
         Load and process PDF documents for RAG
         
         Args:
             pdf_path (str): Path to PDF file
+            progress_callback (Callable, optional): Called with (fraction, message) while indexing
             
         Returns:
             Dict[str, Any]: Loading status and information
@@ -71,24 +165,27 @@ class RAGService:
                     "error": "No text chunks extracted from PDF"
                 }
             
-            self.document_chunks = chunks
+            # Build vector index into a new generation while the live one keeps serving
+            with self._generation_lock:
+                self._generation_counter += 1
+                number = self._generation_counter
+            collection_name = f"{embedding_service.collection_name}_g{number}"
             
-            # Build vector index
-            collection = embedding_service.build_index(chunks)
+            collection = embedding_service.build_index(chunks, collection_name, progress_callback)
             if not collection:
                 return {
                     "success": False,
                     "error": "Failed to build vector index"
                 }
             
-            self.collection = collection
-            self.documents_loaded = True
+            self._swap_generation(IndexGeneration(number, collection_name, chunks, collection, pdf_path))
             
             logger.info(f"✅ Successfully loaded {len(chunks)} document chunks")
             
             return {
                 "success": True,
                 "chunks_count": len(chunks),
+                "generation": number,
                 "message": f"Successfully loaded {len(chunks)} document chunks"
             }
             
@@ -99,27 +196,51 @@ class RAGService:
                 "error": f"Failed to load documents: {str(e)}"
             }
     
-    def search_documents(self, query: str, k: int = 5) -> List[str]:
+    def search_documents(self, query: str, k: int = 5, rerank: Optional[bool] = None) -> List[str]:
         """
         Search for relevant document chunks
         
         Args:
             query (str): Search query
             k (int): Number of results to return
+            rerank (bool, optional): Oversample and rerank candidates, uses config default if None
             
         Returns:
             List[str]: Relevant document chunks
         """
+        return [chunk for chunk, _ in self.search_documents_with_scores(query, k, rerank)]
+    
+    def search_documents_with_scores(self, query: str, k: int = 5,
+                                     rerank: Optional[bool] = None) -> List[Tuple[str, Optional[float]]]:
+        """
+        Search like search_documents(), keeping the score of each chunk
+        
+        Scores are rerank relevance (higher is better) when reranking, otherwise
+        vector distance (lower is better).
+        
+        Returns:
+            List[Tuple[str, Optional[float]]]: (chunk, score) pairs in relevance order
+        """
         try:
-            if not self.documents_loaded:
-                logger.warning("No documents loaded for search")
-                return []
-            
-            # Enhance search query
-            enhanced_query = build_search_prompt(query)
-            
-            # Perform search
-            results = embedding_service.search(enhanced_query, self.collection, k)
+            with self._acquire_generation() as generation:
+                if not generation:
+                    logger.warning("No documents loaded for search")
+                    return []
+                
+                # Enhance search query
+                enhanced_query = build_search_prompt(query)
+                
+                if rerank is None:
+                    rerank = Config.RAG_RERANK_ENABLED
+                
+                # Perform search
+                if rerank:
+                    candidates = embedding_service.search(
+                        enhanced_query, generation.collection, max(k, Config.RAG_RERANK_CANDIDATES)
+                    )
+                    results = reranker.rerank_with_scores(query, candidates, top_n=k)
+                else:
+                    results = embedding_service.search_with_scores(enhanced_query, generation.collection, k)
             
             logger.info(f"Search for '{query}' returned {len(results)} results")
             return results
@@ -128,13 +249,29 @@ class RAGService:
             logger.error(f"Error searching documents: {e}")
             return []
     
-    def chat_with_context(self, user_message: str, conversation_history: List[Dict] = None) -> Dict[str, Any]:
+    def resolve_chunks(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """
+        Look up chunk texts by id in the live index
+        
+        Args:
+            chunk_ids (List[str]): Ids from stored context references
+            
+        Returns:
+            Dict[str, str]: Texts of the ids that exist in the live index
+        """
+        generation = self._live_generation
+        chunks_by_id = generation.chunks_by_id if generation else {}
+        return {cid: chunks_by_id[cid] for cid in chunk_ids if cid in chunks_by_id}
+    
+    def chat_with_context(self, user_message: str, conversation_history: List[Dict] = None,
+                          rerank: Optional[bool] = None) -> Dict[str, Any]:
         """
         Generate AI response with RAG context
         
         Args:
             user_message (str): User's message/question
             conversation_history (List[Dict], optional): Previous conversation messages
+            rerank (bool, optional): Enable/disable the rerank stage for this request
             
         Returns:
             Dict[str, Any]: AI response with metadata
@@ -146,10 +283,14 @@ class RAGService:
                     "error": "OpenAI client not initialized"
                 }
             
+            if rerank is None:
+                rerank = Config.RAG_RERANK_ENABLED
+            
             # Search for relevant context
-            context_snippets = []
+            context_hits = []
             if self.documents_loaded:
-                context_snippets = self.search_documents(user_message, k=5)
+                context_hits = self.search_documents_with_scores(user_message, k=5, rerank=rerank)
+            context_snippets = [chunk for chunk, _ in context_hits]
             
             # Build prompt with context
             if context_snippets:
@@ -183,7 +324,10 @@ class RAGService:
                 "success": True,
                 "response": response_content,
                 "context_used": len(context_snippets),
-                "context_snippets": context_snippets[:3],  # First 3 for reference
+                # First 3 for reference: messages store ids/pages/scores, the texts are only returned
+                "context_refs": [make_context_ref(chunk, score) for chunk, score in context_hits[:3]],
+                "context_score": "rerank" if rerank else "distance",
+                "context_snippets": context_snippets[:3],
                 "response_type": response_type,
                 "tokens_used": completion.usage.total_tokens if completion.usage else None
             }
@@ -204,13 +348,22 @@ class RAGService:
         """
         try:
             collection_info = embedding_service.get_collection_info()
+            generation = self._live_generation
             
             return {
                 "openai_client": self.client is not None,
                 "documents_loaded": self.documents_loaded,
                 "chunks_count": len(self.document_chunks),
                 "collection_info": collection_info,
-                "embedding_service": embedding_service.client is not None
+                "index_generation": {
+                    "number": generation.number,
+                    "source": generation.source,
+                    "created_at": generation.created_at,
+                    "readers": generation.readers
+                } if generation else None,
+                "reload_in_progress": self.is_reloading(),
+                "last_reload": self.last_reload,
+                "embedding_service": embedding_service.client is not None or embedding_service.embedding_function is not None
             }
             
         except Exception as e:
@@ -219,12 +372,20 @@ class RAGService:
                 "error": str(e)
             }
     
-    def reload_documents(self, pdf_path: str = None) -> Dict[str, Any]:
+    def is_reloading(self) -> bool:
+        """Check whether a background reload is running"""
+        return self._reload_thread is not None and self._reload_thread.is_alive()
+    
+    def reload_documents(self, pdf_path: str = None, background: bool = True) -> Dict[str, Any]:
         """
-        Reload documents from PDF
+        Reload documents from PDF without taking the live index offline
+        
+        The new generation is built while queries keep hitting the current one,
+        then swapped in atomically.
         
         Args:
             pdf_path (str, optional): Path to PDF file, uses default if None
+            background (bool): Build in a background thread and return immediately
             
         Returns:
             Dict[str, Any]: Reload status
@@ -234,13 +395,32 @@ class RAGService:
             if pdf_path is None:
                 pdf_path = os.path.join(os.path.dirname(__file__), "..", "data", "law_documents.pdf")
             
-            # Reset state
-            self.documents_loaded = False
-            self.document_chunks = []
-            self.collection = None
+            if not self._reload_lock.acquire(blocking=False):
+                return {
+                    "success": False,
+                    "error": "A reload is already in progress"
+                }
+            
+            if not background:
+                try:
+                    return self._run_reload(pdf_path)
+                finally:
+                    self._reload_lock.release()
+            
+            def worker():
+                try:
+                    self._run_reload(pdf_path)
+                finally:
+                    self._reload_lock.release()
             
-            # Reload documents
-            return self.load_documents(pdf_path)
+            self._reload_thread = threading.Thread(target=worker, name="rag-reload", daemon=True)
+            self._reload_thread.start()
+            
+            return {
+                "success": True,
+                "message": "Reload started, the current index keeps serving until the new one is ready",
+                "live_generation": self._live_generation.number if self._live_generation else None
+            }
             
         except Exception as e:
             logger.error(f"Error reloading documents: {e}")
@@ -248,6 +428,18 @@ class RAGService:
                 "success": False,
                 "error": f"Failed to reload documents: {str(e)}"
             }
+    
+    def _run_reload(self, pdf_path: str) -> Dict[str, Any]:
+        """Build and swap in a new generation, recording the outcome"""
+        started_at = datetime.now().isoformat()
+        result = self.load_documents(pdf_path)
+        self.last_reload = {
+            "started_at": started_at,
+            "finished_at": datetime.now().isoformat(),
+            "success": result.get("success", False),
+            "error": result.get("error")
+        }
+        return result
 
 # Global RAG service instance
 rag_service = RAGService()
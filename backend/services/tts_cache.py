@@ -0,0 +1,168 @@
+"""
+Content-addressed cache for synthesized audio
+Audio is stored under a hash of (model, sampling rate, render mode, normalized text) and the
+least recently used entries are evicted once the cache exceeds its byte budget
+"""
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".wav"
+
+# Render modes: the same text sounds different depending on how it was leveled, so each has its own entry
+RENDER_NORMALIZED = "normalized"  # Whole waveform normalized at once (render_wav)
+RENDER_PEAK_LIMITED = "peak_limited"  # Each sentence only scaled down if it would clip (stream_audio)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry (NFC, collapsed whitespace)"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+class TTSAudioCache:
+    """LRU cache of WAV files on disk, bounded by total size in bytes"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Open the cache directory and index the entries already on disk
+
+        The index lives in memory and is rebuilt from the directory at startup;
+        file modification times record the last access, so LRU order survives restarts.
+
+        Args:
+            cache_dir (str): Directory holding <key>.wav files
+            max_bytes (int): Size budget, 0 disables caching
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not self.enabled:
+            return
+        os.makedirs(cache_dir, exist_ok=True)
+
+        found = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif name.endswith(CACHE_SUFFIX):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name[:-len(CACHE_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @property
+    def enabled(self) -> bool:
+        """False when the size budget is 0"""
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(model_name: str, sampling_rate: int, text: str, render: str = RENDER_NORMALIZED) -> str:
+        """
+        Cache key of a synthesis request
+
+        Args:
+            model_name (str): Model id
+            sampling_rate (int): Output sampling rate
+            text (str): Text to synthesize (normalized before hashing)
+            render (str): How the waveform was leveled (RENDER_NORMALIZED or RENDER_PEAK_LIMITED)
+
+        Returns:
+            str: SHA-256 hex digest
+        """
+        payload = "\0".join([model_name, str(sampling_rate), render, normalize_text(text)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        """File path of a cache entry (whether or not it exists)"""
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up an entry and mark it as recently used
+
+        Returns:
+            Optional[str]: Path of the cached WAV file, None on a miss
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Removed behind our back: forget the entry
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> Optional[str]:
+        """
+        Store audio bytes under a key, evicting least recently used entries if needed
+
+        Returns:
+            Optional[str]: Path of the cached file, None when caching is disabled
+            or the entry alone exceeds the budget
+        """
+        if not self.enabled or len(data) > self.max_bytes:
+            return None
+
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget (caller holds the lock)"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Entries, size and hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "directory": self.cache_dir,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
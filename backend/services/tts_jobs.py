@@ -0,0 +1,573 @@
+"""
+Asynchronous TTS jobs on a bounded pool of worker processes
+Inference runs outside the Flask process (and its GIL): a request submits a job,
+gets a job id back and polls or waits for the result. Streams run in the same
+workers, which send PCM chunks back over a queue shared by all workers. Cache
+lookups and writes stay in the server process, which owns the cache index.
+"""
+import os
+import math
+import time
+import uuid
+import queue
+import atexit
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator, Tuple
+import logging
+
+from config.config import Config
+from utils.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED_STATES = (DONE, FAILED)
+
+# Recent jobs kept for the queue wait / synthesis time percentiles
+METRICS_WINDOW = 500
+
+# ========== Worker process side ==========
+
+_worker_service = None
+_stream_queue = None
+
+
+def _exit_with_parent(parent_pid: int):
+    """Stop the worker once the server process is gone (e.g. killed), so models are not left running"""
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(0)
+
+
+def _init_worker(parent_pid: int, num_threads: int, stream_queue):
+    """
+    Load the TTS model once per worker process
+
+    The worker never touches the audio cache: its in-memory index would diverge
+    from the server's, so the cache is disabled before the service is created.
+    """
+    global _worker_service, _stream_queue
+    _stream_queue = stream_queue
+    threading.Thread(target=_exit_with_parent, args=(parent_pid,), daemon=True).start()
+    Config.TTS_CACHE_MAX_MB = 0
+    if num_threads:
+        Config.TTS_NUM_THREADS = num_threads
+    from services.tts_service import TTSService
+
+    _worker_service = TTSService(load_model=True)
+
+
+def _worker_probe() -> Dict[str, Any]:
+    """Report the worker's model (also serves as warm-up of one worker)"""
+    if not _worker_service.is_available:
+        raise RuntimeError("TTS model could not be loaded in the worker process")
+    return {"sampling_rate": _worker_service.model.config.sampling_rate, "pid": os.getpid()}
+
+
+def _worker_synthesize(text: str) -> Dict[str, Any]:
+    """Synthesize one job in the worker; wall-clock timestamps let the server measure queue wait"""
+    started_at = time.time()
+    if not _worker_service.is_available:
+        raise RuntimeError("TTS model could not be loaded in the worker process")
+    audio = _worker_service.render_wav(text)
+    return {
+        "audio": audio,
+        "sampling_rate": _worker_service.model.config.sampling_rate,
+        "started_at": started_at,
+        "finished_at": time.time(),
+        "pid": os.getpid()
+    }
+
+
+def _worker_stream(stream_id: str, text: str) -> Dict[str, Any]:
+    """
+    Synthesize a stream in the worker, sending (stream_id, chunk) items to the server
+
+    The stream ends with (stream_id, None), or (stream_id, error message) on failure;
+    both travel on the same queue after the chunks, so the server sees them in order.
+    """
+    started_at = time.time()
+    try:
+        if not _worker_service.is_available:
+            raise RuntimeError("TTS model could not be loaded in the worker process")
+        for chunk in _worker_service.stream_audio(text, "pcm"):
+            _stream_queue.put((stream_id, chunk))
+        _stream_queue.put((stream_id, None))
+    except Exception as e:
+        _stream_queue.put((stream_id, str(e) or e.__class__.__name__))
+        raise
+    return {"started_at": started_at, "finished_at": time.time(), "pid": os.getpid()}
+
+# ========== Server side ==========
+
+
+class TTSQueueFull(Exception):
+    """Raised when the number of unfinished jobs reached the queue limit"""
+
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"TTS queue is full ({depth} jobs)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class TTSTimeout(Exception):
+    """Raised when a synchronous request stops waiting for its job (the job keeps running)"""
+
+    def __init__(self, job: "TTSJob", timeout: float):
+        super().__init__(f"TTS job {job.id} did not finish within {timeout:g}s")
+        self.job = job
+        self.timeout = timeout
+
+
+class TTSJob:
+    """State of one synthesis job"""
+
+    def __init__(self, text: str, output_filename: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.text = text
+        self.output_filename = output_filename
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.cached = False
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.done = threading.Event()
+
+    @property
+    def queue_wait_seconds(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return max(0.0, self.started_at - self.submitted_at)
+
+    @property
+    def synthesis_seconds(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None or self.cached:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        state = self.state
+        if state == QUEUED and self.future is not None and self.future.running():
+            # Handed to a worker (the pool prefetches one job per worker, so this may start a little later)
+            state = RUNNING
+
+        def timestamp(value):
+            return datetime.fromtimestamp(value).isoformat() if value else None
+
+        def seconds(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            "job_id": self.id,
+            "state": state,
+            "text": self.text,
+            "cached": self.cached,
+            "result": self.result,
+            "error": self.error,
+            "submitted_at": timestamp(self.submitted_at),
+            "started_at": timestamp(self.started_at),
+            "finished_at": timestamp(self.finished_at),
+            "queue_wait_seconds": seconds(self.queue_wait_seconds),
+            "synthesis_seconds": seconds(self.synthesis_seconds)
+        }
+
+
+def _summary(values) -> Dict[str, Any]:
+    values = list(values)
+    if not values:
+        return {"count": 0, "avg": None, "p50": None, "p95": None, "max": None}
+    return {
+        "count": len(values),
+        "avg": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "max": round(max(values), 3)
+    }
+
+
+class TTSJobQueue:
+    """Bounded queue of TTS jobs executed by a process pool"""
+
+    def __init__(self, workers: int, max_queue: int, job_ttl_seconds: float):
+        """
+        Args:
+            workers (int): Worker processes, each with its own copy of the model (0 disables the queue)
+            max_queue (int): Maximum unfinished (queued + running) jobs before submissions are rejected
+            job_ttl_seconds (float): How long finished jobs stay available for polling
+        """
+        self.workers = max(0, workers)
+        self.max_queue = max(1, max_queue)
+        self.job_ttl_seconds = job_ttl_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, TTSJob]" = OrderedDict()
+        self._active = 0
+        self._probe = None
+        self.sampling_rate = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self._queue_waits = deque(maxlen=METRICS_WINDOW)
+        self._synthesis_times = deque(maxlen=METRICS_WINDOW)
+        # Chunks of running streams, routed by a dispatcher thread to the request that reads them
+        self._stream_queue = None
+        self._streams: Dict[str, "queue.Queue"] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """False when no worker processes are configured"""
+        return self.workers > 0
+
+    def _worker_threads(self) -> int:
+        """Intra-op threads per worker: split the cores between workers unless configured"""
+        if Config.TTS_NUM_THREADS:
+            return Config.TTS_NUM_THREADS
+        return max(1, (os.cpu_count() or 1) // self.workers)
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        """Start the pool on first use (caller holds the lock)"""
+        if self._executor is None:
+            # spawn: forking a threaded Flask process (and torch's thread pools) is not safe
+            context = multiprocessing.get_context("spawn")
+            if self._stream_queue is None:
+                # Created once and handed to every worker at start, so it survives pool restarts
+                self._stream_queue = context.Queue()
+                threading.Thread(target=self._dispatch_streams, name="tts-stream-dispatcher", daemon=True).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(os.getpid(), self._worker_threads(), self._stream_queue)
+            )
+            self._probe = self._executor.submit(_worker_probe)
+            self._probe.add_done_callback(self._on_probe)
+            logger.info(f"Started TTS worker pool with {self.workers} processes")
+        return self._executor
+
+    def _on_probe(self, future):
+        try:
+            self.sampling_rate = future.result()["sampling_rate"]
+        except Exception as e:
+            logger.error(f"TTS worker failed to start: {e}")
+
+    def warm_up(self, timeout: Optional[float] = None) -> bool:
+        """
+        Start the pool and wait until one worker has loaded the model
+
+        Returns:
+            bool: True if the worker is ready
+        """
+        with self._lock:
+            self._ensure_executor()
+            probe = self._probe
+        try:
+            probe.result(timeout=timeout)
+            return True
+        except Exception as e:
+            logger.error(f"TTS worker warm-up failed: {e}")
+            return False
+
+    def _cache_key(self, text: str) -> Optional[str]:
+        """Cache key of a text, None until a worker reported the model's sampling rate"""
+        from services.tts_service import tts_service
+
+        if self.sampling_rate is None:
+            return None
+        return tts_service.cache.key_for(tts_service.model_variant, self.sampling_rate, text)
+
+    def submit(self, text: str, output_filename: Optional[str] = None) -> TTSJob:
+        """
+        Queue a synthesis job, or finish it immediately from the audio cache
+
+        Args:
+            text (str): Text to synthesize
+            output_filename (str, optional): Custom filename for output
+
+        Returns:
+            TTSJob: The new job
+
+        Raises:
+            TTSQueueFull: The queue limit is reached (retry after TTSQueueFull.retry_after seconds)
+        """
+        from services.tts_service import tts_service
+
+        self._prune()
+        job = TTSJob(text, output_filename)
+
+        cache_key = self._cache_key(text)
+        cached_path = tts_service.cache.get(cache_key) if cache_key else None
+        if cached_path:
+            job.cached = True
+            job.started_at = job.submitted_at
+            self._finish(job, tts_service.store_audio(text, cache_key, cached_path=cached_path,
+                                                      output_filename=output_filename))
+            with self._lock:
+                self._jobs[job.id] = job
+                self.submitted += 1
+                self.cache_hits += 1
+            return job
+
+        with self._lock:
+            job.future = self._submit_locked(_worker_synthesize, text)
+            self._jobs[job.id] = job
+        job.future.add_done_callback(lambda future: self._on_done(job, future))
+        return job
+
+    def _submit_locked(self, fn, *args):
+        """
+        Hand work to the pool within the queue limit (caller holds the lock)
+
+        Raises:
+            TTSQueueFull: The queue limit is reached
+        """
+        if self._active >= self.max_queue:
+            self.rejected += 1
+            raise TTSQueueFull(self._active, self._retry_after())
+        executor = self._ensure_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory): replace the pool and retry once
+            logger.error("TTS worker pool is broken, restarting it")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            future = self._ensure_executor().submit(fn, *args)
+        self._active += 1
+        self.submitted += 1
+        return future
+
+    # ========== Streaming ==========
+
+    def _dispatch_streams(self):
+        """Route chunks from the workers to the stream they belong to (chunks of abandoned streams are dropped)"""
+        while True:
+            stream_id, item = self._stream_queue.get()
+            with self._lock:
+                chunks = self._streams.get(stream_id)
+            if chunks is not None:
+                chunks.put(item)
+
+    def open_stream(self, text: str, audio_format: str = "wav") -> Tuple[int, Iterator[bytes]]:
+        """
+        Start streaming a text from a worker process, or from the audio cache
+
+        Args:
+            text (str): Text to synthesize
+            audio_format (str): "wav" (streaming header followed by PCM) or "pcm" (raw 16-bit mono)
+
+        Returns:
+            Tuple[int, Iterator[bytes]]: Sampling rate and the audio chunks
+
+        Raises:
+            TTSQueueFull: The queue limit is reached
+            RuntimeError: No worker could load the model
+        """
+        from services.tts_service import tts_service
+
+        if not self.warm_up():
+            raise RuntimeError("TTS model could not be loaded in the worker process")
+        sampling_rate = self.sampling_rate
+        cache_key = tts_service.stream_cache_key(text, sampling_rate)
+        cached_path = tts_service.cache.get(cache_key)
+        if cached_path:
+            with self._lock:
+                self.submitted += 1
+                self.cache_hits += 1
+            return sampling_rate, tts_service.stream_cached(cached_path, audio_format)
+
+        stream_id = uuid.uuid4().hex
+        chunks = queue.Queue()
+        submitted_at = time.time()
+        with self._lock:
+            future = self._submit_locked(_worker_stream, stream_id, text)
+            self._streams[stream_id] = chunks
+        future.add_done_callback(lambda future: self._on_stream_done(stream_id, submitted_at, future))
+        return sampling_rate, self._iter_stream(stream_id, chunks, audio_format, sampling_rate, cache_key)
+
+    def _iter_stream(self, stream_id: str, chunks: "queue.Queue", audio_format: str,
+                     sampling_rate: int, cache_key: str) -> Iterator[bytes]:
+        """Yield a worker's chunks as they arrive; a stream that runs to the end is cached"""
+        from services.tts_service import tts_service
+        from utils.tts_segments import streaming_wav_header
+
+        try:
+            if audio_format == "wav":
+                yield streaming_wav_header(sampling_rate)
+            pcm_parts = []
+            while True:
+                item = chunks.get()
+                if item is None:
+                    break
+                if isinstance(item, str):
+                    raise RuntimeError(item)
+                pcm_parts.append(item)
+                yield item
+            tts_service.cache_stream(cache_key, pcm_parts, sampling_rate)
+        finally:
+            # Client gone or stream over: later chunks of this stream are dropped by the dispatcher
+            with self._lock:
+                self._streams.pop(stream_id, None)
+
+    def _on_stream_done(self, stream_id: str, submitted_at: float, future):
+        """Account for a finished stream; a worker that died cannot end its stream, so end it here"""
+        try:
+            output = future.result()
+            failed = False
+        except Exception as e:
+            output = None
+            failed = True
+            with self._lock:
+                chunks = self._streams.get(stream_id)
+            if chunks is not None:
+                chunks.put(str(e) or e.__class__.__name__)
+
+        with self._lock:
+            self._active -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self._queue_waits.append(max(0.0, output["started_at"] - submitted_at))
+                self._synthesis_times.append(output["finished_at"] - output["started_at"])
+
+    def _on_done(self, job: TTSJob, future):
+        """Store the worker's audio (in the server process) and finish the job"""
+        from services.tts_service import tts_service
+
+        try:
+            output = future.result()
+            job.started_at = output["started_at"]
+            job.finished_at = output["finished_at"]
+            if self.sampling_rate is None:
+                self.sampling_rate = output["sampling_rate"]
+            cache_key = tts_service.cache.key_for(tts_service.model_variant, output["sampling_rate"], job.text)
+            result = tts_service.store_audio(job.text, cache_key, audio=output["audio"],
+                                             output_filename=job.output_filename)
+        except Exception as e:
+            result = {"success": False, "error": str(e) or e.__class__.__name__, "text": job.text}
+
+        with self._lock:
+            self._active -= 1
+            if job.queue_wait_seconds is not None:
+                self._queue_waits.append(job.queue_wait_seconds)
+            if job.synthesis_seconds is not None:
+                self._synthesis_times.append(job.synthesis_seconds)
+        self._finish(job, result)
+
+    def _finish(self, job: TTSJob, result: Dict[str, Any]):
+        if job.finished_at is None:
+            job.finished_at = time.time()
+        if result.get("success"):
+            # Paths stay on the server; clients download by filename
+            job.result = {k: v for k, v in result.items() if k not in ("file_path", "text")}
+            job.state = DONE
+            with self._lock:
+                self.completed += 1
+        else:
+            job.error = result.get("error", "Unknown error")
+            job.state = FAILED
+            with self._lock:
+                self.failed += 1
+        job.done.set()
+
+    def _retry_after(self) -> int:
+        """Seconds until a queue slot is likely free, from recent synthesis times (caller holds the lock)"""
+        average = sum(self._synthesis_times) / len(self._synthesis_times) if self._synthesis_times else 1.0
+        return max(1, math.ceil(average * (self._active - self.max_queue + 1) / self.workers))
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.job_ttl_seconds
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.state in FINISHED_STATES and job.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[TTSJob]:
+        """
+        Look up a job, optionally waiting for it to finish
+
+        Args:
+            job_id (str): Job id returned by submit
+            wait (float): Seconds to wait for an unfinished job (0 returns immediately)
+
+        Returns:
+            Optional[TTSJob]: The job, None if unknown or expired
+        """
+        self._prune()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job and wait:
+            job.done.wait(wait)
+        return job
+
+    def text_to_speech(self, text: str, output_filename: Optional[str] = None,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Synthesize in a worker process and wait for the result (synchronous endpoints)
+
+        Args:
+            text (str): Text to synthesize
+            output_filename (str, optional): Custom filename for output
+            timeout (float, optional): Seconds to wait, TTS_SYNC_TIMEOUT_SECONDS by default
+
+        Returns:
+            dict: Result in the format of TTSService.text_to_speech, without file_path
+
+        Raises:
+            TTSQueueFull: The queue limit is reached
+            TTSTimeout: The job did not finish in time; it stays available for polling
+        """
+        if timeout is None:
+            timeout = Config.TTS_SYNC_TIMEOUT_SECONDS
+        job = self.submit(text, output_filename)
+        if not job.done.wait(timeout):
+            raise TTSTimeout(job, timeout)
+        if job.state == DONE:
+            return {**job.result, "text": text}
+        return {"success": False, "error": job.error, "text": text}
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, job counters and queue wait / synthesis time statistics"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "pool_started": self._executor is not None,
+                "max_queue": self.max_queue,
+                "depth": self._active,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "cache_hits": self.cache_hits,
+                "queue_wait_seconds": _summary(self._queue_waits),
+                "synthesis_seconds": _summary(self._synthesis_times)
+            }
+
+    def shutdown(self):
+        """Stop the worker processes, cancelling queued jobs"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global job queue (worker processes start on first submission or during warm-up)
+tts_job_queue = TTSJobQueue(Config.TTS_WORKERS, Config.TTS_QUEUE_MAX, Config.TTS_JOB_TTL_SECONDS)
+atexit.register(tts_job_queue.shutdown)
@@ -0,0 +1,81 @@
+"""
+ONNX Runtime backend for the MMS-TTS (VITS) model
+Runs a model exported by tools/export_tts_onnx.py without PyTorch in the serving process
+"""
+import os
+import json
+from types import SimpleNamespace
+from typing import Dict, Any
+
+import numpy as np
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_METADATA_FILE = "tts_onnx.json"
+
+# Graph inputs/outputs shared by the exporter and the runtime
+ONNX_INPUTS = ("input_ids", "attention_mask", "noise_scale", "noise_scale_duration", "speaking_rate")
+ONNX_OUTPUTS = ("waveform", "sequence_lengths")
+
+
+def read_metadata(model_dir: str) -> Dict[str, Any]:
+    """
+    Read the metadata written next to the exported model
+
+    Args:
+        model_dir (str): Export directory
+
+    Returns:
+        Dict[str, Any]: model_name, sampling_rate and default noise/speaking-rate settings
+    """
+    with open(os.path.join(model_dir, ONNX_METADATA_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class OnnxVitsModel:
+    """Exported VITS model called like the transformers model: model(input_ids=..., attention_mask=...)"""
+
+    def __init__(self, model_dir: str, num_threads: int = 0):
+        """
+        Open an ONNX Runtime session on the exported model
+
+        Args:
+            model_dir (str): Directory with model.onnx, tts_onnx.json and the tokenizer files
+            num_threads (int): Intra-op threads, 0 lets ONNX Runtime decide
+        """
+        import onnxruntime as ort
+
+        metadata = read_metadata(model_dir)
+        self.model_dir = model_dir
+        self.config = SimpleNamespace(sampling_rate=metadata["sampling_rate"], name_or_path=metadata["model_name"])
+        self.noise_scale = metadata["noise_scale"]
+        self.noise_scale_duration = metadata["noise_scale_duration"]
+        self.speaking_rate = metadata["speaking_rate"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+
+    def __call__(self, input_ids, attention_mask):
+        """
+        Synthesize a padded batch
+
+        Args:
+            input_ids (np.ndarray): Token ids, shape (batch, tokens)
+            attention_mask (np.ndarray): 1 for real tokens, 0 for padding
+
+        Returns:
+            SimpleNamespace: waveform (batch, samples) and sequence_lengths (batch,) as numpy arrays
+        """
+        feeds = {
+            "input_ids": np.asarray(input_ids, dtype=np.int64),
+            "attention_mask": np.asarray(attention_mask, dtype=np.int64),
+            "noise_scale": np.array(self.noise_scale, dtype=np.float32),
+            "noise_scale_duration": np.array(self.noise_scale_duration, dtype=np.float32),
+            "speaking_rate": np.array(self.speaking_rate, dtype=np.float32),
+        }
+        waveform, sequence_lengths = self.session.run(list(ONNX_OUTPUTS), feeds)
+        return SimpleNamespace(waveform=waveform, sequence_lengths=sequence_lengths)
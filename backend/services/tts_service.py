@@ -1,41 +1,234 @@
+import io
 import os
 import uuid
+import wave
+import shutil
 import tempfile
+import threading
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, List, Any, Iterator
 import logging
+from config.config import Config
+from services.tts_cache import TTSAudioCache, RENDER_PEAK_LIMITED
+from utils.tts_segments import (
+    split_into_segments, crossfade_concat, iter_batches, Crossfader, limit_peak, pcm16_bytes, streaming_wav_header
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Execution backends: PyTorch eager (transformers) or an ONNX export run by ONNX Runtime
+BACKENDS = ("torch", "onnx")
+
+# CPU inference options (see Config.TTS_INFERENCE_MODE / TTS_QUANTIZE)
+INFERENCE_MODES = ("no_grad", "inference_mode")
+QUANTIZE_MODES = ("none", "int8")
+
+def model_key(model_name: str, quantize: str = "none", compile_model: bool = False) -> str:
+    """Registry key of a model variant, e.g. facebook/mms-tts-vie[int8,compiled]"""
+    options = [option for option, enabled in ((quantize, quantize != "none"), ("compiled", compile_model)) if enabled]
+    return f"{model_name}[{','.join(options)}]" if options else model_name
+
+def optimize_model(model, quantize: str = "none", compile_model: bool = False):
+    """
+    Apply opt-in CPU optimizations to a loaded model
+    
+    Args:
+        model: Model in eval mode
+        quantize (str): "int8" stores Linear weights as int8 (dynamic quantization,
+            activations are quantized on the fly); "none" keeps float32
+        compile_model (bool): Wrap the model with torch.compile (first calls are slow
+            while graphs are compiled; dynamic shapes avoid recompiling per text length)
+        
+    Returns:
+        The optimized model
+    """
+    import torch
+    
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown TTS quantization '{quantize}', use one of: {', '.join(QUANTIZE_MODES)}")
+    if quantize == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if compile_model:
+        model = torch.compile(model, dynamic=True)
+    return model
+
+class TTSModelRegistry:
+    """Process-wide cache of loaded TTS models, so each model is held in memory once"""
+    
+    def __init__(self):
+        """Initialize an empty registry"""
+        self._models: Dict[str, Tuple[Any, Any]] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, model_name: str, quantize: str = "none", compile_model: bool = False) -> Tuple[Any, Any]:
+        """
+        Return the (tokenizer, model) pair, loading it on first use
+        
+        Concurrent callers for the same model variant wait for a single load.
+        
+        Args:
+            model_name (str): Hugging Face model id
+            quantize (str): Quantization applied after loading, see optimize_model
+            compile_model (bool): Wrap the model with torch.compile
+            
+        Returns:
+            Tuple[Any, Any]: Tokenizer and model in eval mode
+        """
+        key = model_key(model_name, quantize, compile_model)
+        loaded = self._models.get(key)
+        if loaded:
+            return loaded
+        
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            if key not in self._models:
+                from transformers import AutoTokenizer, AutoModelForTextToWaveform
+                
+                logger.info(f"Loading TTS model {key}...")
+                tokenizer = AutoTokenizer.from_pretrained(model_name)
+                model = AutoModelForTextToWaveform.from_pretrained(model_name)
+                model.eval()
+                self._models[key] = (tokenizer, optimize_model(model, quantize, compile_model))
+        return self._models[key]
+    
+    def get_onnx(self, model_dir: str, num_threads: int = 0) -> Tuple[Any, Any]:
+        """
+        Return the (tokenizer, model) pair of an ONNX export, loading it on first use
+        
+        Args:
+            model_dir (str): Directory written by tools/export_tts_onnx.py
+            num_threads (int): ONNX Runtime intra-op threads, 0 for its default
+            
+        Returns:
+            Tuple[Any, Any]: Tokenizer and OnnxVitsModel
+        """
+        key = f"{model_dir}[onnx]"
+        loaded = self._models.get(key)
+        if loaded:
+            return loaded
+        
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            if key not in self._models:
+                from transformers import AutoTokenizer
+                from services.tts_onnx import OnnxVitsModel
+                
+                logger.info(f"Loading ONNX TTS model from {model_dir}...")
+                tokenizer = AutoTokenizer.from_pretrained(model_dir)
+                self._models[key] = (tokenizer, OnnxVitsModel(model_dir, num_threads))
+        return self._models[key]
+    
+    def is_loaded(self, model_name: str, quantize: str = "none", compile_model: bool = False) -> bool:
+        """Check whether a model variant is already in memory"""
+        return model_key(model_name, quantize, compile_model) in self._models
+    
+    def loaded_models(self) -> List[str]:
+        """Keys of the model variants currently in memory"""
+        return list(self._models)
+
+# Shared by every TTSService instance in the process
+model_registry = TTSModelRegistry()
+
 class TTSService:
     """Text-to-Speech service using Meta's MMS-TTS model"""
     
-    def __init__(self):
-        """Initialize the TTS service with the model and tokenizer"""
+    def __init__(self, load_model: bool = True):
+        """
+        Initialize the TTS service with the model and tokenizer
+        
+        Args:
+            load_model (bool): Load the model now; if False it is loaded by
+                ensure_loaded() on first use or during background warm-up
+        """
         self.model_name = "facebook/mms-tts-vie"
         self.tokenizer = None
         self.model = None
         self.output_dir = os.path.join(tempfile.gettempdir(), "tts_outputs")
+        self.batch_size = Config.TTS_BATCH_SIZE
+        self.max_segment_chars = Config.TTS_MAX_SEGMENT_CHARS
+        self.crossfade_ms = Config.TTS_CROSSFADE_MS
+        self.inference_mode = Config.TTS_INFERENCE_MODE
+        self.quantize = Config.TTS_QUANTIZE
+        self.compile_model = Config.TTS_COMPILE
+        self.num_threads = Config.TTS_NUM_THREADS
+        self.backend = Config.TTS_BACKEND
+        self.onnx_dir = Config.TTS_ONNX_DIR
+        # Repeated requests for the same text are served from disk without inference
+        self.cache = TTSAudioCache(
+            Config.TTS_CACHE_DIR or os.path.join(tempfile.gettempdir(), "tts_cache"),
+            int(Config.TTS_CACHE_MAX_MB * 1024 * 1024)
+        )
         self.is_available = False
+        self.is_loading = False
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
         
         # Create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
         
         # Try to load model
-        self._load_model()
+        if load_model:
+            self.ensure_loaded()
+    
+    def ensure_loaded(self) -> bool:
+        """
+        Load the model once; concurrent callers wait for the same load
+        
+        Returns:
+            bool: True if the model is available
+        """
+        if self._load_attempted:
+            return self.is_available
+        
+        with self._load_lock:
+            if not self._load_attempted:
+                self.is_loading = True
+                try:
+                    self._load_model()
+                finally:
+                    self._load_attempted = True
+                    self.is_loading = False
+        return self.is_available
+    
+    @property
+    def model_variant(self) -> str:
+        """Name of the model variant in use; part of the audio cache key since variants sound slightly different"""
+        if self.backend == "onnx":
+            return f"{self.model_name}[onnx]"
+        return model_key(self.model_name, self.quantize, self.compile_model)
     
     def _load_model(self):
         """Load the tokenizer and model with error handling"""
         try:
+            if self.backend not in BACKENDS:
+                raise ValueError(f"Unknown TTS backend '{self.backend}', use one of: {', '.join(BACKENDS)}")
+            
             # Check if required packages are available
             self._check_dependencies()
             
-            logger.info("Loading TTS model...")
-            from transformers import AutoTokenizer, AutoModelForTextToWaveform
+            if self.backend == "onnx":
+                # Same tokenizer pipeline, forward pass in ONNX Runtime (PyTorch is not imported)
+                self.tokenizer, self.model = model_registry.get_onnx(self.onnx_dir, self.num_threads)
+                self.is_available = True
+                logger.info(f"TTS model loaded from ONNX export {self.onnx_dir}")
+                return
+            
+            if self.inference_mode not in INFERENCE_MODES:
+                raise ValueError(
+                    f"Unknown TTS inference mode '{self.inference_mode}', use one of: {', '.join(INFERENCE_MODES)}"
+                )
+            if self.num_threads:
+                import torch
+                # Intra-op threads are process-wide; leave cores for the request threads
+                torch.set_num_threads(self.num_threads)
             
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForTextToWaveform.from_pretrained(self.model_name)
+            # The registry loads each model once per process and hands out the same instance
+            self.tokenizer, self.model = model_registry.get(self.model_name, self.quantize, self.compile_model)
             self.is_available = True
             logger.info("TTS model loaded successfully!")
             
@@ -48,7 +241,10 @@ class TTSService:
     
     def _check_dependencies(self):
         """Check if all required dependencies are available"""
-        required_modules = ['torch', 'transformers', 'scipy', 'numpy']
+        if self.backend == "onnx":
+            required_modules = ['onnxruntime', 'transformers', 'numpy']
+        else:
+            required_modules = ['torch', 'transformers', 'scipy', 'numpy']
         missing = []
         
         for module in required_modules:
@@ -60,10 +256,205 @@ class TTSService:
         if missing:
             raise ImportError(f"Missing required modules: {', '.join(missing)}")
     
+    def _inference_context(self):
+        """Autograd-free context for the forward pass (inference_mode also skips version tracking)"""
+        if self.backend == "onnx":
+            return nullcontext()
+        import torch
+        return torch.inference_mode() if self.inference_mode == "inference_mode" else torch.no_grad()
+    
+    def _synthesize_batch(self, texts: List[str]) -> List[Any]:
+        """
+        Run one padded forward pass over several segments
+        
+        Args:
+            texts (List[str]): Segments to synthesize together
+            
+        Returns:
+            List[np.ndarray]: Float waveform per segment, trimmed to its own length
+        """
+        import numpy as np
+        
+        # Torch tensors for PyTorch, numpy arrays for ONNX Runtime; the code below works on both
+        inputs = self.tokenizer(texts, return_tensors="np" if self.backend == "onnx" else "pt", padding=True)
+        
+        # Segments with nothing the tokenizer can speak (digits only, symbols) produce empty audio
+        keep = inputs["attention_mask"].sum(1) > 0
+        waveforms = [np.zeros(0, dtype=np.float32) for _ in texts]
+        if not keep.any():
+            return waveforms
+        inputs = {name: tensor[keep] for name, tensor in inputs.items()}
+        
+        with self._inference_context():
+            output = self.model(**inputs)
+        
+        # Padded rows produce trailing audio; sequence_lengths gives each row's real length in samples
+        lengths = getattr(output, "sequence_lengths", None)
+        rows = [index for index, kept in enumerate(keep.tolist()) if kept]
+        for row, index in enumerate(rows):
+            waveform = output.waveform[row]
+            if lengths is not None:
+                waveform = waveform[:int(lengths[row])]
+            if hasattr(waveform, "cpu"):
+                waveform = waveform.cpu().numpy()
+            waveforms[index] = np.asarray(waveform, dtype=np.float32)
+        return waveforms
+    
+    def iter_waveforms(self, text: str, first_batch_size: Optional[int] = None) -> Iterator[Any]:
+        """
+        Synthesize text sentence by sentence
+        
+        The text is split into segments of at most max_segment_chars, which are
+        synthesized batch_size at a time, so memory stays bounded for any length.
+        
+        Args:
+            text (str): Text to synthesize
+            first_batch_size (int, optional): Size of the first batch; 1 gets the
+                first sentence out as early as possible when streaming
+            
+        Yields:
+            np.ndarray: Float waveform of each segment in reading order
+        """
+        segments = split_into_segments(text, self.max_segment_chars)
+        head = first_batch_size or self.batch_size
+        if segments[:head]:
+            yield from self._synthesize_batch(segments[:head])
+        for batch in iter_batches(segments[head:], self.batch_size):
+            yield from self._synthesize_batch(batch)
+    
+    def synthesize(self, text: str):
+        """
+        Synthesize text into one float waveform, joining segments with short crossfades
+        
+        Args:
+            text (str): Text to synthesize
+            
+        Returns:
+            np.ndarray: Float waveform at the model sampling rate
+        """
+        overlap = int(self.model.config.sampling_rate * self.crossfade_ms / 1000)
+        return crossfade_concat(self.iter_waveforms(text), overlap)
+    
+    def render_wav(self, text: str) -> bytes:
+        """
+        Synthesize text into a complete WAV file in memory
+        
+        Args:
+            text (str): Text to synthesize (the model must be loaded)
+            
+        Returns:
+            bytes: 16-bit mono WAV, normalized to prevent clipping
+        """
+        # Generate waveform sentence by sentence (no length limit, memory bounded by batch size)
+        waveform = self.synthesize(text)
+        if not len(waveform):
+            raise ValueError("Text contains nothing that can be spoken")
+        
+        # Normalize waveform to prevent clipping
+        return self._wav_bytes(self._normalize_waveform(waveform).tobytes(), self.model.config.sampling_rate)
+    
+    def stream_audio(self, text: str, audio_format: str = "wav") -> Iterator[bytes]:
+        """
+        Synthesize text sentence by sentence and yield encoded audio as it is produced
+        
+        The first sentence is synthesized on its own so playback can start early.
+        The whole text is never normalized at once; each sentence is only scaled
+        down if it would clip.
+        
+        Args:
+            text (str): Text to synthesize (the model must be loaded)
+            audio_format (str): "wav" (streaming header followed by PCM) or "pcm" (raw 16-bit mono)
+            
+        Yields:
+            bytes: Header (wav only), then 16-bit little-endian PCM chunks
+        """
+        sampling_rate = self.model.config.sampling_rate
+        cache_key = self.stream_cache_key(text, sampling_rate)
+        cached_path = self.cache.get(cache_key)
+        if cached_path:
+            yield from self.stream_cached(cached_path, audio_format)
+            return
+        
+        if audio_format == "wav":
+            yield streaming_wav_header(sampling_rate)
+        
+        # PCM is kept so a stream that runs to the end can be cached (disconnects are not)
+        pcm_parts = []
+        crossfader = Crossfader(int(sampling_rate * self.crossfade_ms / 1000))
+        for waveform in self.iter_waveforms(text, first_batch_size=1):
+            ready = crossfader.push(limit_peak(waveform))
+            if len(ready):
+                pcm_parts.append(pcm16_bytes(ready))
+                yield pcm_parts[-1]
+        tail = crossfader.flush()
+        if len(tail):
+            pcm_parts.append(pcm16_bytes(tail))
+            yield pcm_parts[-1]
+        
+        self.cache_stream(cache_key, pcm_parts, sampling_rate)
+    
+    def stream_cache_key(self, text: str, sampling_rate: int) -> str:
+        """Cache key of streamed audio, separate from render_wav output (normalized over the whole text)"""
+        return self.cache.key_for(self.model_variant, sampling_rate, text, RENDER_PEAK_LIMITED)
+    
+    def cache_stream(self, cache_key: str, pcm_parts: List[bytes], sampling_rate: int):
+        """Cache the PCM of a stream that ran to the end as a WAV file"""
+        if pcm_parts and self.cache.enabled:
+            self.cache.put(cache_key, self._wav_bytes(b"".join(pcm_parts), sampling_rate))
+    
+    def stream_cached(self, path: str, audio_format: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Stream a cached WAV file, as is or as raw PCM frames"""
+        if audio_format == "wav":
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        
+        with wave.open(path, "rb") as wav:
+            frames = chunk_size // wav.getsampwidth()
+            while True:
+                chunk = wav.readframes(frames)
+                if not chunk:
+                    return
+                yield chunk
+    
+    @staticmethod
+    def _wav_bytes(pcm: bytes, sampling_rate: int) -> bytes:
+        """Wrap 16-bit mono PCM in a WAV container"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sampling_rate)
+            wav.writeframes(pcm)
+        return buffer.getvalue()
+    
+    def find_audio_file(self, filename: str) -> Optional[str]:
+        """
+        Locate a generated audio file for download
+        
+        Args:
+            filename (str): Name returned by text_to_speech
+            
+        Returns:
+            Optional[str]: Path in the output or cache directory, None if not found
+        """
+        for directory in (self.output_dir, self.cache.cache_dir):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                return path
+        return None
+    
     def text_to_speech(self, text: str, output_filename: Optional[str] = None) -> Dict:
         """
         Convert text to speech and save as WAV file
         
+        Results are cached by (model, sampling rate, normalized text): a repeated
+        text returns the cached file without running the model. Without a custom
+        filename the cached file itself is returned.
+        
         Args:
             text (str): The text to convert to speech
             output_filename (str, optional): Custom filename for output
@@ -71,7 +462,7 @@ class TTSService:
         Returns:
             dict: Result containing success status, file path, and metadata
         """
-        if not self.is_available:
+        if not self.ensure_loaded():
             return {
                 'success': False,
                 'error': 'TTS service is not available. Missing dependencies: torch, transformers, scipy, numpy',
@@ -79,17 +470,43 @@ class TTSService:
             }
         
         try:
-            import torch
-            import scipy.io.wavfile
-            import numpy as np
-            
             if not text or not text.strip():
                 raise ValueError("Text cannot be empty")
             
-            # Validate text length (reasonable limit)
-            if len(text) > 5000:
-                raise ValueError("Text is too long. Please limit to 5000 characters.")
+            cache_key = self.cache.key_for(self.model_variant, self.model.config.sampling_rate, text)
+            cached_path = self.cache.get(cache_key)
+            audio = None if cached_path else self.render_wav(text)
+            return self.store_audio(text, cache_key, audio=audio, cached_path=cached_path,
+                                    output_filename=output_filename)
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'text': text if 'text' in locals() else None
+            }
+    
+    def store_audio(self, text: str, cache_key: str, audio: Optional[bytes] = None,
+                    cached_path: Optional[str] = None, output_filename: Optional[str] = None) -> Dict:
+        """
+        Save synthesized audio and describe the resulting file
+        
+        New audio goes into the cache; a copy is written to the output directory
+        when a custom filename is requested or the audio cannot be cached.
+        
+        Args:
+            text (str): Text the audio was synthesized from
+            cache_key (str): Cache key of the text
+            audio (bytes, optional): WAV bytes of a new synthesis
+            cached_path (str, optional): Cached file when the audio came from the cache
+            output_filename (str, optional): Custom filename for output
             
+        Returns:
+            dict: Result in the format of text_to_speech
+        """
+        file_path = cached_path or self.cache.put(cache_key, audio)
+        
+        if output_filename or file_path is None:
             # Generate unique filename if not provided
             if not output_filename:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -101,47 +518,30 @@ class TTSService:
                 output_filename += '.wav'
             
             output_path = os.path.join(self.output_dir, output_filename)
-            
-            # Tokenize the input text
-            inputs = self.tokenizer(text, return_tensors="pt")
-            
-            # Generate waveform
-            with torch.no_grad():
-                output = self.model(**inputs)
-            
-            # Extract waveform
-            waveform = output.waveform[0].cpu().numpy()
-            
-            # Normalize waveform to prevent clipping
-            waveform = self._normalize_waveform(waveform)
-            
-            # Save to WAV file
-            scipy.io.wavfile.write(
-                output_path, 
-                rate=self.model.config.sampling_rate, 
-                data=waveform
-            )
-            
-            # Get file size
-            file_size = os.path.getsize(output_path)
-            
-            return {
-                'success': True,
-                'file_path': output_path,
-                'filename': output_filename,
-                'text': text,
-                'duration_seconds': len(waveform) / self.model.config.sampling_rate,
-                'sampling_rate': self.model.config.sampling_rate,
-                'file_size_bytes': file_size,
-                'created_at': datetime.now().isoformat()
-            }
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'text': text if 'text' in locals() else None
-            }
+            if file_path:
+                shutil.copyfile(file_path, output_path)
+            else:
+                with open(output_path, 'wb') as f:
+                    f.write(audio)
+            file_path = output_path
+        else:
+            output_filename = os.path.basename(file_path)
+        
+        with wave.open(file_path, 'rb') as wav:
+            duration = wav.getnframes() / wav.getframerate()
+            sampling_rate = wav.getframerate()
+        
+        return {
+            'success': True,
+            'file_path': file_path,
+            'filename': output_filename,
+            'text': text,
+            'duration_seconds': duration,
+            'sampling_rate': sampling_rate,
+            'file_size_bytes': os.path.getsize(file_path),
+            'cached': cached_path is not None,
+            'created_at': datetime.now().isoformat()
+        }
     
     def _normalize_waveform(self, waveform):
         """
@@ -213,8 +613,20 @@ class TTSService:
                 'sampling_rate': self.model.config.sampling_rate if self.model else None,
                 'is_loaded': self.is_available and self.model is not None and self.tokenizer is not None,
                 'is_available': self.is_available,
+                'is_loading': self.is_loading,
+                'loaded_models': model_registry.loaded_models(),
+                'inference': {
+                    'backend': self.backend,
+                    'mode': self.inference_mode,
+                    'quantize': self.quantize,
+                    'compile': self.compile_model,
+                    'num_threads': self.num_threads or None
+                },
+                'cache': self.cache.get_stats(),
                 'output_directory': self.output_dir,
-                'status': 'Ready' if self.is_available else 'Dependencies missing'
+                'status': 'Ready' if self.is_available else (
+                    'Loading' if self.is_loading or not self._load_attempted else 'Dependencies missing'
+                )
             }
         except Exception as e:
             return {
@@ -226,19 +638,27 @@ class TTSService:
                 'status': 'Error'
             }
 
-# Create global instance with error handling
+# Create global instance with error handling (model is loaded by warm-up or on first use)
 try:
-    tts_service = TTSService()
-    logger.info(f"TTS Service initialized - Available: {tts_service.is_available}")
+    tts_service = TTSService(load_model=False)
+    logger.info("TTS Service created - model will load during warm-up or on first use")
 except Exception as e:
     logger.error(f"Failed to initialize TTS Service: {e}")
     # Create a dummy service that will return appropriate error messages
     class DummyTTSService:
         def __init__(self):
             self.is_available = False
+            self.is_loading = False
             self.output_dir = os.path.join(tempfile.gettempdir(), "tts_outputs")
             os.makedirs(self.output_dir, exist_ok=True)
         
+        def ensure_loaded(self):
+            return False
+        
+        def find_audio_file(self, filename):
+            path = os.path.join(self.output_dir, filename)
+            return path if os.path.isfile(path) else None
+        
         def text_to_speech(self, text, output_filename=None):
             return {
                 'success': False,
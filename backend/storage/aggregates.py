@@ -0,0 +1,56 @@
+# ========== IMPORTS ==========
+from typing import Dict, Any, Iterable
+
+# Các field tổng hợp được duy trì trên mỗi conversation
+AGGREGATE_FIELDS = ('message_count', 'last_message_at', 'total_tokens')
+
+# Bộ đếm phiên bản, tăng mỗi khi conversation hoặc messages của nó thay đổi (dùng làm ETag)
+VERSION_FIELD = 'version'
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Số tokens đã dùng để tạo message (0 nếu không có)"""
+    tokens = (message.get('metadata') or {}).get('tokens_used')
+    return tokens if isinstance(tokens, int) else 0
+
+def next_version(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    """Field version mới của conversation sau một thay đổi (update có thể truyền version để giữ nguyên)"""
+    return {VERSION_FIELD: (conversation.get(VERSION_FIELD) or 0) + 1}
+
+def apply_message_insert(conversation: Dict[str, Any], message: Dict[str, Any]) -> Dict[str, Any]:
+    """Cộng một message mới vào các field tổng hợp của conversation"""
+    timestamp = message.get('timestamp', '')
+    last_message_at = conversation.get('last_message_at') or ''
+    return {
+        'message_count': (conversation.get('message_count') or 0) + 1,
+        'total_tokens': (conversation.get('total_tokens') or 0) + message_tokens(message),
+        'last_message_at': max(last_message_at, timestamp),
+        'updated_at': max(conversation.get('updated_at') or '', timestamp),
+        **next_version(conversation)
+    }
+
+def apply_message_delete(conversation: Dict[str, Any], message: Dict[str, Any],
+                         last_message_at: str = None) -> Dict[str, Any]:
+    """Trừ một message đã xóa khỏi các field tổng hợp; last_message_at do store tính lại"""
+    return {
+        'message_count': max(0, (conversation.get('message_count') or 0) - 1),
+        'total_tokens': max(0, (conversation.get('total_tokens') or 0) - message_tokens(message)),
+        'last_message_at': last_message_at,
+        **next_version(conversation)
+    }
+
+def compute_aggregates(messages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Tính lại toàn bộ các field tổng hợp từ danh sách messages"""
+    count = 0
+    tokens = 0
+    last_message_at = None
+    for message in messages:
+        count += 1
+        tokens += message_tokens(message)
+        timestamp = message.get('timestamp')
+        if timestamp and (last_message_at is None or timestamp > last_message_at):
+            last_message_at = timestamp
+    return {
+        'message_count': count,
+        'total_tokens': tokens,
+        'last_message_at': last_message_at
+    }
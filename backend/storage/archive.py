@@ -0,0 +1,167 @@
+# ========== IMPORTS ==========
+import os
+import gzip
+import json
+import threading
+from typing import List, Dict, Optional, Any, Iterator
+import logging
+
+# ========== LOGGER SETUP ==========
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = ".json.gz"
+# Danh sách message id của mỗi file archive (một id mỗi dòng) để tra message theo id mà không giải nén
+IDS_SUFFIX = ".ids"
+ARCHIVE_VERSION = 1
+
+class ConversationArchive:
+    """
+    Kho lạnh cho conversations không còn hoạt động: mỗi conversation một file JSON nén gzip
+
+    File chứa {"version", "conversation", "messages"} và được ghi qua file tạm + os.replace
+    nên không bao giờ thấy file ghi dở. Danh sách id conversation và map message id -> conversation id
+    (đọc từ file .ids đi kèm) được giữ trong bộ nhớ để kiểm tra nhanh.
+    """
+
+    def __init__(self, archive_dir: str, compress_level: int = 6):
+        """Mở thư mục archive, dọn file tạm còn sót và đọc danh sách conversations đã archive"""
+        self.archive_dir = archive_dir
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        os.makedirs(archive_dir, exist_ok=True)
+
+        self._ids = set()
+        self._message_conversations: Dict[str, str] = {}
+        self._message_ids: Dict[str, List[str]] = {}
+        names = os.listdir(archive_dir)
+        for name in names:
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(archive_dir, name))
+            elif name.endswith(ARCHIVE_SUFFIX):
+                self._ids.add(name[:-len(ARCHIVE_SUFFIX)])
+        for conversation_id in self._ids:
+            self._load_message_ids(conversation_id)
+
+    def _path(self, conversation_id: str) -> str:
+        # Conversation id được dùng làm tên file nên không cho phép ký tự đường dẫn
+        if not conversation_id or os.path.basename(conversation_id) != conversation_id or conversation_id.startswith('.'):
+            raise ValueError(f"Conversation id không hợp lệ cho archive: {conversation_id}")
+        return os.path.join(self.archive_dir, conversation_id + ARCHIVE_SUFFIX)
+
+    def _ids_path(self, conversation_id: str) -> str:
+        return self._path(conversation_id)[:-len(ARCHIVE_SUFFIX)] + IDS_SUFFIX
+
+    def _load_message_ids(self, conversation_id: str):
+        """Đọc file .ids của một archive; archive cũ chưa có file này thì tạo lại từ file nén"""
+        try:
+            with open(self._ids_path(conversation_id), 'r', encoding='utf-8') as f:
+                message_ids = f.read().split()
+        except FileNotFoundError:
+            record = self.read(conversation_id)
+            if record is None:
+                return
+            message_ids = [m['id'] for m in record['messages'] if m.get('id')]
+            self._write_message_ids(conversation_id, message_ids)
+        self._index_message_ids(conversation_id, message_ids)
+
+    def _index_message_ids(self, conversation_id: str, message_ids: List[str]):
+        self._message_ids[conversation_id] = message_ids
+        for message_id in message_ids:
+            self._message_conversations[message_id] = conversation_id
+
+    def _write_message_ids(self, conversation_id: str, message_ids: List[str]):
+        path = self._ids_path(conversation_id)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write("\n".join(message_ids))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._ids
+
+    def ids(self) -> List[str]:
+        """Danh sách id các conversations đã archive"""
+        with self._lock:
+            return list(self._ids)
+
+    def write(self, conversation: Dict[str, Any], messages: List[Dict[str, Any]]) -> int:
+        """Ghi conversation cùng messages vào file nén (fsync trước khi thay file), trả về số bytes"""
+        path = self._path(conversation['id'])
+        tmp_path = path + ".tmp"
+        message_ids = [m['id'] for m in messages if m.get('id')]
+        # File .ids ghi trước: nếu dừng giữa chừng thì file thừa được ghi đè ở lần archive sau
+        self._write_message_ids(conversation['id'], message_ids)
+        payload = json.dumps({
+            "version": ARCHIVE_VERSION,
+            "conversation": conversation,
+            "messages": messages
+        }, ensure_ascii=False).encode('utf-8')
+
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=self.compress_level) as compressed:
+                compressed.write(payload)
+            raw.flush()
+            os.fsync(raw.fileno())
+            size = raw.tell()
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._ids.add(conversation['id'])
+            self._index_message_ids(conversation['id'], message_ids)
+        return size
+
+    def read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Đọc {"conversation", "messages"} của conversation đã archive, None nếu không có"""
+        if conversation_id not in self._ids:
+            return None
+        try:
+            with gzip.open(self._path(conversation_id), 'rb') as compressed:
+                return json.loads(compressed.read().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+
+    def conversation_of(self, message_id: str) -> Optional[str]:
+        """Id conversation đã archive chứa message, None nếu message không nằm trong archive"""
+        return self._message_conversations.get(message_id)
+
+    def read_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Đọc một message đã archive theo id (giải nén file archive của conversation chứa nó)"""
+        conversation_id = self.conversation_of(message_id)
+        record = self.read(conversation_id) if conversation_id else None
+        if record is None:
+            return None
+        return next((m for m in record['messages'] if m.get('id') == message_id), None)
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Duyệt messages của mọi conversation đã archive"""
+        for conversation_id in self.ids():
+            record = self.read(conversation_id)
+            if record is not None:
+                yield from record['messages']
+
+    def delete(self, conversation_id: str) -> bool:
+        """Xóa file archive của conversation"""
+        with self._lock:
+            self._ids.discard(conversation_id)
+            for message_id in self._message_ids.pop(conversation_id, []):
+                self._message_conversations.pop(message_id, None)
+        try:
+            os.remove(self._ids_path(conversation_id))
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(self._path(conversation_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Số conversations và tổng dung lượng đã archive"""
+        total_bytes = 0
+        for conversation_id in self.ids():
+            try:
+                total_bytes += os.path.getsize(self._path(conversation_id))
+            except OSError:
+                pass
+        return {"conversations": len(self._ids), "bytes": total_bytes}
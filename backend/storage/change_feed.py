@@ -0,0 +1,108 @@
+# ========== IMPORTS ==========
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Optional, Any, Tuple
+
+# Loại thay đổi trong feed
+MESSAGE_ADDED = "message_added"
+MESSAGE_DELETED = "message_deleted"
+CONVERSATION_UPDATED = "conversation_updated"
+CONVERSATION_DELETED = "conversation_deleted"
+# Lịch sử trước mốc này không còn liên tục (bulk import): client phải tải lại messages
+RESET = "reset"
+
+class ChangeFeedBusy(Exception):
+    """Đã có quá nhiều request long-poll đang chờ"""
+
+class ChangeFeed:
+    """
+    Nhật ký thay đổi gần đây của từng conversation (trong bộ nhớ), đánh số bằng version của conversation
+
+    Mỗi lần version tăng được publish đúng một entry (version, type, id) theo thứ tự version;
+    entry chỉ giữ id, nội dung message được đọc lại từ store khi trả về cho client.
+    Chỉ giữ `history_size` entries cho mỗi conversation và `max_conversations` conversations gần nhất;
+    client có `since` cũ hơn phần lịch sử còn giữ sẽ nhận reset.
+    """
+
+    def __init__(self, history_size: int = 200, max_conversations: int = 1000, max_waiters: int = 100):
+        """Khởi tạo feed rỗng"""
+        self.history_size = history_size
+        self.max_conversations = max_conversations
+        self.max_waiters = max_waiters
+        self._lock = threading.Lock()
+        self._logs: "OrderedDict[str, deque]" = OrderedDict()
+        self._conditions: Dict[str, threading.Condition] = {}
+        self._waiting: Dict[str, int] = {}
+        self._waiter_count = 0
+
+    def _latest(self, conversation_id: str) -> float:
+        log = self._logs.get(conversation_id)
+        return log[-1][0] if log else float('-inf')
+
+    def publish(self, conversation_id: str, version: int, change_type: str, record_id: Optional[str] = None,
+                clear: bool = False):
+        """Ghi một thay đổi (gọi theo đúng thứ tự version của conversation) và đánh thức các long-poll"""
+        with self._lock:
+            log = self._logs.get(conversation_id)
+            if log is None:
+                log = self._logs[conversation_id] = deque(maxlen=self.history_size)
+                while len(self._logs) > self.max_conversations:
+                    self._logs.popitem(last=False)
+            else:
+                self._logs.move_to_end(conversation_id)
+            if clear:
+                log.clear()
+            log.append((version, change_type, record_id))
+
+            condition = self._conditions.get(conversation_id)
+            if condition is not None:
+                condition.notify_all()
+
+    def forget(self, conversation_id: str):
+        """Bỏ lịch sử của conversation (ví dụ khi archive); client đang theo dõi sẽ nhận reset"""
+        with self._lock:
+            self._logs.pop(conversation_id, None)
+
+    def changes_since(self, conversation_id: str, since: int) -> Optional[List[Tuple[int, str, Optional[str]]]]:
+        """
+        Các entries có version > since theo thứ tự, hoặc None nếu lịch sử không còn liên tục từ since
+        """
+        with self._lock:
+            log = self._logs.get(conversation_id)
+            if not log or log[-1][0] <= since:
+                return []
+            entries = [entry for entry in log if entry[0] > since]
+        if entries[0][0] != since + 1 or any(change_type == RESET for _, change_type, _ in entries):
+            return None
+        return entries
+
+    def wait(self, conversation_id: str, since: int, timeout: float) -> bool:
+        """
+        Chờ tới khi conversation có thay đổi sau `since` hoặc hết timeout, trả về True nếu có thay đổi
+
+        Raise ChangeFeedBusy nếu số request đang chờ đã đạt max_waiters.
+        """
+        with self._lock:
+            if self._latest(conversation_id) > since:
+                return True
+            if self._waiter_count >= self.max_waiters:
+                raise ChangeFeedBusy()
+
+            condition = self._conditions.get(conversation_id)
+            if condition is None:
+                condition = self._conditions[conversation_id] = threading.Condition(self._lock)
+            self._waiting[conversation_id] = self._waiting.get(conversation_id, 0) + 1
+            self._waiter_count += 1
+            try:
+                return condition.wait_for(lambda: self._latest(conversation_id) > since, timeout)
+            finally:
+                self._waiter_count -= 1
+                self._waiting[conversation_id] -= 1
+                if not self._waiting[conversation_id]:
+                    del self._waiting[conversation_id]
+                    del self._conditions[conversation_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Số conversations đang có lịch sử và số long-poll đang chờ"""
+        with self._lock:
+            return {"conversations": len(self._logs), "waiters": self._waiter_count}
@@ -0,0 +1,111 @@
+# ========== IMPORTS ==========
+import json
+import base64
+import binascii
+import bisect
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, Any
+
+# Giới hạn số messages mỗi trang
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Cursor timestamp nhỏ hơn mọi message, dùng với `after` để đọc từ message cũ nhất
+OLDEST_TIMESTAMP_CURSOR = datetime.min.isoformat()
+
+def parse_timestamp_cursor(value: str) -> str:
+    """Kiểm tra cursor dạng ISO timestamp, raise ValueError nếu không hợp lệ"""
+    try:
+        datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Cursor không hợp lệ: {value}")
+    return value
+
+def parse_page_size(value: Optional[str], default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Đọc tham số limit từ query string"""
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit phải là số nguyên")
+    if limit <= 0:
+        raise ValueError("limit phải lớn hơn 0")
+    return min(limit, MAX_PAGE_SIZE)
+
+def slice_page(entries: List[Tuple], limit: int, before_key: Optional[Tuple] = None,
+               after_key: Optional[Tuple] = None) -> Tuple[List[Tuple], bool]:
+    """Cắt một trang từ danh sách khóa (timestamp, ...) đã sắp xếp, trả về (entries, has_more)"""
+    if after_key is not None:
+        start = bisect.bisect_right(entries, after_key)
+        return entries[start:start + limit], start + limit < len(entries)
+    end = len(entries) if before_key is None else bisect.bisect_left(entries, before_key)
+    start = max(0, end - limit)
+    return entries[start:end], start > 0
+
+# ========== CONVERSATION LISTING ==========
+# Conversations được liệt kê mới nhất trước theo một trong các field này
+CONVERSATION_ORDER_FIELDS = ('updated_at', 'created_at')
+# Projection gọn cho sidebar (fields=summary)
+CONVERSATION_SUMMARY_FIELDS = ('id', 'title', 'updated_at', 'message_count')
+
+def encode_conversation_cursor(value: str, conversation_id: str) -> str:
+    """Mã hóa vị trí (giá trị field sắp xếp, id) của conversation cuối trang thành cursor"""
+    raw = json.dumps([value, conversation_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_conversation_cursor(cursor: str) -> Tuple[str, str]:
+    """Giải mã cursor của danh sách conversations, raise ValueError nếu không hợp lệ"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, conversation_id = json.loads(raw)
+        if not isinstance(value, str) or not isinstance(conversation_id, str):
+            raise ValueError
+    except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError(f"Cursor không hợp lệ: {cursor}")
+    return value, conversation_id
+
+def conversation_sort_key(conversation: Dict[str, Any], order_by: str) -> Tuple[str, str]:
+    """Khóa sắp xếp của conversation: (giá trị field, id) để thứ tự ổn định khi trùng giá trị"""
+    return (conversation.get(order_by) or '', conversation.get('id') or '')
+
+class ConversationOrdering:
+    """Duy trì các danh sách (giá trị, id) đã sắp xếp theo từng field để phân trang không cần sort lại"""
+
+    def __init__(self):
+        self._keys: Dict[str, List[Tuple[str, str]]] = {field: [] for field in CONVERSATION_ORDER_FIELDS}
+        self._current: Dict[str, Dict[str, Tuple[str, str]]] = {}
+
+    def upsert(self, conversation: Dict[str, Any]):
+        """Thêm conversation hoặc cập nhật vị trí khi field sắp xếp thay đổi"""
+        conversation_id = conversation.get('id')
+        current = self._current.setdefault(conversation_id, {})
+        for field, keys in self._keys.items():
+            key = conversation_sort_key(conversation, field)
+            old = current.get(field)
+            if old == key:
+                continue
+            if old is not None:
+                del keys[bisect.bisect_left(keys, old)]
+            if not keys or keys[-1] <= key:
+                keys.append(key)
+            else:
+                bisect.insort(keys, key)
+            current[field] = key
+
+    def remove(self, conversation_id: str):
+        """Xóa conversation khỏi mọi danh sách"""
+        current = self._current.pop(conversation_id, None)
+        if not current:
+            return
+        for field, key in current.items():
+            keys = self._keys[field]
+            del keys[bisect.bisect_left(keys, key)]
+
+    def ids(self, order_by: str) -> List[str]:
+        """Tất cả conversation ids, mới nhất trước"""
+        return [conversation_id for _, conversation_id in reversed(self._keys[order_by])]
+
+    def page(self, order_by: str, limit: int, after: Optional[Tuple[str, str]] = None) -> Tuple[List[str], bool]:
+        """Lấy `limit` ids tiếp theo sau cursor (mới nhất trước), trả về (ids, has_more)"""
+        entries, has_more = slice_page(self._keys[order_by], limit, before_key=after)
+        return [conversation_id for _, conversation_id in reversed(entries)], has_more
@@ -0,0 +1,542 @@
+# ========== IMPORTS ==========
+import os
+import json
+import time
+import queue
+import bisect
+import threading
+from collections import namedtuple
+from typing import List, Dict, Optional, Any, Tuple, Iterator
+from storage.aggregates import apply_message_insert, apply_message_delete, next_version
+from storage.cursors import parse_timestamp_cursor, slice_page, ConversationOrdering
+import logging
+
+# ========== LOGGER SETUP ==========
+logger = logging.getLogger(__name__)
+
+# ========== LOG FORMAT ==========
+# Mỗi dòng JSONL là một record {"op": ..., ...}; trạng thái hiện tại = replay toàn bộ log theo thứ tự
+#   conversation        : thêm/ghi đè conversation (data)
+#   update_conversation : merge fields vào conversation (id, fields)
+#   delete_conversation : xóa conversation và messages của nó (id)
+#   insert_message      : thêm message và cập nhật các field tổng hợp của conversation (data)
+#   message             : thêm message giữ nguyên các field tổng hợp (bulk insert, compaction)
+#   delete_message      : xóa message và trừ khỏi các field tổng hợp (id)
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+# Vị trí của một message trong file log
+MessageLocation = namedtuple('MessageLocation', ['offset', 'length', 'conversation_id', 'timestamp', 'seq'])
+
+class _PendingWrite:
+    """Một nhóm records chờ được group commit"""
+
+    __slots__ = ('records', 'results', 'error', 'done')
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self.results = []
+        self.error = None
+        self.done = threading.Event()
+
+class LogStore:
+    """
+    Lưu conversations và messages trong một file log append-only (JSONL)
+
+    Mọi ghi đi qua một committer thread: records của các request đồng thời được gom lại,
+    ghi bằng một lần write() và fsync theo policy. Trong bộ nhớ chỉ giữ conversations và
+    index offset của messages; nội dung message được đọc lại từ file khi cần.
+    Khi phần dữ liệu chết vượt ngưỡng, file được compaction ở background.
+    """
+
+    name = "log"
+
+    def __init__(self, log_path: str, fsync_policy: str = 'interval', fsync_interval_ms: int = 1000,
+                 group_commit_ms: float = 0, compact_min_bytes: int = 4 * 1024 * 1024,
+                 compact_ratio: float = 0.5):
+        """Mở (hoặc tạo) file log và replay để dựng lại trạng thái"""
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy} (expected one of {FSYNC_POLICIES})")
+
+        self.log_path = log_path
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.group_commit_delay = group_commit_ms / 1000.0
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_ratio = compact_ratio
+
+        directory = os.path.dirname(os.path.abspath(log_path))
+        os.makedirs(directory, exist_ok=True)
+
+        # _lock bảo vệ trạng thái trong bộ nhớ và file đọc;
+        # _io_lock đảm bảo append và compaction không chạy cùng lúc
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+
+        self._conversations: Dict[str, Dict[str, Any]] = {}
+        self._ordering = ConversationOrdering()
+        self._conversation_bytes: Dict[str, int] = {}
+        self._locations: Dict[str, MessageLocation] = {}
+        self._messages_by_conversation: Dict[str, List[Tuple[str, int, str]]] = {}
+        self._next_seq = 0
+        self._dead_bytes = 0
+        self._file_size = 0
+
+        self._replay()
+
+        self._fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        self._reader = open(log_path, 'rb')
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._closed = False
+
+        self._queue: "queue.Queue[Optional[_PendingWrite]]" = queue.Queue()
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._committer = threading.Thread(target=self._run_committer, name="log-store-committer", daemon=True)
+        self._committer.start()
+
+    # ========== REPLAY ==========
+
+    def _replay(self):
+        """Đọc lại toàn bộ log; dòng cuối bị ghi dở (crash giữa chừng) được cắt bỏ"""
+        if not os.path.exists(self.log_path):
+            return
+
+        offset = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    logger.warning(f"⚠️ Truncating incomplete record at offset {offset} in {self.log_path}")
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"⚠️ Skipping corrupt record at offset {offset} in {self.log_path}")
+                    self._dead_bytes += len(line)
+                else:
+                    try:
+                        self._apply(record, offset, len(line))
+                    except Exception as e:
+                        # Record đọc được nhưng không áp dụng được: bỏ qua như record hỏng
+                        logger.warning(f"⚠️ Skipping invalid record at offset {offset} in {self.log_path}: {e!r}")
+                        self._dead_bytes += len(line)
+                offset += len(line)
+
+        if offset < os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(offset)
+        self._file_size = offset
+
+        logger.info(f"📜 Replayed {self.log_path}: {len(self._conversations)} conversations, "
+                    f"{len(self._locations)} messages, {self._dead_bytes}/{self._file_size} dead bytes")
+
+    def _apply(self, record: Dict[str, Any], offset: int, length: int):
+        """Áp dụng một record vào trạng thái trong bộ nhớ, trả về kết quả của thao tác"""
+        op = record.get('op')
+
+        if op == 'conversation':
+            conversation = record['data']
+            conversation_id = conversation['id']
+            if conversation_id in self._conversations:
+                if record.get('if_absent'):
+                    self._dead_bytes += length
+                    return False
+                self._dead_bytes += self._conversation_bytes[conversation_id]
+            self._conversations[conversation_id] = dict(conversation)
+            self._conversation_bytes[conversation_id] = length
+            self._ordering.upsert(conversation)
+            return True
+
+        if op == 'update_conversation':
+            # Record update sẽ được gộp vào conversation khi compaction
+            self._dead_bytes += length
+            conversation = self._conversations.get(record['id'])
+            if conversation is None:
+                return None
+            conversation.update({**next_version(conversation), **record['fields']})
+            self._ordering.upsert(conversation)
+            return dict(conversation)
+
+        if op == 'delete_conversation':
+            self._dead_bytes += length
+            conversation_id = record['id']
+            if self._conversations.pop(conversation_id, None) is None:
+                return False
+            self._ordering.remove(conversation_id)
+            self._dead_bytes += self._conversation_bytes.pop(conversation_id, 0)
+            for _, _, message_id in self._messages_by_conversation.pop(conversation_id, []):
+                self._dead_bytes += self._locations.pop(message_id).length
+            return True
+
+        if op in ('insert_message', 'message'):
+            message = record['data']
+            message_id = message['id']
+            if message_id in self._locations:
+                self._dead_bytes += length
+                return False
+            conversation_id = message.get('conversation_id')
+            timestamp = message.get('timestamp', '')
+            seq = self._next_seq
+            self._next_seq += 1
+            entries = self._messages_by_conversation.setdefault(conversation_id, [])
+            entry = (timestamp, seq, message_id)
+            if not entries or entries[-1] <= entry:
+                entries.append(entry)
+            else:
+                bisect.insort(entries, entry)
+            self._locations[message_id] = MessageLocation(offset, length, conversation_id, timestamp, seq)
+
+            conversation = self._conversations.get(conversation_id)
+            if op == 'insert_message' and conversation is not None:
+                conversation.update(apply_message_insert(conversation, message))
+                self._ordering.upsert(conversation)
+            return True
+
+        if op == 'delete_message':
+            self._dead_bytes += length
+            location = self._locations.get(record['id'])
+            if location is None:
+                return False
+            message = self._read_message(location)
+            del self._locations[record['id']]
+            self._dead_bytes += location.length
+            entries = self._messages_by_conversation.get(location.conversation_id, [])
+            entries.remove((location.timestamp, location.seq, record['id']))
+
+            conversation = self._conversations.get(location.conversation_id)
+            if conversation is not None:
+                last_message_at = entries[-1][0] if entries else None
+                conversation.update(apply_message_delete(conversation, message, last_message_at))
+            return True
+
+        logger.warning(f"⚠️ Unknown log record op: {op}")
+        self._dead_bytes += length
+        return None
+
+    @staticmethod
+    def _check_record(record: Dict[str, Any]):
+        """Kiểm tra record trước khi ghi để record không áp dụng được không nằm lại trong file"""
+        op = record.get('op')
+        if op in ('conversation', 'insert_message', 'message'):
+            data = record.get('data')
+            if not isinstance(data, dict) or 'id' not in data:
+                raise ValueError(f"Log record '{op}' needs a data object with an id")
+        elif op in ('update_conversation', 'delete_conversation', 'delete_message'):
+            if 'id' not in record:
+                raise ValueError(f"Log record '{op}' needs an id")
+            if op == 'update_conversation' and not isinstance(record.get('fields'), dict):
+                raise ValueError("Log record 'update_conversation' needs a fields object")
+        else:
+            raise ValueError(f"Unknown log record op: {op}")
+
+    def _read_message(self, location: MessageLocation) -> Dict[str, Any]:
+        """Đọc message tại offset trong file log"""
+        reader = getattr(self, '_reader', None)
+        if reader is None:
+            # Đang replay: file đọc chưa được mở
+            with open(self.log_path, 'rb') as f:
+                f.seek(location.offset)
+                return json.loads(f.read(location.length))['data']
+        reader.seek(location.offset)
+        return json.loads(reader.read(location.length))['data']
+
+    # ========== GROUP COMMIT ==========
+
+    def _submit(self, records: List[Dict[str, Any]]) -> List[Any]:
+        """Đưa records vào hàng đợi commit và chờ tới khi chúng được ghi xuống file"""
+        if self._closed:
+            raise RuntimeError("LogStore is closed")
+        pending = _PendingWrite(records)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.results
+
+    def _run_committer(self):
+        """Gom các records đang chờ thành một lần ghi; fsync theo policy"""
+        while True:
+            timeout = self.fsync_interval if self._dirty and self.fsync_policy == 'interval' else None
+            try:
+                first = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                with self._io_lock:
+                    self._sync()
+                continue
+
+            if first is None:
+                break
+            if self.group_commit_delay:
+                time.sleep(self.group_commit_delay)
+
+            batch = [first]
+            stop = False
+            while True:
+                try:
+                    pending = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stop = True
+                    break
+                batch.append(pending)
+
+            self._commit(batch)
+            self._maybe_compact()
+            if stop:
+                break
+
+    def _commit(self, batch: List[_PendingWrite]):
+        """Ghi một batch bằng một lần write(), rồi áp dụng vào trạng thái trong bộ nhớ"""
+        valid = []
+        for pending in batch:
+            try:
+                for record in pending.records:
+                    self._check_record(record)
+            except ValueError as e:
+                pending.error = e
+                pending.done.set()
+            else:
+                valid.append(pending)
+        batch = valid
+        if not batch:
+            return
+
+        retry = []
+        lines = [
+            [(json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8') for record in pending.records]
+            for pending in batch
+        ]
+        try:
+            with self._io_lock:
+                data = memoryview(b''.join(line for group in lines for line in group))
+                try:
+                    while data:
+                        written = os.write(self._fd, data)
+                        data = data[written:]
+                    self._dirty = True
+                    if self.fsync_policy == 'always' or (
+                        self.fsync_policy == 'interval' and time.monotonic() - self._last_sync >= self.fsync_interval
+                    ):
+                        self._sync()
+                except OSError:
+                    # Cắt bỏ phần đã ghi dở để offset trong index vẫn khớp với file
+                    os.ftruncate(self._fd, self._file_size)
+                    raise
+
+                with self._lock:
+                    offset = self._file_size
+                    for index, (pending, group) in enumerate(zip(batch, lines)):
+                        try:
+                            for record, line in zip(pending.records, group):
+                                pending.results.append(self._apply(record, offset, len(line)))
+                                offset += len(line)
+                        except Exception as e:
+                            # Cắt file ngay trước record lỗi để file khớp với trạng thái trong bộ nhớ;
+                            # các records trước đó của nhóm này đã được áp dụng và được giữ lại,
+                            # các nhóm phía sau chưa được áp dụng nên được ghi lại
+                            logger.error(f"❌ Log record could not be applied, truncating at offset {offset}: {e!r}")
+                            os.ftruncate(self._fd, offset)
+                            pending.error = e
+                            retry = batch[index + 1:]
+                            batch = batch[:index + 1]
+                            break
+                    self._file_size = offset
+        except Exception as e:
+            logger.error(f"❌ Log commit failed: {e}")
+            for pending in batch:
+                pending.error = e
+
+        for pending in batch:
+            pending.done.set()
+        if retry:
+            self._commit(retry)
+
+    def _sync(self):
+        """fsync file log nếu còn dữ liệu chưa được đẩy xuống đĩa (gọi khi giữ _io_lock)"""
+        if self._dirty:
+            os.fsync(self._fd)
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    # ========== COMPACTION ==========
+
+    def _maybe_compact(self):
+        """Chạy compaction ở background khi phần dữ liệu chết vượt ngưỡng"""
+        if self._file_size < self.compact_min_bytes or self._dead_bytes < self._file_size * self.compact_ratio:
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, name="log-store-compaction", daemon=True)
+        self._compaction_thread.start()
+
+    def compact(self):
+        """Viết lại log chỉ với trạng thái hiện tại rồi thay thế file cũ"""
+        tmp_path = self.log_path + '.compact'
+        with self._io_lock:
+            # Committer đứng chờ nên trạng thái không đổi trong lúc viết file mới
+            start = time.perf_counter()
+            old_size = self._file_size
+            conversation_bytes = {}
+            locations = {}
+            offset = 0
+
+            with open(self.log_path, 'rb') as source, open(tmp_path, 'wb') as target:
+                for conversation_id, conversation in list(self._conversations.items()):
+                    line = (json.dumps({'op': 'conversation', 'data': conversation}, ensure_ascii=False) + '\n').encode('utf-8')
+                    target.write(line)
+                    conversation_bytes[conversation_id] = len(line)
+                    offset += len(line)
+
+                for entries in list(self._messages_by_conversation.values()):
+                    for _, _, message_id in entries:
+                        location = self._locations[message_id]
+                        source.seek(location.offset)
+                        message = json.loads(source.read(location.length))['data']
+                        line = (json.dumps({'op': 'message', 'data': message}, ensure_ascii=False) + '\n').encode('utf-8')
+                        target.write(line)
+                        locations[message_id] = location._replace(offset=offset, length=len(line))
+                        offset += len(line)
+
+                target.flush()
+                os.fsync(target.fileno())
+
+            with self._lock:
+                os.close(self._fd)
+                self._reader.close()
+                os.replace(tmp_path, self.log_path)
+                self._fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | getattr(os, 'O_BINARY', 0))
+                self._reader = open(self.log_path, 'rb')
+                self._conversation_bytes = conversation_bytes
+                self._locations = locations
+                self._file_size = offset
+                self._dead_bytes = 0
+                self._dirty = False
+
+        logger.info(f"🗜️ Compacted {self.log_path}: {old_size} -> {offset} bytes "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+    # ========== CONVERSATIONS ==========
+
+    def insert_conversation(self, conversation: Dict[str, Any]):
+        """Thêm conversation mới"""
+        self._submit([{'op': 'conversation', 'data': conversation}])
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy conversation theo ID"""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            return dict(conversation) if conversation else None
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả conversations, mới nhất trước"""
+        with self._lock:
+            return [dict(self._conversations[i]) for i in self._ordering.ids('created_at')]
+
+    def list_conversations_page(self, limit: int, order_by: str = 'updated_at',
+                                after: Optional[Tuple[str, str]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Lấy một trang conversations (mới nhất trước) sau cursor (giá trị, id)"""
+        with self._lock:
+            ids, has_more = self._ordering.page(order_by, limit, after)
+            return [dict(self._conversations[i]) for i in ids], has_more
+
+    def update_conversation(self, conversation_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cập nhật các field của conversation, trả về bản đã cập nhật"""
+        if self.get_conversation(conversation_id) is None:
+            return None
+        return self._submit([{'op': 'update_conversation', 'id': conversation_id, 'fields': fields}])[0]
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Xóa conversation và tất cả messages của nó"""
+        with self._lock:
+            if conversation_id not in self._conversations:
+                return False
+        return self._submit([{'op': 'delete_conversation', 'id': conversation_id}])[0]
+
+    # ========== MESSAGES ==========
+
+    def insert_message(self, message: Dict[str, Any]):
+        """Thêm message mới; các field tổng hợp của conversation được cập nhật khi replay record"""
+        self._submit([{'op': 'insert_message', 'data': message}])
+
+    def insert_messages(self, messages: List[Dict[str, Any]]):
+        """Thêm nhiều messages trong một lần commit"""
+        if messages:
+            self._submit([{'op': 'insert_message', 'data': message} for message in messages])
+
+    def delete_message(self, message_id: str) -> bool:
+        """Xóa một message và trừ nó khỏi các field tổng hợp của conversation"""
+        with self._lock:
+            if message_id not in self._locations:
+                return False
+        return self._submit([{'op': 'delete_message', 'id': message_id}])[0]
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy message theo ID (tra index rồi đọc một record từ file)"""
+        with self._lock:
+            location = self._locations.get(message_id)
+            return self._read_message(location) if location else None
+
+    def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Lấy tất cả messages của conversation, sắp xếp theo thời gian"""
+        with self._lock:
+            entries = self._messages_by_conversation.get(conversation_id, [])
+            return [self._read_message(self._locations[message_id]) for _, _, message_id in entries]
+
+    def _cursor_key(self, conversation_id: str, cursor: str, after: bool) -> Tuple:
+        """Chuyển cursor (message id hoặc timestamp) thành khóa (timestamp, seq, id)"""
+        location = self._locations.get(cursor)
+        if location is not None and location.conversation_id == conversation_id:
+            return (location.timestamp, location.seq, cursor)
+        # Cursor timestamp: before lấy mọi message có timestamp nhỏ hơn, after lấy lớn hơn
+        return (parse_timestamp_cursor(cursor), float('inf') if after else float('-inf'))
+
+    def get_messages_page(self, conversation_id: str, limit: int,
+                          before: Optional[str] = None, after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Lấy một trang messages theo cursor, chỉ đọc đúng `limit` records từ file"""
+        with self._lock:
+            entries = self._messages_by_conversation.get(conversation_id, [])
+            page, has_more = slice_page(
+                entries, limit,
+                before_key=self._cursor_key(conversation_id, before, False) if before is not None else None,
+                after_key=self._cursor_key(conversation_id, after, True) if after is not None else None
+            )
+            return [self._read_message(self._locations[message_id]) for _, _, message_id in page], has_more
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Duyệt tất cả messages (danh sách id được chụp tại thời điểm gọi)"""
+        with self._lock:
+            message_ids = list(self._locations)
+        for message_id in message_ids:
+            message = self.get_message(message_id)
+            if message is not None:
+                yield message
+
+    def count_messages(self, conversation_id: str) -> int:
+        """Đếm số messages của conversation"""
+        with self._lock:
+            return len(self._messages_by_conversation.get(conversation_id, []))
+
+    # ========== BULK ==========
+
+    def bulk_insert(self, conversations: List[Dict[str, Any]] = None, messages: List[Dict[str, Any]] = None) -> int:
+        """Thêm nhiều records trong một lần commit; records đã tồn tại (cùng id) được bỏ qua"""
+        records = [{'op': 'conversation', 'data': c, 'if_absent': True} for c in conversations or []]
+        records += [{'op': 'message', 'data': m} for m in messages or []]
+        if not records:
+            return 0
+        return sum(1 for result in self._submit(records) if result)
+
+    def close(self):
+        """Ghi nốt các records đang chờ, fsync và đóng file"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._committer.join()
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        with self._io_lock:
+            self._sync()
+            os.close(self._fd)
+        with self._lock:
+            self._reader.close()
@@ -0,0 +1,161 @@
+# ========== IMPORTS ==========
+import json
+import time
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Union
+import logging
+
+# ========== LOGGER SETUP ==========
+logger = logging.getLogger(__name__)
+
+# Định dạng export: dòng đầu là meta, sau đó mỗi conversation theo sau bởi các messages của nó
+NDJSON_FORMAT = "conversations-ndjson"
+NDJSON_VERSION = 1
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Số lỗi tối đa được liệt kê trong kết quả import
+MAX_REPORTED_ERRORS = 20
+
+# ========== EXPORT ==========
+
+def _dump(record_type: str, data: Dict[str, Any]) -> str:
+    return json.dumps({"type": record_type, "data": data}, ensure_ascii=False) + "\n"
+
+def export_ndjson(db, conversation_ids: Optional[List[str]] = None, page_size: int = 500,
+                  stats: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Sinh từng dòng NDJSON cho conversations và messages của chúng
+
+    Conversations và messages đều được đọc theo trang nên bộ nhớ không phụ thuộc kích thước dữ liệu;
+    conversations đã archive được đọc thẳng từ file archive.
+    `stats` (nếu có) được cập nhật số records và thời gian khi generator chạy xong.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(conversations=0, messages=0)
+    start = time.perf_counter()
+
+    yield json.dumps({
+        "type": "meta",
+        "format": NDJSON_FORMAT,
+        "version": NDJSON_VERSION,
+        "exported_at": datetime.now().isoformat()
+    }) + "\n"
+
+    for conversation in _iter_conversations(db, conversation_ids, page_size):
+        yield _dump("conversation", conversation)
+        stats["conversations"] += 1
+
+        for message in db.iter_conversation_messages(conversation["id"], page_size):
+            yield _dump("message", message)
+            stats["messages"] += 1
+
+    _finish_stats(stats, stats["conversations"] + stats["messages"], start)
+    logger.info(f"📤 Exported {stats['conversations']} conversations and {stats['messages']} messages "
+                f"in {stats['elapsed_seconds']}s ({stats['records_per_sec']} records/s)")
+
+def _iter_conversations(db, conversation_ids: Optional[List[str]], page_size: int) -> Iterator[Dict[str, Any]]:
+    """Duyệt conversations được chọn, hoặc tất cả theo thứ tự tạo (từng trang)"""
+    if conversation_ids:
+        for conversation_id in conversation_ids:
+            conversation = db.get_conversation(conversation_id)
+            if conversation:
+                yield conversation
+        return
+
+    cursor = None
+    while True:
+        conversations, cursor = db.list_conversations_page(page_size, order_by='created_at', cursor=cursor)
+        yield from conversations
+        if not cursor:
+            return
+
+def iter_chunks(lines: Iterable[str], chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """Gom các dòng thành chunk khoảng `chunk_size` ký tự để giảm số lần ghi ra socket"""
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+# ========== IMPORT ==========
+
+def _parse_line(line: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+    """Parse và kiểm tra một dòng, trả về None với dòng trống; raise ValueError nếu không hợp lệ"""
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON không hợp lệ: {e.msg}")
+    if not isinstance(record, dict):
+        raise ValueError("Mỗi dòng phải là một JSON object")
+
+    record_type = record.get("type")
+    if record_type == "meta":
+        if record.get("format") != NDJSON_FORMAT or record.get("version") != NDJSON_VERSION:
+            raise ValueError(f"Không hỗ trợ định dạng {record.get('format')} v{record.get('version')}")
+        return record
+    if record_type not in ("conversation", "message"):
+        raise ValueError(f"type không hợp lệ: {record_type}")
+
+    data = record.get("data")
+    if not isinstance(data, dict) or not data.get("id"):
+        raise ValueError("data phải là object có id")
+    if record_type == "message" and not data.get("conversation_id"):
+        raise ValueError("message thiếu conversation_id")
+    return record
+
+def import_ndjson(db, lines: Iterable[Union[str, bytes]], batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Import NDJSON theo từng batch (mỗi batch một lần bulk_insert), trả về thống kê
+
+    Records đã tồn tại (cùng id) được bỏ qua nên có thể chạy lại an toàn; dòng lỗi được bỏ qua và báo cáo.
+    """
+    stats = {"conversations": 0, "messages": 0, "inserted": 0, "invalid": 0, "errors": []}
+    conversations, messages = [], []
+    start = time.perf_counter()
+
+    def flush():
+        if conversations or messages:
+            stats["inserted"] += db.bulk_insert(conversations=conversations, messages=messages)
+            conversations.clear()
+            messages.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            record = _parse_line(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            stats["invalid"] += 1
+            if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                stats["errors"].append({"line": line_number, "error": str(e)})
+            continue
+        if record is None or record["type"] == "meta":
+            continue
+
+        if record["type"] == "conversation":
+            conversations.append(record["data"])
+            stats["conversations"] += 1
+        else:
+            messages.append(record["data"])
+            stats["messages"] += 1
+        if len(conversations) + len(messages) >= batch_size:
+            flush()
+    flush()
+
+    stats["skipped"] = stats["conversations"] + stats["messages"] - stats["inserted"]
+    _finish_stats(stats, stats["conversations"] + stats["messages"], start)
+    logger.info(f"📥 Imported {stats['inserted']} records ({stats['skipped']} existing, {stats['invalid']} invalid) "
+                f"in {stats['elapsed_seconds']}s ({stats['records_per_sec']} records/s)")
+    return stats
+
+def _finish_stats(stats: Dict[str, Any], records: int, start: float):
+    elapsed = time.perf_counter() - start
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["records_per_sec"] = round(records / elapsed) if elapsed > 0 else records
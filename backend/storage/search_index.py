@@ -0,0 +1,315 @@
+# ========== IMPORTS ==========
+import math
+import threading
+import time
+import re
+from array import array
+from collections import Counter
+from typing import List, Dict, Optional, Any, Iterable, Callable
+import numpy as np
+from utils.vietnamese_text import search_tokens, fold_aligned
+import logging
+
+# ========== LOGGER SETUP ==========
+logger = logging.getLogger(__name__)
+
+# Tham số BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+class MessageSearchIndex:
+    """
+    Inverted index (in-memory) trên nội dung messages, cập nhật tăng dần khi thêm/xóa message
+
+    - Token được fold dấu tiếng Việt nên "xu phat" khớp "xử phạt"
+    - Postings lưu dạng array (doc, tf) append-only; doc id tăng dần nên luôn có thứ tự
+    - Xóa chỉ đánh dấu tombstone, postings được dọn khi số tombstone vượt ngưỡng
+    - BM25 được tính vector hóa bằng numpy trên postings của các term trong query
+    Index không giữ nội dung message; snippet được tạo từ message đọc lại trong store.
+    """
+
+    def __init__(self, vacuum_ratio: float = 0.2):
+        """Khởi tạo index rỗng"""
+        self.vacuum_ratio = vacuum_ratio
+        self._lock = threading.RLock()
+
+        self._doc_ids: Dict[str, int] = {}           # message_id -> doc
+        self._message_ids: List[Optional[str]] = []  # doc -> message_id (None nếu đã xóa)
+        self._doc_conversation = array('i')          # doc -> số thứ tự conversation
+        self._conversation_numbers: Dict[str, int] = {}
+        self._conversation_ids: List[str] = []
+        self._conversation_docs: Dict[int, array] = {}
+        self._lengths = np.zeros(1024, dtype=np.int32)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._postings_docs: Dict[str, array] = {}
+        self._postings_tf: Dict[str, array] = {}
+
+        self._next_doc = 0
+        self._live_docs = 0
+        self._dead_docs = 0
+        self._total_length = 0
+
+        # Trạng thái build lần đầu từ store
+        self._built = False
+        self._building = False
+        self._build_lock = threading.Lock()
+        self._removed_during_build = set()
+
+    # ========== BUILD ==========
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    @property
+    def accepts_updates(self) -> bool:
+        """Index đã hoặc đang được build; trước đó messages mới sẽ được đọc từ store khi build"""
+        return self._built or self._building
+
+    def ensure_built(self, messages_factory: Callable[[], Iterable[Dict[str, Any]]],
+                     progress_callback: Optional[Callable[[int], None]] = None):
+        """Build index từ toàn bộ messages một lần duy nhất (warm-up hoặc lần search đầu tiên)"""
+        if self._built:
+            return
+        with self._build_lock:
+            if self._built:
+                return
+            self._building = True
+            start = time.perf_counter()
+            count = 0
+            try:
+                for message in messages_factory():
+                    if message.get('id') in self._removed_during_build:
+                        continue
+                    self.add_message(message)
+                    count += 1
+                    if progress_callback and count % 10000 == 0:
+                        progress_callback(count)
+            finally:
+                self._building = False
+                self._removed_during_build = set()
+            self._built = True
+        logger.info(f"🔎 Indexed {count} messages for search in {time.perf_counter() - start:.2f}s "
+                    f"({len(self._postings_docs)} terms)")
+
+    # ========== UPDATES ==========
+
+    def add_message(self, message: Dict[str, Any]):
+        """Thêm message vào index (bỏ qua nếu đã có)"""
+        message_id = message.get('id')
+        if not message_id:
+            return
+        tokens = search_tokens(message.get('content') or '')
+        term_counts = Counter(tokens)
+        conversation_id = message.get('conversation_id') or ''
+
+        with self._lock:
+            if message_id in self._doc_ids:
+                return
+            doc = self._next_doc
+            self._next_doc += 1
+            if doc >= len(self._lengths):
+                self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+                self._alive = np.concatenate([self._alive, np.zeros_like(self._alive)])
+
+            conversation = self._conversation_numbers.get(conversation_id)
+            if conversation is None:
+                conversation = len(self._conversation_ids)
+                self._conversation_numbers[conversation_id] = conversation
+                self._conversation_ids.append(conversation_id)
+                self._conversation_docs[conversation] = array('i')
+
+            self._doc_ids[message_id] = doc
+            self._message_ids.append(message_id)
+            self._doc_conversation.append(conversation)
+            self._conversation_docs[conversation].append(doc)
+            self._lengths[doc] = len(tokens)
+            self._alive[doc] = True
+            for term, count in term_counts.items():
+                if term not in self._postings_docs:
+                    self._postings_docs[term] = array('i')
+                    self._postings_tf[term] = array('H')
+                self._postings_docs[term].append(doc)
+                self._postings_tf[term].append(min(count, 65535))
+            self._live_docs += 1
+            self._total_length += len(tokens)
+
+    def _remove_doc(self, doc: int):
+        if not self._alive[doc]:
+            return
+        self._alive[doc] = False
+        del self._doc_ids[self._message_ids[doc]]
+        self._message_ids[doc] = None
+        self._live_docs -= 1
+        self._dead_docs += 1
+        self._total_length -= int(self._lengths[doc])
+
+    def remove_message(self, message_id: str):
+        """Xóa message khỏi index"""
+        with self._lock:
+            if self._building:
+                self._removed_during_build.add(message_id)
+            doc = self._doc_ids.get(message_id)
+            if doc is not None:
+                self._remove_doc(doc)
+                self._maybe_vacuum()
+
+    def remove_conversation(self, conversation_id: str):
+        """Xóa mọi message của conversation khỏi index"""
+        with self._lock:
+            conversation = self._conversation_numbers.get(conversation_id)
+            if conversation is None:
+                return
+            for doc in self._conversation_docs[conversation]:
+                if self._building and self._message_ids[doc]:
+                    self._removed_during_build.add(self._message_ids[doc])
+                self._remove_doc(doc)
+            self._conversation_docs[conversation] = array('i')
+            self._maybe_vacuum()
+
+    def _maybe_vacuum(self):
+        """Dọn tombstones khỏi postings khi chúng chiếm quá vacuum_ratio"""
+        if self._dead_docs < max(1000, self.vacuum_ratio * self._live_docs):
+            return
+        start = time.perf_counter()
+        alive = self._alive
+        for term in list(self._postings_docs):
+            docs = np.array(self._postings_docs[term], dtype=np.int32)
+            keep = alive[docs]
+            if keep.all():
+                continue
+            if not keep.any():
+                del self._postings_docs[term]
+                del self._postings_tf[term]
+                continue
+            tfs = np.array(self._postings_tf[term], dtype=np.uint16)
+            self._postings_docs[term] = array('i', docs[keep].tobytes())
+            self._postings_tf[term] = array('H', tfs[keep].tobytes())
+        for conversation, docs in self._conversation_docs.items():
+            if docs:
+                kept = np.array(docs, dtype=np.int32)
+                self._conversation_docs[conversation] = array('i', kept[alive[kept]].tobytes())
+        logger.info(f"🧹 Vacuumed {self._dead_docs} deleted messages from search index "
+                    f"in {time.perf_counter() - start:.2f}s")
+        self._dead_docs = 0
+
+    # ========== SEARCH ==========
+
+    def search(self, query: str, limit: int = 20, conversation_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Tìm messages theo BM25, trả về [{message_id, conversation_id, score}] điểm cao nhất trước
+        """
+        terms = list(dict.fromkeys(search_tokens(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            if not self._live_docs:
+                return []
+            size = self._next_doc
+            avg_length = self._total_length / self._live_docs or 1.0
+            # Phần chuẩn hóa độ dài của BM25, tính một lần cho mỗi query
+            length_norm = (BM25_K1 * (1 - BM25_B)) + (BM25_K1 * BM25_B / avg_length) * self._lengths[:size].astype(np.float32)
+
+            allowed = None
+            if conversation_id:
+                conversation = self._conversation_numbers.get(conversation_id)
+                if conversation is None:
+                    return []
+                allowed = np.array(self._conversation_docs[conversation], dtype=np.int32)
+
+            # Gom (doc, điểm) của từng term; postings đã sắp theo doc nên giao với conversation bằng searchsorted
+            doc_parts, score_parts = [], []
+            for term in terms:
+                if term not in self._postings_docs:
+                    continue
+                docs = np.array(self._postings_docs[term], dtype=np.int32)
+                tfs = np.array(self._postings_tf[term], dtype=np.float32)
+                # df tính cả tombstones chưa dọn, sai số nhỏ và chỉ ảnh hưởng idf
+                df = len(docs)
+                idf = np.float32(math.log(1 + (self._live_docs - df + 0.5) / (df + 0.5)))
+                if allowed is not None:
+                    positions = np.searchsorted(docs, allowed)
+                    found = positions < df
+                    found[found] = docs[positions[found]] == allowed[found]
+                    docs, tfs = allowed[found], tfs[positions[found]]
+                doc_parts.append(docs)
+                score_parts.append(idf * np.float32(BM25_K1 + 1) * tfs / (tfs + length_norm[docs]))
+
+            postings = sum(len(docs) for docs in doc_parts)
+            if not postings:
+                return []
+            if postings * 8 < size:
+                # Ít postings: cộng điểm trên tập ứng viên thay vì mảng dày cỡ toàn bộ index
+                candidates, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+                scores[~self._alive[candidates]] = 0
+            else:
+                scores = np.zeros(size, dtype=np.float32)
+                for docs, part in zip(doc_parts, score_parts):
+                    scores[docs] += part
+                scores[~self._alive[:size]] = 0
+                # Chỉ giữ các doc có điểm để chọn top-k trên tập nhỏ hơn
+                candidates = np.flatnonzero(scores)
+                scores = scores[candidates]
+
+            matched = int(np.count_nonzero(scores))
+            if not matched:
+                return []
+            k = min(limit, matched)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+
+            return [
+                {
+                    "message_id": self._message_ids[doc],
+                    "conversation_id": self._conversation_ids[self._doc_conversation[doc]],
+                    "score": round(score, 4)
+                }
+                for doc, score in zip(candidates[top].tolist(), scores[top].tolist())
+            ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê kích thước index"""
+        with self._lock:
+            return {
+                "built": self._built,
+                "messages": self._live_docs,
+                "terms": len(self._postings_docs),
+                "conversations": sum(1 for docs in self._conversation_docs.values() if docs)
+            }
+
+# ========== SNIPPETS ==========
+
+def make_snippet(content: str, query: str, width: int = 160) -> Dict[str, Any]:
+    """
+    Cắt đoạn trích quanh lần khớp đầu tiên của query, trả về {text, highlights: [[start, end], ...]}
+
+    So khớp trên bản fold giữ nguyên độ dài nên offset trùng với nội dung gốc.
+    """
+    content = content or ''
+    terms = list(dict.fromkeys(search_tokens(query)))
+    folded = fold_aligned(content)
+    matches = []
+    if terms:
+        pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\b")
+        matches = [m.span() for m in pattern.finditer(folded)]
+
+    first = matches[0][0] if matches else 0
+    start = max(0, first - width // 3)
+    end = min(len(content), start + width)
+    start = max(0, min(start, end - width))
+    # Không cắt giữa một từ
+    if start > 0:
+        space = content.find(' ', start)
+        if space != -1 and space < first:
+            start = space + 1
+    if end < len(content):
+        space = content.rfind(' ', start, end)
+        if space > first:
+            end = space
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(content) else ''
+    highlights = [[s - start + len(prefix), e - start + len(prefix)] for s, e in matches if s >= start and e <= end]
+    return {"text": prefix + content[start:end] + suffix, "highlights": highlights}
@@ -0,0 +1,344 @@
+# ========== IMPORTS ==========
+import os
+import json
+import sqlite3
+import threading
+from typing import List, Dict, Optional, Any, Tuple, Iterator
+import logging
+from storage.aggregates import message_tokens, next_version
+from storage.cursors import parse_timestamp_cursor, CONVERSATION_ORDER_FIELDS
+
+# ========== LOGGER SETUP ==========
+logger = logging.getLogger(__name__)
+
+# ========== SCHEMA ==========
+# Mỗi record được lưu nguyên dạng JSON trong cột `data`; các cột còn lại chỉ để index
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at, id);
+
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_id ON messages(id);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
+"""
+
+class SQLiteStore:
+    """Lưu conversations và messages trong SQLite (WAL mode), mỗi thread một connection"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str):
+        """Mở database và tạo schema nếu chưa có"""
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Lấy connection của thread hiện tại"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _row_to_record(row) -> Optional[Dict[str, Any]]:
+        return json.loads(row[0]) if row else None
+
+    # ========== CONVERSATIONS ==========
+
+    def insert_conversation(self, conversation: Dict[str, Any]):
+        """Thêm conversation mới"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO conversations (id, created_at, updated_at, data) VALUES (?, ?, ?, ?)",
+                (
+                    conversation['id'],
+                    conversation.get('created_at', ''),
+                    conversation.get('updated_at', ''),
+                    json.dumps(conversation, ensure_ascii=False)
+                )
+            )
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy conversation theo ID"""
+        row = self._connect().execute(
+            "SELECT data FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return self._row_to_record(row)
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả conversations, mới nhất trước"""
+        rows = self._connect().execute(
+            "SELECT data FROM conversations ORDER BY created_at DESC"
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def list_conversations_page(self, limit: int, order_by: str = 'updated_at',
+                                after: Optional[Tuple[str, str]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Lấy một trang conversations (mới nhất trước) bằng keyset query trên index (order_by, id)"""
+        if order_by not in CONVERSATION_ORDER_FIELDS:
+            raise ValueError(f"Không thể sắp xếp theo {order_by}")
+        if after is None:
+            rows = self._connect().execute(
+                f"SELECT data FROM conversations ORDER BY {order_by} DESC, id DESC LIMIT ?",
+                (limit + 1,)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                f"""
+                SELECT data FROM conversations
+                WHERE {order_by} < ? OR ({order_by} = ? AND id < ?)
+                ORDER BY {order_by} DESC, id DESC LIMIT ?
+                """,
+                (after[0], after[0], after[1], limit + 1)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows[:limit]], len(rows) > limit
+
+    def update_conversation(self, conversation_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cập nhật các field của conversation, trả về bản đã cập nhật"""
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE để tránh mất update khi nhiều request ghi cùng lúc
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if not row:
+                return None
+            conversation = json.loads(row[0])
+            conversation.update({**next_version(conversation), **fields})
+            conn.execute(
+                "UPDATE conversations SET created_at = ?, updated_at = ?, data = ? WHERE id = ?",
+                (
+                    conversation.get('created_at', ''),
+                    conversation.get('updated_at', ''),
+                    json.dumps(conversation, ensure_ascii=False),
+                    conversation_id
+                )
+            )
+        return conversation
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Xóa conversation và tất cả messages của nó"""
+        conn = self._connect()
+        with conn:
+            removed = conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount
+            conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        return removed > 0
+
+    # ========== MESSAGES ==========
+
+    @staticmethod
+    def _insert_message(conn: sqlite3.Connection, message: Dict[str, Any]):
+        """INSERT message và cập nhật các field tổng hợp của conversation (trong transaction của caller)"""
+        timestamp = message.get('timestamp', '')
+        conn.execute(
+            "INSERT INTO messages (id, conversation_id, timestamp, data) VALUES (?, ?, ?, ?)",
+            (
+                message['id'],
+                message['conversation_id'],
+                timestamp,
+                json.dumps(message, ensure_ascii=False)
+            )
+        )
+        conn.execute(
+            """
+            UPDATE conversations SET
+                updated_at = max(updated_at, :ts),
+                data = json_set(
+                    data,
+                    '$.message_count', COALESCE(json_extract(data, '$.message_count'), 0) + 1,
+                    '$.total_tokens', COALESCE(json_extract(data, '$.total_tokens'), 0) + :tokens,
+                    '$.last_message_at', max(COALESCE(json_extract(data, '$.last_message_at'), ''), :ts),
+                    '$.updated_at', max(COALESCE(json_extract(data, '$.updated_at'), ''), :ts),
+                    '$.version', COALESCE(json_extract(data, '$.version'), 0) + 1
+                )
+            WHERE id = :conversation_id
+            """,
+            {'ts': timestamp, 'tokens': message_tokens(message), 'conversation_id': message['conversation_id']}
+        )
+
+    def insert_message(self, message: Dict[str, Any]):
+        """Thêm message mới và cập nhật các field tổng hợp của conversation trong cùng transaction"""
+        conn = self._connect()
+        with conn:
+            self._insert_message(conn, message)
+
+    def insert_messages(self, messages: List[Dict[str, Any]]):
+        """Thêm nhiều messages (kèm cập nhật aggregates) trong một transaction"""
+        conn = self._connect()
+        with conn:
+            for message in messages:
+                self._insert_message(conn, message)
+
+    def delete_message(self, message_id: str) -> bool:
+        """Xóa một message và trừ nó khỏi các field tổng hợp của conversation trong cùng transaction"""
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT data FROM messages WHERE id = ?", (message_id,)).fetchone()
+            if not row:
+                return False
+            message = json.loads(row[0])
+            conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+            conn.execute(
+                """
+                UPDATE conversations SET data = json_set(
+                    data,
+                    '$.message_count', max(COALESCE(json_extract(data, '$.message_count'), 0) - 1, 0),
+                    '$.total_tokens', max(COALESCE(json_extract(data, '$.total_tokens'), 0) - :tokens, 0),
+                    '$.last_message_at',
+                        (SELECT MAX(timestamp) FROM messages WHERE conversation_id = :conversation_id),
+                    '$.version', COALESCE(json_extract(data, '$.version'), 0) + 1
+                )
+                WHERE id = :conversation_id
+                """,
+                {'tokens': message_tokens(message), 'conversation_id': message['conversation_id']}
+            )
+        return True
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy message theo ID"""
+        row = self._connect().execute("SELECT data FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return self._row_to_record(row)
+
+    def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Lấy tất cả messages của conversation, sắp xếp theo thời gian"""
+        rows = self._connect().execute(
+            "SELECT data FROM messages WHERE conversation_id = ? ORDER BY timestamp, seq",
+            (conversation_id,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _cursor_key(self, conn, conversation_id: str, cursor: str, after: bool) -> Tuple[str, int]:
+        """Chuyển cursor (message id hoặc timestamp) thành khóa (timestamp, seq)"""
+        row = conn.execute(
+            "SELECT timestamp, seq FROM messages WHERE id = ? AND conversation_id = ?",
+            (cursor, conversation_id)
+        ).fetchone()
+        if row:
+            return row[0], row[1]
+        # Cursor timestamp: before lấy mọi message có timestamp nhỏ hơn, after lấy lớn hơn
+        return parse_timestamp_cursor(cursor), (2 ** 63 - 1) if after else 0
+
+    def get_messages_page(self, conversation_id: str, limit: int,
+                          before: Optional[str] = None, after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Lấy một trang messages theo cursor qua index (conversation_id, timestamp)
+
+        Không có cursor hoặc có `before`: trả về `limit` messages gần nhất trước cursor.
+        Có `after`: trả về `limit` messages đầu tiên sau cursor. Kết quả luôn theo thứ tự thời gian.
+        """
+        conn = self._connect()
+        if after is not None:
+            timestamp, seq = self._cursor_key(conn, conversation_id, after, True)
+            rows = conn.execute(
+                """
+                SELECT data FROM messages
+                WHERE conversation_id = ? AND (timestamp > ? OR (timestamp = ? AND seq > ?))
+                ORDER BY timestamp, seq LIMIT ?
+                """,
+                (conversation_id, timestamp, timestamp, seq, limit + 1)
+            ).fetchall()
+        else:
+            if before is not None:
+                timestamp, seq = self._cursor_key(conn, conversation_id, before, False)
+                rows = conn.execute(
+                    """
+                    SELECT data FROM messages
+                    WHERE conversation_id = ? AND (timestamp < ? OR (timestamp = ? AND seq < ?))
+                    ORDER BY timestamp DESC, seq DESC LIMIT ?
+                    """,
+                    (conversation_id, timestamp, timestamp, seq, limit + 1)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT data FROM messages WHERE conversation_id = ? ORDER BY timestamp DESC, seq DESC LIMIT ?",
+                    (conversation_id, limit + 1)
+                ).fetchall()
+
+        # Đọc thừa một record để biết còn trang tiếp theo hay không
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after is None:
+            # Đọc theo thứ tự giảm dần nên đảo lại cho đúng thứ tự thời gian
+            rows.reverse()
+        return [json.loads(row[0]) for row in rows], has_more
+
+    def iter_messages(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Duyệt tất cả messages theo seq, đọc từng batch để không giữ transaction đọc lâu"""
+        conn = self._connect()
+        last_seq = 0
+        while True:
+            rows = conn.execute(
+                "SELECT seq, data FROM messages WHERE seq > ? ORDER BY seq LIMIT ?",
+                (last_seq, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            last_seq = rows[-1][0]
+            for row in rows:
+                yield json.loads(row[1])
+
+    def count_messages(self, conversation_id: str) -> int:
+        """Đếm số messages của conversation"""
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row[0]
+
+    # ========== BULK ==========
+
+    def bulk_insert(self, conversations: List[Dict[str, Any]] = None, messages: List[Dict[str, Any]] = None) -> int:
+        """Thêm nhiều records trong một transaction; records đã tồn tại (cùng id) được bỏ qua"""
+        conn = self._connect()
+        inserted = 0
+        with conn:
+            if conversations:
+                inserted += conn.executemany(
+                    "INSERT OR IGNORE INTO conversations (id, created_at, updated_at, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (c['id'], c.get('created_at', ''), c.get('updated_at', ''), json.dumps(c, ensure_ascii=False))
+                        for c in conversations
+                    ]
+                ).rowcount
+            if messages:
+                inserted += conn.executemany(
+                    "INSERT OR IGNORE INTO messages (id, conversation_id, timestamp, data) VALUES (?, ?, ?, ?)",
+                    [
+                        (m['id'], m['conversation_id'], m.get('timestamp', ''), json.dumps(m, ensure_ascii=False))
+                        for m in messages
+                    ]
+                ).rowcount
+        return inserted
+
+    def close(self):
+        """Đóng tất cả connections"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
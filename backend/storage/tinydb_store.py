@@ -0,0 +1,287 @@
+# ========== IMPORTS ==========
+import bisect
+import threading
+from typing import List, Dict, Optional, Any, Tuple, Iterator
+from tinydb import TinyDB, Query
+from storage.aggregates import apply_message_insert, apply_message_delete, next_version
+from storage.cursors import parse_timestamp_cursor, slice_page, ConversationOrdering
+import logging
+
+# ========== LOGGER SETUP ==========
+logger = logging.getLogger(__name__)
+
+class TinyDBStore:
+    """Lưu conversations và messages trong các file JSON của TinyDB"""
+
+    name = "tinydb"
+
+    def __init__(self, conversations_path: str, messages_path: str):
+        """Mở hai file TinyDB cho conversations và messages"""
+        self.conversations_path = conversations_path
+        self.messages_path = messages_path
+        self.conversations_db = TinyDB(conversations_path)
+        self.messages_db = TinyDB(messages_path)
+        self._lock = threading.RLock()
+
+        # Secondary index: conversation_id -> [(timestamp, doc_id)] theo thứ tự thời gian,
+        # cùng bản sao records theo doc_id để đọc một conversation không phải quét cả file
+        self._messages_by_conversation: Dict[str, List[Tuple[str, int]]] = {}
+        self._messages: Dict[int, Dict[str, Any]] = {}
+        self._doc_id_by_message_id: Dict[str, int] = {}
+        self._build_message_index()
+
+        # Bản sao conversations trong bộ nhớ cùng thứ tự theo updated_at/created_at để phân trang
+        self._conversations: Dict[str, Dict[str, Any]] = {}
+        self._ordering = ConversationOrdering()
+        self._build_conversation_cache()
+
+    def _build_conversation_cache(self):
+        """Đọc conversations vào bộ nhớ khi khởi động"""
+        with self._lock:
+            self._conversations = {}
+            self._ordering = ConversationOrdering()
+            for document in self.conversations_db.all():
+                self._cache_conversation(dict(document))
+
+    def _cache_conversation(self, conversation: Dict[str, Any]):
+        self._conversations[conversation['id']] = conversation
+        self._ordering.upsert(conversation)
+
+    def _build_message_index(self):
+        """Dựng lại index từ file messages khi khởi động (một lần quét duy nhất)"""
+        with self._lock:
+            self._messages_by_conversation = {}
+            self._messages = {}
+            self._doc_id_by_message_id = {}
+            for document in self.messages_db.all():
+                self._index_message(document.doc_id, dict(document))
+        logger.info(f"📇 Indexed {len(self._messages)} messages in "
+                    f"{len(self._messages_by_conversation)} conversations")
+
+    def _index_message(self, doc_id: int, message: Dict[str, Any]):
+        """Thêm một message vào index"""
+        self._messages[doc_id] = message
+        if message.get('id'):
+            self._doc_id_by_message_id[message['id']] = doc_id
+        entries = self._messages_by_conversation.setdefault(message.get('conversation_id'), [])
+        entry = (message.get('timestamp', ''), doc_id)
+        if not entries or entries[-1] <= entry:
+            entries.append(entry)
+        else:
+            bisect.insort(entries, entry)
+
+    def _unindex_conversation(self, conversation_id: str) -> List[int]:
+        """Xóa messages của conversation khỏi index, trả về doc_ids đã xóa"""
+        entries = self._messages_by_conversation.pop(conversation_id, [])
+        doc_ids = [doc_id for _, doc_id in entries]
+        for doc_id in doc_ids:
+            message = self._messages.pop(doc_id, None)
+            if message and message.get('id'):
+                self._doc_id_by_message_id.pop(message['id'], None)
+        return doc_ids
+
+    # ========== CONVERSATIONS ==========
+
+    # TinyDB dùng chung một file handle nên mọi thao tác (kể cả đọc) đều đi qua self._lock;
+    # đọc được phục vụ từ bản sao trong bộ nhớ, ghi cập nhật cả file lẫn bản sao
+
+    def insert_conversation(self, conversation: Dict[str, Any]):
+        """Thêm conversation mới"""
+        with self._lock:
+            self.conversations_db.insert(conversation)
+            self._cache_conversation(dict(conversation))
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy conversation theo ID"""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            return dict(conversation) if conversation else None
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả conversations, mới nhất trước"""
+        with self._lock:
+            return [dict(self._conversations[i]) for i in self._ordering.ids('created_at')]
+
+    def list_conversations_page(self, limit: int, order_by: str = 'updated_at',
+                                after: Optional[Tuple[str, str]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Lấy một trang conversations (mới nhất trước) sau cursor (giá trị, id)"""
+        with self._lock:
+            ids, has_more = self._ordering.page(order_by, limit, after)
+            return [dict(self._conversations[i]) for i in ids], has_more
+
+    def update_conversation(self, conversation_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cập nhật các field của conversation, trả về bản đã cập nhật"""
+        with self._lock:
+            if conversation_id not in self._conversations:
+                return None
+            self._update_conversation_with(conversation_id, lambda conversation: {**next_version(conversation), **fields})
+            return self.get_conversation(conversation_id)
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Xóa conversation và tất cả messages của nó"""
+        Conversation = Query()
+        with self._lock:
+            removed = self.conversations_db.remove(Conversation.id == conversation_id)
+            self._conversations.pop(conversation_id, None)
+            self._ordering.remove(conversation_id)
+            doc_ids = self._unindex_conversation(conversation_id)
+            if doc_ids:
+                self.messages_db.remove(doc_ids=doc_ids)
+        return bool(removed)
+
+    # ========== MESSAGES ==========
+
+    def _update_conversation_with(self, conversation_id: str, compute):
+        """Cập nhật conversation bằng hàm tính field mới từ bản hiện tại (gọi khi giữ self._lock)"""
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            return
+        fields = compute(dict(conversation))
+        Conversation = Query()
+        self.conversations_db.update(fields, Conversation.id == conversation_id)
+        conversation.update(fields)
+        self._ordering.upsert(conversation)
+
+    def _check_new_message_ids(self, messages: List[Dict[str, Any]]):
+        """
+        Từ chối message id đã tồn tại hoặc lặp lại trong batch (như PRIMARY KEY của SQLite),
+        kiểm tra trước khi ghi để batch lỗi không ghi message nào (gọi khi giữ lock)
+        """
+        seen = set()
+        for message in messages:
+            message_id = message.get('id')
+            if not message_id:
+                continue
+            if message_id in seen or message_id in self._doc_id_by_message_id:
+                raise ValueError(f"Message id đã tồn tại: {message_id}")
+            seen.add(message_id)
+
+    def insert_message(self, message: Dict[str, Any]):
+        """Thêm message mới, cập nhật index và các field tổng hợp của conversation"""
+        with self._lock:
+            self._check_new_message_ids([message])
+            doc_id = self.messages_db.insert(message)
+            self._index_message(doc_id, dict(message))
+            self._update_conversation_with(
+                message.get('conversation_id'),
+                lambda conversation: apply_message_insert(conversation, message)
+            )
+
+    def insert_messages(self, messages: List[Dict[str, Any]]):
+        """Thêm nhiều messages trong một lần ghi file, cập nhật aggregates một lần cho mỗi conversation"""
+        with self._lock:
+            self._check_new_message_ids(messages)
+            doc_ids = self.messages_db.insert_multiple(messages)
+            by_conversation: Dict[str, List[Dict[str, Any]]] = {}
+            for doc_id, message in zip(doc_ids, messages):
+                self._index_message(doc_id, dict(message))
+                by_conversation.setdefault(message.get('conversation_id'), []).append(message)
+
+            def apply_all(conversation, conversation_messages):
+                fields = {}
+                for message in conversation_messages:
+                    fields = apply_message_insert({**conversation, **fields}, message)
+                return fields
+
+            for conversation_id, conversation_messages in by_conversation.items():
+                self._update_conversation_with(
+                    conversation_id,
+                    lambda conversation, batch=conversation_messages: apply_all(conversation, batch)
+                )
+
+    def delete_message(self, message_id: str) -> bool:
+        """Xóa một message và trừ nó khỏi các field tổng hợp của conversation"""
+        with self._lock:
+            doc_id = self._doc_id_by_message_id.pop(message_id, None)
+            if doc_id is None:
+                return False
+            message = self._messages.pop(doc_id)
+            conversation_id = message.get('conversation_id')
+            entries = self._messages_by_conversation.get(conversation_id, [])
+            entries.remove((message.get('timestamp', ''), doc_id))
+            self.messages_db.remove(doc_ids=[doc_id])
+
+            last_message_at = self._messages[entries[-1][1]].get('timestamp') if entries else None
+            self._update_conversation_with(
+                conversation_id,
+                lambda conversation: apply_message_delete(conversation, message, last_message_at)
+            )
+            return True
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy message theo ID (tra index, không quét file)"""
+        with self._lock:
+            doc_id = self._doc_id_by_message_id.get(message_id)
+            message = self._messages.get(doc_id) if doc_id is not None else None
+            return dict(message) if message else None
+
+    def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Lấy tất cả messages của conversation, sắp xếp theo thời gian"""
+        with self._lock:
+            entries = self._messages_by_conversation.get(conversation_id, [])
+            return [dict(self._messages[doc_id]) for _, doc_id in entries]
+
+    def _cursor_key(self, conversation_id: str, cursor: str, after: bool) -> Tuple[str, float]:
+        """Chuyển cursor (message id hoặc timestamp) thành khóa (timestamp, doc_id)"""
+        doc_id = self._doc_id_by_message_id.get(cursor)
+        if doc_id is not None and self._messages[doc_id].get('conversation_id') == conversation_id:
+            return (self._messages[doc_id].get('timestamp', ''), doc_id)
+        # Cursor timestamp: before lấy mọi message có timestamp nhỏ hơn, after lấy lớn hơn
+        return (parse_timestamp_cursor(cursor), float('inf') if after else float('-inf'))
+
+    def get_messages_page(self, conversation_id: str, limit: int,
+                          before: Optional[str] = None, after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Lấy một trang messages theo cursor, chỉ đọc đúng `limit` records
+
+        Không có cursor hoặc có `before`: trả về `limit` messages gần nhất trước cursor.
+        Có `after`: trả về `limit` messages đầu tiên sau cursor. Kết quả luôn theo thứ tự thời gian.
+        """
+        with self._lock:
+            entries = self._messages_by_conversation.get(conversation_id, [])
+            page, has_more = slice_page(
+                entries, limit,
+                before_key=self._cursor_key(conversation_id, before, False) if before is not None else None,
+                after_key=self._cursor_key(conversation_id, after, True) if after is not None else None
+            )
+            return [dict(self._messages[doc_id]) for _, doc_id in page], has_more
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Duyệt tất cả messages (snapshot tại thời điểm gọi)"""
+        with self._lock:
+            messages = list(self._messages.values())
+        for message in messages:
+            yield dict(message)
+
+    def count_messages(self, conversation_id: str) -> int:
+        """Đếm số messages của conversation"""
+        with self._lock:
+            return len(self._messages_by_conversation.get(conversation_id, []))
+
+    # ========== BULK ==========
+
+    def bulk_insert(self, conversations: List[Dict[str, Any]] = None, messages: List[Dict[str, Any]] = None) -> int:
+        """Thêm nhiều records trong một lần ghi file cho mỗi bảng; records đã tồn tại (cùng id) được bỏ qua"""
+        inserted = 0
+        with self._lock:
+            conversations = list({
+                c['id']: c for c in conversations or [] if c['id'] not in self._conversations
+            }.values())
+            messages = list({
+                m['id']: m for m in messages or [] if m['id'] not in self._doc_id_by_message_id
+            }.values())
+            if conversations:
+                inserted += len(self.conversations_db.insert_multiple(conversations))
+                for conversation in conversations:
+                    self._cache_conversation(dict(conversation))
+            if messages:
+                doc_ids = self.messages_db.insert_multiple(messages)
+                for doc_id, message in zip(doc_ids, messages):
+                    self._index_message(doc_id, dict(message))
+                inserted += len(doc_ids)
+        return inserted
+
+    def close(self):
+        """Đóng các file TinyDB"""
+        self.conversations_db.close()
+        self.messages_db.close()
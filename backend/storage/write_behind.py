@@ -0,0 +1,514 @@
+# ========== IMPORTS ==========
+import os
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Tuple, Iterator, Callable, Iterable
+from storage.aggregates import apply_message_insert, next_version
+from storage.cursors import parse_timestamp_cursor, slice_page, conversation_sort_key
+import logging
+
+# ========== LOGGER SETUP ==========
+logger = logging.getLogger(__name__)
+
+# Số lỗi gần nhất giữ trong bộ nhớ để xem nhanh; bản đầy đủ (kèm record) nằm trong file dead letter
+MAX_DEAD_LETTERS = 1000
+
+class WriteBehindStore:
+    """
+    Bọc một store bất kỳ: ghi được đưa vào hàng đợi và một writer thread duy nhất ghi xuống store
+
+    - insert_conversation, update_conversation, insert_message trả về ngay, không chờ disk I/O
+    - Các ghi liên tiếp được gom thành batch (insert_messages) để giảm số lần ghi file
+    - Đọc nhìn thấy cả các ghi đang chờ (read-your-writes overlay)
+    - Xóa và bulk insert chạy đồng bộ sau khi đã flush hàng đợi
+    - Reader không chờ writer ghi xong batch: đọc store và cộng thêm snapshot các ghi chưa vào store
+      (đang chờ hoặc đang ghi); mỗi lời gọi store bên dưới tự đảm bảo an toàn thread
+    - Một record ghi lỗi không kéo theo các record khác trong cùng batch: record lỗi (kèm toàn bộ dữ liệu)
+      được nối vào file dead letter, xem bằng dead_letter_stats() và ghi lại bằng replay_dead_letters()
+    """
+
+    def __init__(self, store, flush_interval_ms: int = 50, max_batch_size: int = 500,
+                 dead_letter_path: Optional[str] = None):
+        """
+        Khởi tạo wrapper và khởi động writer thread
+
+        Args:
+            store: Store bên dưới
+            flush_interval_ms (int): Thời gian gom ghi trước mỗi lần flush
+            max_batch_size (int): Số thao tác tối đa mỗi batch
+            dead_letter_path (str, optional): File NDJSON lưu các record ghi lỗi (None = chỉ giữ trong bộ nhớ)
+        """
+        self.store = store
+        self.name = store.name
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        # _state_lock chỉ bảo vệ hàng đợi (giữ rất ngắn, không bao giờ chờ I/O);
+        # _flush_lock chỉ serialize các lần flush và các thao tác đồng bộ (xóa, bulk insert), reader không dùng.
+        # Một thao tác rời _inflight chỉ sau khi lời gọi store của nó xong, nên snapshot _inflight + _pending
+        # lấy trước khi đọc store luôn chứa mọi ghi mà store có thể chưa thấy
+        self._state_lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._wakeup = threading.Condition(self._state_lock)
+        self._applied = threading.Condition(self._state_lock)
+        self._pending: "deque[Tuple[str, Any]]" = deque()
+        self._inflight: List[Tuple[str, Any]] = []
+        self._applying: List[Tuple[str, Any]] = []
+        self._applied_ops = 0
+        self._closed = False
+        self._closing = threading.Event()
+
+        self.stats = {"queued": 0, "flushed": 0, "batches": 0, "failed": 0}
+        self.dead_letters: "deque[Dict[str, Any]]" = deque(maxlen=MAX_DEAD_LETTERS)
+        self.dead_letter_path = dead_letter_path
+        self._dead_letter_lock = threading.Lock()
+        if dead_letter_path:
+            os.makedirs(os.path.dirname(os.path.abspath(dead_letter_path)), exist_ok=True)
+            pending_dead_letters = len(self._read_dead_letters())
+            if pending_dead_letters:
+                logger.warning(f"⚠️  {pending_dead_letters} write-behind records chưa ghi được nằm trong "
+                               f"{dead_letter_path}, ghi lại bằng replay_dead_letters()")
+
+        self._writer = threading.Thread(target=self._run_writer, name="write-behind-writer", daemon=True)
+        self._writer.start()
+
+    # ========== WRITER ==========
+
+    def _enqueue(self, op: str, payload: Any):
+        """Đưa một thao tác ghi vào hàng đợi"""
+        with self._state_lock:
+            if self._closed:
+                raise RuntimeError("WriteBehindStore is closed")
+            self._pending.append((op, payload))
+            self.stats["queued"] += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._wakeup.notify()
+
+    def _run_writer(self):
+        """Flush hàng đợi mỗi flush_interval hoặc khi đủ max_batch_size thao tác"""
+        while True:
+            with self._state_lock:
+                if not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed and not self._pending:
+                    return
+            # Chờ thêm một chút để gom nhiều thao tác vào cùng batch (close() không phải chờ hết)
+            if len(self._pending) < self.max_batch_size:
+                self._closing.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Ghi toàn bộ hàng đợi xuống store theo đúng thứ tự"""
+        with self._flush_lock:
+            while True:
+                with self._state_lock:
+                    batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch_size))]
+                    self._inflight = list(batch)
+                if not batch:
+                    return
+                self._apply_batch(batch)
+
+    def _apply_batch(self, batch: List[Tuple[str, Any]]):
+        """Ghi một batch; các insert_message liên tiếp được gộp thành một insert_messages"""
+        start = time.perf_counter()
+        i = 0
+        while i < len(batch):
+            op = batch[i][0]
+            j = i + 1
+            if op == 'insert_message':
+                while j < len(batch) and batch[j][0] == 'insert_message':
+                    j += 1
+            self._apply_group(batch[i:j])
+            i = j
+
+        self.stats["flushed"] += len(batch)
+        self.stats["batches"] += 1
+        logger.debug(f"💾 Flushed {len(batch)} writes in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    def _apply_group(self, group: List[Tuple[str, Any]]):
+        """Ghi một lời gọi store (một thao tác, hoặc nhiều insert_message gộp lại) rồi bỏ nó khỏi _inflight"""
+        with self._state_lock:
+            self._applying = group
+        try:
+            op, payload = group[0]
+            if op == 'insert_message':
+                try:
+                    self.store.insert_messages([message for _, message in group])
+                except Exception as e:
+                    if len(group) == 1:
+                        raise
+                    # Batch gộp lỗi: ghi lại từng record để chỉ bỏ các record tự nó bị lỗi
+                    logger.warning(f"⚠️  Write-behind insert_messages failed for {len(group)} records ({e}), "
+                                   f"retrying one by one")
+                    for _, message in group:
+                        self._apply_one('insert_message', message)
+            else:
+                self._apply_one(op, payload, raise_errors=True)
+        except Exception as e:
+            self._dead_letter(op, payload, e)
+        finally:
+            with self._state_lock:
+                del self._inflight[:len(group)]
+                self._applying = []
+                self._applied_ops += len(group)
+                self._applied.notify_all()
+
+    def _apply_one(self, op: str, payload: Any, raise_errors: bool = False):
+        """Ghi một thao tác; lỗi được đưa vào file dead letter (không retry ngay để không chặn hàng đợi)"""
+        try:
+            if op == 'insert_message':
+                self.store.insert_messages([payload])
+            elif op == 'insert_conversation':
+                self.store.insert_conversation(payload)
+            elif op == 'update_conversation':
+                if self.store.update_conversation(*payload) is None:
+                    raise KeyError(f"Conversation {payload[0]} không tồn tại")
+        except Exception as e:
+            if raise_errors:
+                raise
+            self._dead_letter(op, payload, e)
+
+    def _dead_letter(self, op: str, payload: Any, error: Exception):
+        """Ghi nhận một record không ghi được xuống store (nối vào file dead letter để ghi lại sau)"""
+        record_id = payload[0] if op == 'update_conversation' else payload.get('id')
+        entry = {
+            "op": op,
+            "id": record_id,
+            "error": str(error),
+            "failed_at": datetime.now().isoformat()
+        }
+        self.stats["failed"] += 1
+        self.dead_letters.append(entry)
+        logger.error(f"❌ Write-behind {op} failed for id {record_id}: {error}")
+        if not self.dead_letter_path:
+            return
+        try:
+            with self._dead_letter_lock:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({**entry, "payload": payload}, ensure_ascii=False, default=str) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"❌ Không ghi được dead letter {record_id} vào {self.dead_letter_path}: {e}")
+
+    # ========== DEAD LETTERS ==========
+
+    def _read_dead_letters(self) -> List[Dict[str, Any]]:
+        """Đọc các record trong file dead letter (bỏ qua dòng hỏng, ví dụ dòng cuối ghi dở)"""
+        if not self.dead_letter_path or not os.path.exists(self.dead_letter_path):
+            return []
+        entries = []
+        with open(self.dead_letter_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"⚠️  Bỏ qua dòng hỏng trong {self.dead_letter_path}")
+        return entries
+
+    def _write_dead_letters(self, entries: List[Dict[str, Any]]):
+        """Thay nội dung file dead letter (ghi file tạm rồi replace; xóa file nếu không còn record)"""
+        if not entries:
+            if os.path.exists(self.dead_letter_path):
+                os.remove(self.dead_letter_path)
+            return
+        tmp_path = f"{self.dead_letter_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.dead_letter_path)
+
+    def _already_applied(self, op: str, payload: Any) -> bool:
+        """Insert đã có trong store (ví dụ được ghi lại bằng tay) thì không cần replay"""
+        if op == 'insert_message':
+            return self.store.get_message(payload.get('id')) is not None
+        if op == 'insert_conversation':
+            return self.store.get_conversation(payload.get('id')) is not None
+        return False
+
+    def dead_letter_stats(self) -> Dict[str, Any]:
+        """Số record đang nằm trong file dead letter, tổng số lỗi từ khi khởi động và các lỗi gần nhất"""
+        with self._dead_letter_lock:
+            pending = len(self._read_dead_letters())
+        return {
+            "path": self.dead_letter_path,
+            "pending": pending,
+            "failed_since_start": self.stats["failed"],
+            "recent": list(self.dead_letters)[-20:]
+        }
+
+    def replay_dead_letters(self) -> Dict[str, int]:
+        """
+        Ghi lại các record trong file dead letter theo thứ tự (đồng bộ, sau khi flush hàng đợi)
+
+        Record ghi thành công hoặc đã có trong store được xóa khỏi file; record vẫn lỗi được giữ lại
+        với lỗi mới nhất.
+
+        Returns:
+            Dict[str, int]: Số record replayed, skipped (đã có trong store) và failed (còn trong file)
+        """
+        result = {"replayed": 0, "skipped": 0, "failed": 0}
+        if not self.dead_letter_path:
+            return result
+        with self._flush_lock:
+            self.flush()
+            with self._dead_letter_lock:
+                remaining = []
+                for entry in self._read_dead_letters():
+                    op, payload = entry.get("op"), entry.get("payload")
+                    if op == 'update_conversation':
+                        payload = tuple(payload)
+                    try:
+                        if self._already_applied(op, payload):
+                            result["skipped"] += 1
+                            continue
+                        self._apply_one(op, payload, raise_errors=True)
+                        result["replayed"] += 1
+                    except Exception as e:
+                        remaining.append({**entry, "error": str(e), "failed_at": datetime.now().isoformat()})
+                result["failed"] = len(remaining)
+                self._write_dead_letters(remaining)
+        logger.info(f"🔁 Replayed write-behind dead letters: {result}")
+        return result
+
+    def _snapshot(self) -> Tuple[int, List[Tuple[str, Any]]]:
+        """Số thao tác đã ghi xong và bản sao các ghi chưa chắc đã nằm trong store (gọi khi giữ _state_lock)"""
+        return self._applied_ops, self._inflight + list(self._pending)
+
+    def _pending_ops(self) -> List[Tuple[str, Any]]:
+        """Bản sao các ghi đang chờ hoặc đang ghi"""
+        with self._state_lock:
+            return self._snapshot()[1]
+
+    def _consistent_read(self, read_store: Callable[[List[Tuple[str, Any]]], Any],
+                         conversation_ids: Optional[Iterable[str]] = None) -> Tuple[Any, List[Tuple[str, Any]]]:
+        """
+        Đọc store cùng một snapshot hàng đợi khớp với nó, cho các overlay không idempotent (field tổng hợp)
+
+        Overlay cộng dồn message_count/version nên không được áp một ghi mà store đã có. Nếu có lời gọi
+        store chạm vào các conversation đang đọc xong trong lúc đọc thì đọc lại; chỉ chờ khi chính lời gọi
+        đang chạy chạm vào các conversation đó (một lời gọi store, không phải cả batch).
+
+        Args:
+            read_store: Hàm đọc store, nhận snapshot hàng đợi
+            conversation_ids: Các conversation liên quan (None = tất cả)
+
+        Returns:
+            Tuple kết quả đọc store và snapshot hàng đợi tương ứng
+        """
+        wanted = None if conversation_ids is None else set(conversation_ids)
+
+        def touches(ops):
+            return bool(ops) and (wanted is None or bool(self._touched_conversations(ops) & wanted))
+
+        while True:
+            with self._state_lock:
+                while touches(self._applying):
+                    self._applied.wait()
+                seq, pending = self._snapshot()
+            result = read_store(pending)
+            with self._state_lock:
+                # Các thao tác đầu snapshot đã được ghi trong lúc đọc (store có thể đã thấy hoặc chưa)
+                done = pending[:self._applied_ops - seq]
+                changed = touches(done) or touches(self._applying)
+            if not changed:
+                return result, pending
+
+    def _unapplied_messages(self, messages: List[Dict[str, Any]],
+                            stored: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Bỏ các message đang chờ mà store đã có (writer ghi xong trong lúc đọc)"""
+        stored_ids = {m.get('id') for m in stored}
+        return [m for m in messages if m.get('id') not in stored_ids]
+
+    # ========== OVERLAY ==========
+
+    @staticmethod
+    def _overlay_conversation(conversation_id: str, conversation: Optional[Dict[str, Any]],
+                              pending: List[Tuple[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Áp các ghi đang chờ lên bản conversation đọc từ store"""
+        conversation = dict(conversation) if conversation else None
+        for op, payload in pending:
+            if op == 'insert_conversation' and payload.get('id') == conversation_id:
+                conversation = dict(payload)
+            elif op == 'update_conversation' and payload[0] == conversation_id and conversation is not None:
+                conversation.update({**next_version(conversation), **payload[1]})
+            elif op == 'insert_message' and payload.get('conversation_id') == conversation_id and conversation is not None:
+                conversation.update(apply_message_insert(conversation, payload))
+        return conversation
+
+    @staticmethod
+    def _pending_messages(conversation_id: str, pending: List[Tuple[str, Any]]) -> List[Dict[str, Any]]:
+        return [dict(payload) for op, payload in pending
+                if op == 'insert_message' and payload.get('conversation_id') == conversation_id]
+
+    # ========== CONVERSATIONS ==========
+
+    def insert_conversation(self, conversation: Dict[str, Any]):
+        """Thêm conversation mới (ghi bất đồng bộ)"""
+        self._enqueue('insert_conversation', dict(conversation))
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy conversation theo ID, tính cả các ghi đang chờ"""
+        conversation, pending = self._consistent_read(
+            lambda _: self.store.get_conversation(conversation_id), [conversation_id]
+        )
+        return self._overlay_conversation(conversation_id, conversation, pending)
+
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả conversations, mới nhất trước, tính cả các ghi đang chờ"""
+        conversations, pending = self._consistent_read(lambda _: self.store.list_conversations())
+        if not pending:
+            return conversations
+
+        by_id = {c['id']: c for c in conversations}
+        for conversation_id in self._touched_conversations(pending):
+            conversation = self._overlay_conversation(conversation_id, by_id.get(conversation_id), pending)
+            if conversation is not None:
+                by_id[conversation_id] = conversation
+        result = list(by_id.values())
+        result.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        return result
+
+    @staticmethod
+    def _touched_conversations(pending: List[Tuple[str, Any]]) -> set:
+        """Các conversation id bị thay đổi bởi hàng đợi"""
+        return {payload.get('id') if op == 'insert_conversation' else
+                payload[0] if op == 'update_conversation' else payload.get('conversation_id')
+                for op, payload in pending}
+
+    def list_conversations_page(self, limit: int, order_by: str = 'updated_at',
+                                after: Optional[Tuple[str, str]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Lấy một trang conversations, tính cả các ghi đang chờ
+
+        Đọc thêm từ store đúng bằng số conversation đang có ghi chờ, bỏ các bản cũ của chúng,
+        rồi chèn bản overlay vào đúng vị trí; các conversation khác giữ nguyên thứ tự.
+        """
+        def read_store(pending):
+            touched = self._touched_conversations(pending)
+            page = self.store.list_conversations_page(limit + len(touched), order_by, after)
+            return page, [(conversation_id, self.store.get_conversation(conversation_id)) for conversation_id in touched]
+
+        ((page, has_more), overlays), pending = self._consistent_read(read_store)
+        if not pending:
+            return page, has_more
+        touched = self._touched_conversations(pending)
+
+        merged = [c for c in page if c['id'] not in touched]
+        for conversation_id, conversation in overlays:
+            conversation = self._overlay_conversation(conversation_id, conversation, pending)
+            if conversation is not None and (after is None or conversation_sort_key(conversation, order_by) < after):
+                merged.append(conversation)
+        merged.sort(key=lambda c: conversation_sort_key(c, order_by), reverse=True)
+        return merged[:limit], has_more or len(merged) > limit
+
+    def update_conversation(self, conversation_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cập nhật conversation (ghi bất đồng bộ), trả về bản đã cập nhật hoặc None nếu không tồn tại"""
+        conversation = self.get_conversation(conversation_id)
+        if conversation is None:
+            return None
+        self._enqueue('update_conversation', (conversation_id, dict(fields)))
+        conversation.update({**next_version(conversation), **fields})
+        return conversation
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Xóa conversation (đồng bộ, sau khi flush các ghi đang chờ)"""
+        with self._flush_lock:
+            self.flush()
+            return self.store.delete_conversation(conversation_id)
+
+    # ========== MESSAGES ==========
+
+    def insert_message(self, message: Dict[str, Any]):
+        """Thêm message mới (ghi bất đồng bộ)"""
+        self._enqueue('insert_message', dict(message))
+
+    def insert_messages(self, messages: List[Dict[str, Any]]):
+        """Thêm nhiều messages (ghi bất đồng bộ)"""
+        for message in messages:
+            self._enqueue('insert_message', dict(message))
+
+    def delete_message(self, message_id: str) -> bool:
+        """Xóa message (đồng bộ, sau khi flush các ghi đang chờ)"""
+        with self._flush_lock:
+            self.flush()
+            return self.store.delete_message(message_id)
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy message theo ID, tính cả các ghi đang chờ"""
+        # Snapshot lấy trước khi đọc store: message chỉ rời hàng đợi sau khi đã nằm trong store
+        for op, payload in self._pending_ops():
+            if op == 'insert_message' and payload.get('id') == message_id:
+                return dict(payload)
+        return self.store.get_message(message_id)
+
+    def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Lấy tất cả messages của conversation, tính cả các ghi đang chờ"""
+        pending = self._pending_messages(conversation_id, self._pending_ops())
+        messages = self.store.get_messages(conversation_id)
+        pending = self._unapplied_messages(pending, messages)
+        if pending:
+            messages = sorted(messages + pending, key=lambda m: m.get('timestamp', ''))
+        return messages
+
+    def get_messages_page(self, conversation_id: str, limit: int,
+                          before: Optional[str] = None, after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Lấy một trang messages; chỉ đọc toàn bộ lịch sử khi conversation còn ghi đang chờ"""
+        pending = self._pending_messages(conversation_id, self._pending_ops())
+        if not pending:
+            return self.store.get_messages_page(conversation_id, limit, before=before, after=after)
+        messages = self.store.get_messages(conversation_id)
+        pending = self._unapplied_messages(pending, messages)
+        messages = sorted(messages + pending, key=lambda m: m.get('timestamp', ''))
+
+        entries = [(m.get('timestamp', ''), index) for index, m in enumerate(messages)]
+        index_by_id = {m.get('id'): index for index, m in enumerate(messages)}
+
+        def cursor_key(cursor: str, after_cursor: bool):
+            if cursor in index_by_id:
+                return entries[index_by_id[cursor]]
+            return (parse_timestamp_cursor(cursor), float('inf') if after_cursor else float('-inf'))
+
+        page, has_more = slice_page(
+            entries, limit,
+            before_key=cursor_key(before, False) if before is not None else None,
+            after_key=cursor_key(after, True) if after is not None else None
+        )
+        return [messages[index] for _, index in page], has_more
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Duyệt tất cả messages đã ghi xuống store (flush hàng đợi trước)"""
+        self.flush()
+        return self.store.iter_messages()
+
+    def count_messages(self, conversation_id: str) -> int:
+        """Đếm số messages của conversation, tính cả các ghi đang chờ"""
+        pending = self._pending_messages(conversation_id, self._pending_ops())
+        count = self.store.count_messages(conversation_id)
+        # Message vừa được writer ghi xong trong lúc đếm đã nằm trong count
+        return count + sum(1 for m in pending if self.store.get_message(m.get('id')) is None)
+
+    # ========== BULK ==========
+
+    def bulk_insert(self, conversations: List[Dict[str, Any]] = None, messages: List[Dict[str, Any]] = None) -> int:
+        """Bulk insert đồng bộ (sau khi flush các ghi đang chờ)"""
+        with self._flush_lock:
+            self.flush()
+            return self.store.bulk_insert(conversations, messages)
+
+    def close(self):
+        """Flush các ghi đang chờ, dừng writer thread và đóng store bên dưới"""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._closing.set()
+            self._wakeup.notify()
+        self._writer.join()
+        self.flush()
+        self.store.close()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the append-only log store (storage/log_store.py)
+Runs without a server: python test_log_store.py
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from storage.log_store import LogStore
+
+
+def make_message(message_id, conversation_id='c1', timestamp=None):
+    return {
+        'id': message_id,
+        'conversation_id': conversation_id,
+        'role': 'user',
+        'content': f'nội dung {message_id}',
+        'timestamp': timestamp or f'2024-01-01T00:00:{message_id[-2:]}'
+    }
+
+
+class LogStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="log_store_test_")
+        self.log_path = os.path.join(self.directory, "chat.log")
+        self.store = self.open_store()
+        self.store.insert_conversation({'id': 'c1', 'title': 't', 'created_at': '2024-01-01T00:00:00',
+                                        'updated_at': '2024-01-01T00:00:00', 'message_count': 0})
+        self.store.insert_message(make_message('m01'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open_store(self, **kwargs):
+        return LogStore(self.log_path, fsync_policy='never', **kwargs)
+
+    def reopen(self, **kwargs):
+        self.store.close()
+        self.store = self.open_store(**kwargs)
+
+    def append_raw(self, data):
+        with open(self.log_path, 'ab') as f:
+            f.write(data)
+
+    def test_replay_truncates_torn_write(self):
+        self.store.close()
+        size = os.path.getsize(self.log_path)
+        self.append_raw(b'{"op": "insert_message", "data": {"id": "m0')
+
+        self.store = self.open_store()
+        self.assertEqual(os.path.getsize(self.log_path), size)
+        self.assertEqual(self.store.count_messages('c1'), 1)
+
+        # Appends after the cut line up with the index
+        self.store.insert_message(make_message('m02'))
+        self.reopen()
+        self.assertEqual([m['id'] for m in self.store.get_messages('c1')], ['m01', 'm02'])
+        self.assertEqual(self.store.get_conversation('c1')['message_count'], 2)
+
+    def test_replay_skips_record_that_cannot_be_applied(self):
+        self.store.close()
+        bad = (json.dumps({'op': 'insert_message'}) + '\n').encode('utf-8')
+        self.append_raw(bad)
+        self.append_raw((json.dumps({'op': 'insert_message', 'data': make_message('m02')}) + '\n').encode('utf-8'))
+
+        self.store = self.open_store()
+        self.assertEqual([m['id'] for m in self.store.get_messages('c1')], ['m01', 'm02'])
+        self.assertEqual(self.store.get_message('m02')['content'], 'nội dung m02')
+        self.assertGreaterEqual(self.store._dead_bytes, len(bad))
+
+    def test_invalid_record_is_not_written(self):
+        size = os.path.getsize(self.log_path)
+        with self.assertRaises(ValueError):
+            self.store._submit([{'op': 'insert_message'}])
+        with self.assertRaises(ValueError):
+            self.store._submit([{'op': 'rename_everything'}])
+        self.assertEqual(os.path.getsize(self.log_path), size)
+
+        self.store.insert_message(make_message('m02'))
+        self.reopen()
+        self.assertEqual(self.store.count_messages('c1'), 2)
+
+    def test_apply_failure_truncates_the_written_record(self):
+        size = os.path.getsize(self.log_path)
+        # A timestamp that cannot be ordered against the existing messages fails while applying
+        with self.assertRaises(TypeError):
+            self.store.insert_message(make_message('m02', timestamp=1))
+        self.assertEqual(os.path.getsize(self.log_path), size)
+        self.assertEqual(self.store._file_size, size)
+        self.assertIsNone(self.store.get_message('m02'))
+
+        self.store.insert_message(make_message('m03'))
+        self.assertEqual(self.store.get_message('m03')['id'], 'm03')
+        self.reopen()
+        self.assertEqual([m['id'] for m in self.store.get_messages('c1')], ['m01', 'm03'])
+
+    def test_apply_failure_rewrites_the_rest_of_the_batch(self):
+        self.reopen(group_commit_ms=300)
+        errors = {}
+
+        def insert(message):
+            try:
+                self.store.insert_message(message)
+            except Exception as e:
+                errors[message['id']] = e
+
+        # Both writes wait in the same group commit; only the first one fails
+        threads = [threading.Thread(target=insert, args=(make_message('m02', timestamp=1),)),
+                   threading.Thread(target=insert, args=(make_message('m03'),))]
+        threads[0].start()
+        time.sleep(0.05)
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(list(errors), ['m02'])
+        self.assertEqual(self.store.get_message('m03')['id'], 'm03')
+        self.assertEqual(self.store._file_size, os.path.getsize(self.log_path))
+        self.reopen()
+        self.assertEqual([m['id'] for m in self.store.get_messages('c1')], ['m01', 'm03'])
+
+
+if __name__ == "__main__":
+    unittest.main()
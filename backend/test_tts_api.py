@@ -176,9 +176,11 @@ class TTSAPITester:
                 "expected_status": 400
             },
             {
+                # There is no length limit: long text is split into segments, even without spaces
                 "name": "Very Long Text",
                 "payload": {"text": "a" * 10000},
-                "expected_status": 500
+                "expected_status": 200,
+                "timeout": 300
             }
         ]
         
@@ -187,7 +189,7 @@ class TTSAPITester:
                 response = requests.post(
                     f"{self.base_url}/api/tts/convert", 
                     json=test["payload"], 
-                    timeout=30
+                    timeout=test.get("timeout", 30)
                 )
                 
                 success = response.status_code == test["expected_status"]
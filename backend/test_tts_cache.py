@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the synthesized audio cache (services/tts_cache.py)
+Runs without the model or a server: python test_tts_cache.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from services.tts_cache import TTSAudioCache, RENDER_NORMALIZED, RENDER_PEAK_LIMITED
+
+
+class TTSAudioCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="tts_cache_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def set_access_times(self, cache, keys):
+        """Give entries strictly increasing mtimes in the given order (oldest first)"""
+        for i, key in enumerate(keys):
+            os.utime(cache.path_for(key), (1_000_000 + i, 1_000_000 + i))
+
+    def test_key_depends_on_render_mode_not_whitespace(self):
+        key = TTSAudioCache.key_for("model", 16000, "Xin  chào\nbạn")
+        self.assertEqual(key, TTSAudioCache.key_for("model", 16000, " Xin chào bạn "))
+        self.assertEqual(key, TTSAudioCache.key_for("model", 16000, "Xin chào bạn", RENDER_NORMALIZED))
+        self.assertNotEqual(key, TTSAudioCache.key_for("model", 16000, "Xin chào bạn", RENDER_PEAK_LIMITED))
+        self.assertNotEqual(key, TTSAudioCache.key_for("model", 22050, "Xin chào bạn"))
+        self.assertNotEqual(key, TTSAudioCache.key_for("other", 16000, "Xin chào bạn"))
+
+    def test_evicts_least_recently_used(self):
+        cache = TTSAudioCache(self.cache_dir, max_bytes=300)
+        for key in ("a", "b", "c"):
+            cache.put(key, b"x" * 100)
+        # Touching "a" makes "b" the least recently used entry
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("d", b"x" * 100)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertFalse(os.path.exists(cache.path_for("b")))
+        for key in ("a", "c", "d"):
+            self.assertIsNotNone(cache.get(key))
+        stats = cache.get_stats()
+        self.assertEqual((stats["entries"], stats["bytes"], stats["evictions"]), (3, 300, 1))
+
+    def test_entry_larger_than_budget_is_not_cached(self):
+        cache = TTSAudioCache(self.cache_dir, max_bytes=100)
+        self.assertIsNone(cache.put("big", b"x" * 101))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_overwrite_counts_size_once(self):
+        cache = TTSAudioCache(self.cache_dir, max_bytes=1000)
+        cache.put("a", b"x" * 100)
+        cache.put("a", b"x" * 40)
+        self.assertEqual(cache.get_stats()["bytes"], 40)
+
+    def test_rebuilds_index_from_disk_in_lru_order(self):
+        cache = TTSAudioCache(self.cache_dir, max_bytes=1000)
+        for key in ("a", "b", "c"):
+            cache.put(key, b"x" * 100)
+        self.set_access_times(cache, ["b", "c", "a"])
+
+        reopened = TTSAudioCache(self.cache_dir, max_bytes=1000)
+        stats = reopened.get_stats()
+        self.assertEqual((stats["entries"], stats["bytes"]), (3, 300))
+        self.assertEqual(reopened.get("a"), cache.path_for("a"))
+
+        # Oldest access first: "b" goes when the budget shrinks
+        reopened.put("d", b"x" * 750)
+        self.assertIsNone(reopened.get("b"))
+        self.assertIsNotNone(reopened.get("c"))
+
+    def test_reopening_with_smaller_budget_evicts_oldest(self):
+        cache = TTSAudioCache(self.cache_dir, max_bytes=1000)
+        for key in ("a", "b", "c"):
+            cache.put(key, b"x" * 100)
+        self.set_access_times(cache, ["c", "a", "b"])
+
+        reopened = TTSAudioCache(self.cache_dir, max_bytes=200)
+        self.assertIsNone(reopened.get("c"))
+        self.assertFalse(os.path.exists(cache.path_for("c")))
+        self.assertEqual(reopened.get_stats()["entries"], 2)
+
+    def test_removes_leftover_tmp_files(self):
+        cache = TTSAudioCache(self.cache_dir, max_bytes=1000)
+        cache.put("a", b"x" * 100)
+        leftover = cache.path_for("b") + ".123.456.tmp"
+        with open(leftover, "wb") as f:
+            f.write(b"partial")
+
+        reopened = TTSAudioCache(self.cache_dir, max_bytes=1000)
+        self.assertFalse(os.path.exists(leftover))
+        self.assertEqual(reopened.get_stats()["entries"], 1)
+        self.assertIsNone(reopened.get("b"))
+
+    def test_file_removed_behind_the_cache_is_a_miss(self):
+        cache = TTSAudioCache(self.cache_dir, max_bytes=1000)
+        cache.put("a", b"x" * 100)
+        os.remove(cache.path_for("a"))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get_stats()["bytes"], 0)
+
+    def test_disabled_cache(self):
+        cache_dir = os.path.join(self.cache_dir, "disabled")
+        cache = TTSAudioCache(cache_dir, max_bytes=0)
+        self.assertIsNone(cache.put("a", b"x"))
+        self.assertIsNone(cache.get("a"))
+        self.assertFalse(os.path.exists(cache_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
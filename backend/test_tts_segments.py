@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for TTS text segmentation and crossfading (utils/tts_segments.py)
+Runs without the model or a server: python test_tts_segments.py
+"""
+
+import unittest
+
+import numpy as np
+
+from utils.tts_segments import split_into_segments, Crossfader, crossfade_concat
+
+
+class SplitIntoSegmentsTest(unittest.TestCase):
+    def test_splits_at_sentence_ends_and_line_breaks(self):
+        text = "Điều 1 quy định phạm vi điều chỉnh. Điều 2 quy định đối tượng áp dụng!\nĐiều 3 giải thích từ ngữ?"
+        self.assertEqual(
+            split_into_segments(text, max_chars=60, min_chars=5),
+            [
+                "Điều 1 quy định phạm vi điều chỉnh.",
+                "Điều 2 quy định đối tượng áp dụng!",
+                "Điều 3 giải thích từ ngữ?",
+            ],
+        )
+
+    def test_long_sentence_splits_at_clauses(self):
+        text = "Cá nhân vi phạm bị phạt tiền, tổ chức vi phạm bị phạt gấp đôi, trừ trường hợp luật khác quy định."
+        segments = split_into_segments(text, max_chars=40, min_chars=5)
+        self.assertEqual(
+            segments,
+            [
+                "Cá nhân vi phạm bị phạt tiền,",
+                "tổ chức vi phạm bị phạt gấp đôi,",
+                "trừ trường hợp luật khác quy định.",
+            ],
+        )
+
+    def test_clause_without_punctuation_splits_between_words(self):
+        words = ["từ"] * 50
+        segments = split_into_segments(" ".join(words), max_chars=20, min_chars=1)
+        self.assertTrue(all(len(segment) <= 20 for segment in segments))
+        self.assertEqual(" ".join(segments).split(), words)
+
+    def test_word_longer_than_limit_is_cut(self):
+        segments = split_into_segments("a" * 10000, max_chars=300)
+        self.assertEqual(len(segments), 34)
+        self.assertTrue(all(len(segment) <= 300 for segment in segments))
+        self.assertEqual("".join(segments), "a" * 10000)
+
+    def test_short_fragments_merge_forward(self):
+        text = "Chương I\nNhững quy định chung của luật này."
+        self.assertEqual(
+            split_into_segments(text, max_chars=100, min_chars=20),
+            ["Chương I Những quy định chung của luật này."],
+        )
+
+    def test_trailing_short_fragment_merges_backward(self):
+        text = "Những quy định chung của luật này. Hết."
+        self.assertEqual(
+            split_into_segments(text, max_chars=100, min_chars=20),
+            ["Những quy định chung của luật này. Hết."],
+        )
+
+    def test_short_fragment_kept_when_merge_would_exceed_limit(self):
+        text = "Mục 1\n" + "x" * 30
+        self.assertEqual(split_into_segments(text, max_chars=30, min_chars=10), ["Mục 1", "x" * 30])
+
+    def test_empty_text(self):
+        self.assertEqual(split_into_segments(""), [])
+        self.assertEqual(split_into_segments("  \n\n "), [])
+        self.assertEqual(split_into_segments(None), [])
+
+
+class CrossfadeTest(unittest.TestCase):
+    def test_concat_length(self):
+        waveforms = [np.ones(1000), np.ones(500), np.ones(800)]
+        result = crossfade_concat(waveforms, overlap_samples=100)
+        # Each join overlaps the neighbours by 100 samples
+        self.assertEqual(len(result), 1000 + 500 + 800 - 2 * 100)
+        self.assertEqual(result.dtype, np.float32)
+
+    def test_overlap_limited_by_short_waveform(self):
+        result = crossfade_concat([np.ones(1000), np.ones(30)], overlap_samples=100)
+        self.assertEqual(len(result), 1000)
+
+    def test_zero_overlap_is_plain_concat(self):
+        a, b = np.arange(5, dtype=np.float32), np.arange(3, dtype=np.float32)
+        np.testing.assert_array_equal(crossfade_concat([a, b], 0), np.concatenate([a, b]))
+
+    def test_empty_input(self):
+        self.assertEqual(len(crossfade_concat([], 100)), 0)
+        self.assertEqual(len(crossfade_concat([np.zeros(0)], 100)), 0)
+
+    def test_blend_is_linear(self):
+        result = crossfade_concat([np.ones(10), np.zeros(10)], overlap_samples=5)
+        np.testing.assert_allclose(result[5:10], [1.0, 0.75, 0.5, 0.25, 0.0])
+        np.testing.assert_array_equal(result[:5], np.ones(5))
+        np.testing.assert_array_equal(result[10:], np.zeros(5))
+
+    def test_streaming_matches_concat(self):
+        rng = np.random.default_rng(0)
+        waveforms = [rng.standard_normal(n).astype(np.float32) for n in (400, 0, 120, 900)]
+        crossfader = Crossfader(64)
+        streamed = [crossfader.push(waveform) for waveform in waveforms]
+        streamed.append(crossfader.flush())
+        np.testing.assert_allclose(np.concatenate(streamed), crossfade_concat(waveforms, 64))
+
+    def test_push_holds_back_overlap(self):
+        crossfader = Crossfader(100)
+        self.assertEqual(len(crossfader.push(np.ones(1000))), 900)
+        self.assertEqual(len(crossfader.push(np.ones(500))), 400)
+        self.assertEqual(len(crossfader.flush()), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
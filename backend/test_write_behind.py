@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the write-behind store wrapper (storage/write_behind.py)
+Runs without a server: python test_write_behind.py
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from storage.tinydb_store import TinyDBStore
+from storage.write_behind import WriteBehindStore
+
+
+class FlakyStore:
+    """Delegates to a real store but fails inserts of the message ids in `fail_ids`"""
+
+    def __init__(self, store):
+        self.store = store
+        self.name = store.name
+        self.fail_ids = set()
+
+    def insert_messages(self, messages):
+        failing = [m['id'] for m in messages if m['id'] in self.fail_ids]
+        if failing:
+            raise IOError(f"disk error for {failing}")
+        self.store.insert_messages(messages)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def make_message(message_id, conversation_id='c1', timestamp=None):
+    return {
+        'id': message_id,
+        'conversation_id': conversation_id,
+        'role': 'user',
+        'content': f'nội dung {message_id}',
+        'timestamp': timestamp or f'2024-01-01T00:00:{message_id[-2:]}'
+    }
+
+
+class WriteBehindStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="write_behind_test_")
+        self.dead_letter_path = os.path.join(self.directory, "dead_letters.ndjson")
+        self.flaky = FlakyStore(TinyDBStore(os.path.join(self.directory, "conversations.json"),
+                                            os.path.join(self.directory, "messages.json")))
+        self.store = self.open_store()
+        self.store.insert_conversation({'id': 'c1', 'title': 't', 'created_at': '2024-01-01T00:00:00',
+                                        'updated_at': '2024-01-01T00:00:00', 'message_count': 0})
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open_store(self):
+        # Long flush interval: the tests flush explicitly
+        return WriteBehindStore(self.flaky, flush_interval_ms=10_000, dead_letter_path=self.dead_letter_path)
+
+    def test_pending_writes_are_visible_before_flush(self):
+        self.store.insert_message(make_message('m01'))
+        self.assertIsNone(self.flaky.get_message('m01'))
+        self.assertEqual(self.store.get_message('m01')['id'], 'm01')
+        self.assertEqual(self.store.count_messages('c1'), 1)
+        self.assertEqual(self.store.get_conversation('c1')['message_count'], 1)
+        self.store.flush()
+        self.assertEqual(self.flaky.get_message('m01')['id'], 'm01')
+
+    def test_failed_record_does_not_drop_the_batch(self):
+        self.flaky.fail_ids = {'m02'}
+        self.store.insert_messages([make_message(f'm0{i}') for i in range(1, 5)])
+        self.store.flush()
+
+        self.assertEqual([m['id'] for m in self.flaky.get_messages('c1')], ['m01', 'm03', 'm04'])
+        self.assertEqual(self.store.stats['failed'], 1)
+        stats = self.store.dead_letter_stats()
+        self.assertEqual(stats['pending'], 1)
+        self.assertEqual(stats['recent'][0]['id'], 'm02')
+
+    def test_dead_letters_are_persisted_with_the_record(self):
+        self.flaky.fail_ids = {'m01'}
+        self.store.insert_message(make_message('m01'))
+        self.store.flush()
+
+        with open(self.dead_letter_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['op'], 'insert_message')
+        self.assertEqual(entries[0]['payload'], make_message('m01'))
+
+        # Survives a restart
+        self.store.close()
+        self.store = self.open_store()
+        self.assertEqual(self.store.dead_letter_stats()['pending'], 1)
+
+    def test_replay_writes_records_and_keeps_failures(self):
+        self.flaky.fail_ids = {'m01', 'm02'}
+        self.store.insert_messages([make_message('m01'), make_message('m02')])
+        self.store.flush()
+        self.assertEqual(self.store.dead_letter_stats()['pending'], 2)
+
+        self.flaky.fail_ids = {'m02'}
+        self.assertEqual(self.store.replay_dead_letters(), {'replayed': 1, 'skipped': 0, 'failed': 1})
+        self.assertIsNotNone(self.flaky.get_message('m01'))
+        self.assertEqual(self.store.dead_letter_stats()['pending'], 1)
+
+        self.flaky.fail_ids = set()
+        self.assertEqual(self.store.replay_dead_letters(), {'replayed': 1, 'skipped': 0, 'failed': 0})
+        self.assertFalse(os.path.exists(self.dead_letter_path))
+        self.assertEqual(self.flaky.count_messages('c1'), 2)
+
+    def test_replay_skips_records_already_in_the_store(self):
+        self.flaky.fail_ids = {'m01'}
+        self.store.insert_message(make_message('m01'))
+        self.store.flush()
+        self.flaky.store.insert_message(make_message('m01'))
+
+        self.assertEqual(self.store.replay_dead_letters(), {'replayed': 0, 'skipped': 1, 'failed': 0})
+        self.assertEqual(self.flaky.count_messages('c1'), 1)
+
+    def test_update_of_missing_conversation_is_dead_lettered(self):
+        self.store.flush()
+        self.store._enqueue('update_conversation', ('missing', {'title': 'x'}))
+        self.store.flush()
+        self.assertEqual(self.store.dead_letter_stats()['recent'][-1]['id'], 'missing')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark the CPU inference modes of the TTS model against the float32 baseline
+
+Each mode runs in its own subprocess so peak memory is measured separately.
+Reported per mode: load time, resident memory after load and at peak, and the
+real-time factor (synthesis time / audio duration, lower is better).
+
+Usage (from backend/):
+    python tools/benchmark_tts.py
+    python tools/benchmark_tts.py --modes baseline,int8 --threads 4 --repeat 5
+    python tools/benchmark_tts.py --text "Điều 1. Phạm vi điều chỉnh ..."
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Settings applied to TTSService for each mode
+MODES = {
+    "baseline": {"inference_mode": "no_grad", "quantize": "none", "compile_model": False},
+    "inference_mode": {"inference_mode": "inference_mode", "quantize": "none", "compile_model": False},
+    "int8": {"inference_mode": "inference_mode", "quantize": "int8", "compile_model": False},
+    "compile": {"inference_mode": "inference_mode", "quantize": "none", "compile_model": True},
+    "int8_compile": {"inference_mode": "inference_mode", "quantize": "int8", "compile_model": True},
+}
+
+DEFAULT_TEXTS = [
+    "Xin chào, tôi là trợ lý pháp luật.",
+    "Luật này quy định về xử phạt vi phạm hành chính và các biện pháp xử lý hành chính. "
+    "Vi phạm hành chính là hành vi có lỗi do cá nhân, tổ chức thực hiện, vi phạm quy định "
+    "của pháp luật về quản lý nhà nước mà không phải là tội phạm.",
+]
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux), falls back to the peak"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(mode: str, texts, repeat: int, threads: int) -> dict:
+    """Load the model with one mode's settings and time synthesis (runs in the worker process)"""
+    from services.tts_service import TTSService
+
+    service = TTSService(load_model=False)
+    for name, value in MODES[mode].items():
+        setattr(service, name, value)
+    service.num_threads = threads
+
+    baseline_rss = rss_mb()
+    start = time.perf_counter()
+    if not service.ensure_loaded():
+        return {"mode": mode, "error": "model could not be loaded"}
+    load_seconds = time.perf_counter() - start
+    loaded_rss = rss_mb()
+
+    # Warm-up pass: allocator growth and torch.compile graph capture are not counted
+    service.synthesize(texts[0])
+
+    sampling_rate = service.model.config.sampling_rate
+    synth_seconds = audio_seconds = 0.0
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            waveform = service.synthesize(text)
+            synth_seconds += time.perf_counter() - start
+            audio_seconds += len(waveform) / sampling_rate
+
+    return {
+        "mode": mode,
+        "load_seconds": round(load_seconds, 2),
+        "model_mb": round(loaded_rss - baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "audio_seconds": round(audio_seconds, 2),
+        "synth_seconds": round(synth_seconds, 2),
+        "rtf": round(synth_seconds / audio_seconds, 3) if audio_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare TTS CPU inference modes")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Comma-separated modes ({', '.join(MODES)})")
+    parser.add_argument("--text", action="append", help="Text to synthesize (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the texts")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    texts = args.text or DEFAULT_TEXTS
+
+    if args.worker:
+        print(json.dumps(run_mode(args.worker, texts, args.repeat, args.threads)))
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    results = []
+    for mode in modes:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", mode,
+                   "--repeat", str(args.repeat), "--threads", str(args.threads)]
+        for text in texts:
+            command += ["--text", text]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        lines = completed.stdout.strip().splitlines()
+        try:
+            result = json.loads(lines[-1])
+        except (IndexError, json.JSONDecodeError):
+            result = {"mode": mode, "error": (completed.stderr.strip().splitlines() or ["no output"])[-1]}
+        results.append(result)
+        print(f"  {mode}: {result.get('error') or 'done'}", file=sys.stderr)
+
+    baseline = next((r for r in results if r["mode"] == "baseline" and r.get("rtf")), None)
+    print(f"{'mode':<16}{'load s':>8}{'model MB':>10}{'peak MB':>9}{'RTF':>8}{'speedup':>9}")
+    for result in results:
+        if result.get("error"):
+            print(f"{result['mode']:<16}  error: {result['error']}")
+            continue
+        speedup = f"{baseline['rtf'] / result['rtf']:.2f}x" if baseline and result["rtf"] else "-"
+        print(f"{result['mode']:<16}{result['load_seconds']:>8}{result['model_mb']:>10}"
+              f"{result['peak_rss_mb']:>9}{result['rtf']:>8}{speedup:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Parity check between the PyTorch and ONNX Runtime TTS backends
+
+Synthesizes the same texts through both backends of TTSService with sampling
+noise turned off, so both paths are deterministic, and compares the waveforms:
+lengths must agree within one vocoder hop and the cosine similarity must reach
+the threshold. Exits with status 1 when any text fails.
+
+Usage (from backend/):
+    python tools/export_tts_onnx.py
+    python tools/check_tts_onnx_parity.py
+    python tools/check_tts_onnx_parity.py --onnx-dir models/mms-tts-vie-onnx --min-similarity 0.995
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config.config import Config
+
+# MMS-TTS upsamples each spectrogram frame to 256 samples
+HOP_SAMPLES = 256
+
+DEFAULT_TEXTS = [
+    "Xin chào, tôi là trợ lý pháp luật.",
+    "Điều 1. Phạm vi điều chỉnh.",
+    "Luật này quy định về xử phạt vi phạm hành chính và các biện pháp xử lý hành chính. "
+    "Vi phạm hành chính là hành vi có lỗi do cá nhân, tổ chức thực hiện, vi phạm quy định "
+    "của pháp luật về quản lý nhà nước mà không phải là tội phạm.",
+]
+
+
+def load_service(backend: str, onnx_dir: str):
+    """TTSService on the given backend with sampling noise disabled"""
+    from services.tts_service import TTSService
+
+    service = TTSService(load_model=False)
+    service.backend = backend
+    service.onnx_dir = onnx_dir
+    # Compare against the plain float32 model, not a quantized or compiled variant
+    service.quantize = "none"
+    service.compile_model = False
+    if not service.ensure_loaded():
+        raise SystemExit(f"{backend} backend could not be loaded")
+    # Both model classes read these attributes on every call
+    service.model.noise_scale = 0.0
+    service.model.noise_scale_duration = 0.0
+    return service
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Cosine similarity over the common prefix of two waveforms"""
+    n = min(len(a), len(b))
+    if not n:
+        return 0.0
+    a, b = a[:n].astype(np.float64), b[:n].astype(np.float64)
+    denom = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(np.dot(a, b) / denom) if denom else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare TTS output of the torch and onnx backends")
+    parser.add_argument("--onnx-dir", default=Config.TTS_ONNX_DIR, help="Directory of the ONNX export")
+    parser.add_argument("--text", action="append", help="Text to synthesize (repeatable)")
+    parser.add_argument("--max-length-diff", type=int, default=HOP_SAMPLES,
+                        help="Allowed waveform length difference in samples")
+    parser.add_argument("--min-similarity", type=float, default=0.99, help="Required cosine similarity")
+    args = parser.parse_args()
+    texts = args.text or DEFAULT_TEXTS
+
+    torch_service = load_service("torch", args.onnx_dir)
+    onnx_service = load_service("onnx", args.onnx_dir)
+    if torch_service.model.config.sampling_rate != onnx_service.model.config.sampling_rate:
+        raise SystemExit("Sampling rates differ: the export does not match the model")
+
+    failures = 0
+    print(f"{'torch len':>10}{'onnx len':>10}{'diff':>7}{'cosine':>9}  text")
+    for text in texts:
+        expected = torch_service.synthesize(text)
+        actual = onnx_service.synthesize(text)
+        length_diff = abs(len(expected) - len(actual))
+        similarity = cosine_similarity(expected, actual)
+        ok = length_diff <= args.max_length_diff and similarity >= args.min_similarity
+        failures += not ok
+        print(f"{len(expected):>10}{len(actual):>10}{length_diff:>7}{similarity:>9.4f}  "
+              f"{'ok  ' if ok else 'FAIL'} {text[:50]}")
+
+    if failures:
+        print(f"{failures}/{len(texts)} texts outside tolerance")
+        sys.exit(1)
+    print("ONNX backend matches PyTorch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Export the MMS-TTS (VITS) model to ONNX for the onnx TTS backend
+
+Writes model.onnx, the tokenizer files and tts_onnx.json to the output directory.
+The noise scales and speaking rate become graph inputs (defaults are stored in
+tts_onnx.json), and batch, token and sample axes are dynamic so the padded
+batches of TTSService run unchanged.
+
+Needs torch, transformers and onnx at export time only; serving needs onnxruntime.
+
+Usage (from backend/):
+    python tools/export_tts_onnx.py
+    python tools/export_tts_onnx.py --model facebook/mms-tts-vie --output models/mms-tts-vie-onnx
+    python tools/check_tts_onnx_parity.py --onnx-dir models/mms-tts-vie-onnx
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config.config import Config
+from services.tts_onnx import ONNX_MODEL_FILE, ONNX_METADATA_FILE, ONNX_INPUTS, ONNX_OUTPUTS
+
+DEFAULT_MODEL = "facebook/mms-tts-vie"
+DEFAULT_OPSET = 17
+SAMPLE_TEXT = "Xin chào, tôi là trợ lý pháp luật."
+
+
+def build_wrapper(model):
+    """Wrap the transformers model so the sampling settings are graph inputs instead of constants"""
+    import torch
+
+    class VitsExportWrapper(torch.nn.Module):
+        def __init__(self, vits):
+            super().__init__()
+            self.vits = vits
+
+        def forward(self, input_ids, attention_mask, noise_scale, noise_scale_duration, speaking_rate):
+            # VitsModel reads these attributes in forward(); tensors keep them in the traced graph
+            self.vits.noise_scale = noise_scale
+            self.vits.noise_scale_duration = noise_scale_duration
+            self.vits.speaking_rate = speaking_rate
+            outputs = self.vits(input_ids=input_ids, attention_mask=attention_mask)
+            return outputs.waveform, outputs.sequence_lengths
+
+    return VitsExportWrapper(model)
+
+
+def export(model_name: str, output_dir: str, opset: int) -> str:
+    """
+    Export the model and tokenizer
+
+    Args:
+        model_name (str): Hugging Face model id
+        output_dir (str): Destination directory
+        opset (int): ONNX opset version
+
+    Returns:
+        str: Path of the exported model.onnx
+    """
+    import torch
+    from transformers import VitsModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = VitsModel.from_pretrained(model_name).eval()
+    defaults = {
+        "noise_scale": float(model.noise_scale),
+        "noise_scale_duration": float(model.noise_scale_duration),
+        "speaking_rate": float(model.speaking_rate),
+    }
+
+    # Two sentences of different length so the padded batch path is traced
+    inputs = tokenizer([SAMPLE_TEXT, SAMPLE_TEXT[:12]], return_tensors="pt", padding=True)
+    sample_args = (
+        inputs["input_ids"],
+        inputs["attention_mask"],
+        torch.tensor(defaults["noise_scale"]),
+        torch.tensor(defaults["noise_scale_duration"]),
+        torch.tensor(defaults["speaking_rate"]),
+    )
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            build_wrapper(model),
+            sample_args,
+            model_path,
+            input_names=list(ONNX_INPUTS),
+            output_names=list(ONNX_OUTPUTS),
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "tokens"},
+                "attention_mask": {0: "batch", 1: "tokens"},
+                "waveform": {0: "batch", 1: "samples"},
+                "sequence_lengths": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+
+    tokenizer.save_pretrained(output_dir)
+    metadata = {
+        "model_name": model_name,
+        "sampling_rate": model.config.sampling_rate,
+        **defaults,
+        "opset": opset,
+        "exported_at": datetime.now().isoformat(),
+    }
+    with open(os.path.join(output_dir, ONNX_METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return model_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the TTS model to ONNX")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Hugging Face model id")
+    parser.add_argument("--output", default=Config.TTS_ONNX_DIR, help="Output directory")
+    parser.add_argument("--opset", type=int, default=DEFAULT_OPSET, help="ONNX opset version")
+    parser.add_argument("--skip-check", action="store_true", help="Do not validate the exported graph")
+    args = parser.parse_args()
+
+    model_path = export(args.model, args.output, args.opset)
+    if not args.skip_check:
+        import onnx
+        onnx.checker.check_model(model_path)
+    size_mb = os.path.getsize(model_path) / (1024 * 1024)
+    print(f"Exported {args.model} to {model_path} ({size_mb:.1f} MB)")
+    print(f"Serve it with TTS_BACKEND=onnx TTS_ONNX_DIR={args.output}")
+
+
+if __name__ == "__main__":
+    main()
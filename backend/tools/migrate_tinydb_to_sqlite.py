@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Migrate conversations and messages from the TinyDB JSON files to SQLite
+
+Safe to re-run: records whose id already exists in SQLite are skipped.
+
+Usage (from backend/):
+    python tools/migrate_tinydb_to_sqlite.py
+    python tools/migrate_tinydb_to_sqlite.py --conversations data/conversations.json \\
+        --messages data/messages.json --sqlite data/chat.db
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tinydb import TinyDB
+from config.config import Config
+from storage.sqlite_store import SQLiteStore
+
+
+def batched(records, size):
+    """Yield lists of at most `size` records"""
+    batch = []
+    for record in records:
+        batch.append(dict(record))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def migrate(conversations_path: str, messages_path: str, sqlite_path: str, batch_size: int = 1000):
+    """Copy every TinyDB record into SQLite in batched transactions"""
+    for path in (conversations_path, messages_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"TinyDB file not found: {path}")
+
+    store = SQLiteStore(sqlite_path)
+    conversations_db = TinyDB(conversations_path)
+    messages_db = TinyDB(messages_path)
+
+    try:
+        start = time.perf_counter()
+        conversation_count = inserted_conversations = 0
+        for batch in batched(conversations_db.all(), batch_size):
+            inserted_conversations += store.bulk_insert(conversations=batch)
+            conversation_count += len(batch)
+
+        message_count = inserted_messages = 0
+        for batch in batched(messages_db.all(), batch_size):
+            inserted_messages += store.bulk_insert(messages=batch)
+            message_count += len(batch)
+        elapsed = time.perf_counter() - start
+
+        print(f"✅ Migrated {inserted_conversations}/{conversation_count} conversations and "
+              f"{inserted_messages}/{message_count} messages to {sqlite_path} in {elapsed:.2f}s "
+              f"(existing records skipped)")
+
+        # Verify per-conversation message counts
+        expected_counts = Counter(m.get('conversation_id') for m in messages_db.all())
+        mismatches = [
+            conversation_id for conversation_id, expected in expected_counts.items()
+            if store.count_messages(conversation_id) < expected
+        ]
+        if mismatches:
+            print(f"⚠️  {len(mismatches)} conversations have fewer messages in SQLite than in TinyDB")
+    finally:
+        conversations_db.close()
+        messages_db.close()
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate TinyDB JSON files to SQLite")
+    parser.add_argument("--conversations", default=Config.CONVERSATIONS_DB, help="TinyDB conversations file")
+    parser.add_argument("--messages", default=Config.MESSAGES_DB, help="TinyDB messages file")
+    parser.add_argument("--sqlite", default=Config.SQLITE_DB, help="Target SQLite database")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Records per transaction")
+    args = parser.parse_args()
+
+    migrate(args.conversations, args.messages, args.sqlite, args.batch_size)
+    print("Set DB_BACKEND=sqlite to use the migrated database.")
+
+
+if __name__ == "__main__":
+    main()
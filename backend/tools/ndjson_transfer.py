@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Export conversations with their messages to NDJSON, or import such a file
+
+Both directions stream records, so memory stays flat regardless of dataset size.
+Import is safe to re-run: records whose id already exists are skipped.
+Files ending in .gz are compressed/decompressed transparently; "-" means stdout/stdin.
+
+Usage (from backend/):
+    python tools/ndjson_transfer.py export backup.ndjson.gz
+    python tools/ndjson_transfer.py export one.ndjson --conversation <id>
+    python tools/ndjson_transfer.py import backup.ndjson.gz --batch-size 2000
+"""
+import os
+import sys
+import gzip
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database import db_manager
+from storage.ndjson_transfer import export_ndjson, import_ndjson
+
+
+def open_file(path: str, mode: str):
+    """Open a text file for reading/writing, gzip-compressed if the name ends in .gz"""
+    if path == "-":
+        return sys.stdout if "w" in mode else sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def export_file(path: str, conversation_ids=None):
+    """Write every (or the selected) conversation to an NDJSON file"""
+    stats = {}
+    output = open_file(path, "w")
+    try:
+        output.writelines(export_ndjson(db_manager, conversation_ids, stats=stats))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"✅ Exported {stats['conversations']} conversations and {stats['messages']} messages "
+          f"in {stats['elapsed_seconds']}s ({stats['records_per_sec']} records/s)", file=sys.stderr)
+
+
+def import_file(path: str, batch_size: int) -> int:
+    """Import an NDJSON file; returns the number of invalid lines"""
+    source = open_file(path, "r")
+    try:
+        stats = import_ndjson(db_manager, source, batch_size=batch_size)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(f"✅ Read {stats['conversations']} conversations and {stats['messages']} messages: "
+          f"{stats['inserted']} inserted, {stats['skipped']} already existed "
+          f"in {stats['elapsed_seconds']}s ({stats['records_per_sec']} records/s)", file=sys.stderr)
+    if stats["invalid"]:
+        print(f"⚠️  {stats['invalid']} invalid lines skipped", file=sys.stderr)
+        for error in stats["errors"]:
+            print(f"   line {error['line']}: {error['error']}", file=sys.stderr)
+    return stats["invalid"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream conversations to/from NDJSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export conversations and messages")
+    export_parser.add_argument("output", help="Output file (.ndjson, .ndjson.gz or - for stdout)")
+    export_parser.add_argument("--conversation", action="append", help="Only export this conversation id (repeatable)")
+
+    import_parser = subparsers.add_parser("import", help="Import an NDJSON export")
+    import_parser.add_argument("input", help="Input file (.ndjson, .ndjson.gz or - for stdin)")
+    import_parser.add_argument("--batch-size", type=int, default=1000, help="Records per bulk insert")
+    args = parser.parse_args()
+
+    invalid = 0
+    try:
+        if args.command == "export":
+            export_file(args.output, args.conversation)
+        else:
+            invalid = import_file(args.input, args.batch_size)
+    finally:
+        db_manager.close_all()
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Recompute conversation aggregates (message_count, last_message_at, total_tokens)
+from the stored messages. Run offline (server stopped) if the counters drift.
+
+Usage (from backend/):
+    python tools/repair_conversation_stats.py            # repair every conversation
+    python tools/repair_conversation_stats.py --dry-run  # only report drift
+    python tools/repair_conversation_stats.py --conversation <id>
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from database import db_manager
+from storage.aggregates import AGGREGATE_FIELDS, compute_aggregates
+
+
+def repair(conversation_ids=None, dry_run=False) -> int:
+    """Recompute aggregates; returns the number of conversations that drifted"""
+    if conversation_ids:
+        conversations = [c for c in (db_manager.get_conversation(i) for i in conversation_ids) if c]
+    else:
+        conversations = db_manager.list_conversations()
+
+    drifted = 0
+    for conversation in conversations:
+        # Read archived conversations straight from their archive file instead of rehydrating them
+        expected = compute_aggregates(list(db_manager.iter_conversation_messages(conversation['id'])))
+        current = {field: conversation.get(field) for field in AGGREGATE_FIELDS}
+        if current == expected:
+            continue
+
+        drifted += 1
+        print(f"{'Drift' if dry_run else 'Repaired'} {conversation['id']}: {current} -> {expected}")
+        if not dry_run:
+            db_manager.update_conversation(conversation['id'], expected)
+
+    print(f"✅ Checked {len(conversations)} conversations, {drifted} "
+          f"{'drifted' if dry_run else 'repaired'}")
+    return drifted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute conversation aggregates from messages")
+    parser.add_argument("--conversation", action="append", help="Only repair this conversation id (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+    args = parser.parse_args()
+
+    try:
+        drifted = repair(args.conversation, args.dry_run)
+    finally:
+        db_manager.close_all()
+    sys.exit(1 if args.dry_run and drifted else 0)
+
+
+if __name__ == "__main__":
+    main()
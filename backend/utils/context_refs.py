@@ -0,0 +1,124 @@
+"""
+Compact references to the document chunks used as RAG context
+Messages store {chunk_id, page, score} instead of the chunk text; the text is
+resolved from the live index when a client asks for it
+"""
+import re
+import hashlib
+from typing import List, Dict, Any, Optional, Callable, Iterable
+
+# Chunks produced by extract_chunks_from_pdf start with "[Page N] "
+_PAGE_PATTERN = re.compile(r"^\[Page (\d+)\]")
+
+CONTEXT_REFS_FIELD = "context_refs"
+CONTEXT_SNIPPETS_FIELD = "context_snippets"
+
+
+def chunk_id(chunk: str) -> str:
+    """
+    Stable id of a chunk, derived from its content
+
+    The same PDF always yields the same ids, so references stay valid across
+    index rebuilds and restarts.
+
+    Args:
+        chunk (str): Chunk text
+
+    Returns:
+        str: 16 hex characters of the SHA-1 of the text
+    """
+    return hashlib.sha1(chunk.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_page(chunk: str) -> Optional[int]:
+    """
+    Page number from the "[Page N]" prefix of a chunk
+
+    Args:
+        chunk (str): Chunk text
+
+    Returns:
+        Optional[int]: Page number, None if the chunk has no prefix
+    """
+    match = _PAGE_PATTERN.match(chunk or "")
+    return int(match.group(1)) if match else None
+
+
+def make_context_ref(chunk: str, score: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Build the stored reference for a chunk
+
+    Args:
+        chunk (str): Chunk text
+        score (float, optional): Retrieval score of the chunk
+
+    Returns:
+        Dict[str, Any]: {"chunk_id", "page", "score"}
+    """
+    return {
+        "chunk_id": chunk_id(chunk),
+        "page": chunk_page(chunk),
+        "score": round(score, 4) if score is not None else None
+    }
+
+
+def compact_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replace embedded context snippets by references
+
+    Messages written before references existed (or imported from old exports)
+    carry the full chunk texts; they are converted on write. Returns the message
+    unchanged when there is nothing to compact, otherwise a copy.
+
+    Args:
+        message (Dict[str, Any]): Message record
+
+    Returns:
+        Dict[str, Any]: Message whose metadata holds context_refs only
+    """
+    metadata = message.get("metadata")
+    if not isinstance(metadata, dict) or CONTEXT_SNIPPETS_FIELD not in metadata:
+        return message
+
+    metadata = dict(metadata)
+    snippets = metadata.pop(CONTEXT_SNIPPETS_FIELD) or []
+    if CONTEXT_REFS_FIELD not in metadata:
+        metadata[CONTEXT_REFS_FIELD] = [make_context_ref(snippet) for snippet in snippets if isinstance(snippet, str)]
+    return {**message, "metadata": metadata}
+
+
+def resolve_context_snippets(messages: Iterable[Dict[str, Any]],
+                             resolver: Callable[[List[str]], Dict[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Attach context_snippets to messages that hold context references
+
+    Chunk ids of all messages are resolved in one call. Messages are copied, never
+    modified in place, because stores may return their cached records. A chunk that
+    is no longer in the index (document replaced) resolves to None.
+
+    Args:
+        messages (Iterable[Dict[str, Any]]): Message records
+        resolver (Callable): Maps a list of chunk ids to {chunk_id: text}
+
+    Returns:
+        List[Dict[str, Any]]: Messages with metadata.context_snippets filled in
+    """
+    messages = list(messages)
+    wanted = {
+        ref.get("chunk_id")
+        for message in messages
+        for ref in ((message.get("metadata") or {}).get(CONTEXT_REFS_FIELD) or [])
+    }
+    if not wanted:
+        return messages
+
+    texts = resolver(sorted(wanted))
+    resolved = []
+    for message in messages:
+        metadata = message.get("metadata") or {}
+        refs = metadata.get(CONTEXT_REFS_FIELD)
+        if refs:
+            metadata = {**metadata, CONTEXT_SNIPPETS_FIELD: [texts.get(ref.get("chunk_id")) for ref in refs]}
+            message = {**message, "metadata": metadata}
+        resolved.append(message)
+    return resolved
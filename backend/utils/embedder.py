@@ -4,12 +4,46 @@ Enhanced version from Law_chatbot_project_workshop3
 """
 import chromadb
 import os
+import re
+import math
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from openai import AzureOpenAI
+from config.config import Config
 
 logger = logging.getLogger(__name__)
 
+class HashingEmbeddingFunction:
+    """
+    Deterministic local embedding (signed feature hashing of unigrams and bigrams)
+    Used for offline benchmarks and tests; needs no network or model download
+    """
+    
+    _token_pattern = re.compile(r"\w+", re.UNICODE)
+    
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+    
+    def _features(self, text: str) -> List[str]:
+        tokens = self._token_pattern.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    
+    def __call__(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        counts: Dict[str, int] = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+        
+        for feature, count in counts.items():
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimensions] += sign * (1.0 + math.log(count))
+        
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
 class EmbeddingService:
     """Service for creating and managing text embeddings"""
     
@@ -18,7 +52,14 @@ class EmbeddingService:
         self.client = None
         self.collection = None
         self.collection_name = "law_documents"
-        self._initialize_client()
+        self.max_results = Config.RAG_MAX_SEARCH_RESULTS
+        self.embedding_function = None  # Local embedding used instead of the API when set
+        
+        if Config.EMBEDDING_BACKEND == "hashing":
+            self.embedding_function = HashingEmbeddingFunction()
+            logger.info("✅ Using local hashing embeddings")
+        else:
+            self._initialize_client()
     
     def _initialize_client(self):
         """Initialize Azure OpenAI client for embeddings"""
@@ -52,6 +93,9 @@ class EmbeddingService:
             Optional[List[float]]: Embedding vector or None if failed
         """
         try:
+            if self.embedding_function:
+                return self.embedding_function(text)
+            
             if not self.client:
                 logger.error("Embedding client not initialized")
                 return None
@@ -67,12 +111,15 @@ class EmbeddingService:
             logger.error(f"Error creating embedding: {e}")
             return None
     
-    def build_index(self, chunks: List[str]) -> Optional[chromadb.Collection]:
+    def build_index(self, chunks: List[str], collection_name: Optional[str] = None,
+                    progress_callback: Optional[Callable[[float, str], None]] = None) -> Optional[chromadb.Collection]:
         """
         Build vector index from text chunks
         
         Args:
             chunks (List[str]): List of text chunks
+            collection_name (str, optional): Collection to build, defaults to the service collection name
+            progress_callback (Callable, optional): Called with (fraction, message) while embedding
             
         Returns:
             Optional[chromadb.Collection]: ChromaDB collection or None if failed
@@ -81,21 +128,17 @@ class EmbeddingService:
             if not chunks:
                 logger.warning("No chunks provided for indexing")
                 return None
+            
+            collection_name = collection_name or self.collection_name
                 
             # Initialize ChromaDB client
             chroma_client = chromadb.Client()
             
             # Delete existing collection if it exists
-            try:
-                existing_collections = [c.name for c in chroma_client.list_collections()]
-                if self.collection_name in existing_collections:
-                    chroma_client.delete_collection(self.collection_name)
-                    logger.info(f"Deleted existing collection: {self.collection_name}")
-            except Exception as e:
-                logger.warning(f"Could not delete existing collection: {e}")
+            self.drop_collection(collection_name)
             
             # Create new collection
-            collection = chroma_client.create_collection(self.collection_name)
+            collection = chroma_client.create_collection(collection_name)
             
             # Create embeddings for all chunks
             logger.info(f"Creating embeddings for {len(chunks)} chunks...")
@@ -110,6 +153,9 @@ class EmbeddingService:
                         embeddings.append(embedding)
                         valid_chunks.append(chunk)
                         valid_ids.append(str(i))
+                
+                if progress_callback:
+                    progress_callback((i + 1) / len(chunks), f"Embedded {i + 1}/{len(chunks)} chunks")
             
             if not embeddings:
                 logger.error("No valid embeddings created")
@@ -122,14 +168,34 @@ class EmbeddingService:
                 ids=valid_ids
             )
             
-            self.collection = collection
-            logger.info(f"✅ Built index with {len(embeddings)} embeddings")
+            logger.info(f"✅ Built index '{collection_name}' with {len(embeddings)} embeddings")
             return collection
             
         except Exception as e:
             logger.error(f"Error building index: {e}")
             return None
     
+    def drop_collection(self, collection_name: str) -> bool:
+        """
+        Delete a collection if it exists
+        
+        Args:
+            collection_name (str): Name of the collection to delete
+            
+        Returns:
+            bool: True if a collection was deleted
+        """
+        try:
+            chroma_client = chromadb.Client()
+            existing_collections = [c if isinstance(c, str) else c.name for c in chroma_client.list_collections()]
+            if collection_name in existing_collections:
+                chroma_client.delete_collection(collection_name)
+                logger.info(f"Deleted collection: {collection_name}")
+                return True
+        except Exception as e:
+            logger.warning(f"Could not delete collection {collection_name}: {e}")
+        return False
+    
     def search(self, query: str, collection: Optional[chromadb.Collection] = None, k: int = 5) -> List[str]:
         """
         Search for relevant documents
@@ -142,6 +208,21 @@ class EmbeddingService:
         Returns:
             List[str]: List of relevant document chunks
         """
+        return [document for document, _ in self.search_with_scores(query, collection, k)]
+    
+    def search_with_scores(self, query: str, collection: Optional[chromadb.Collection] = None,
+                           k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Search for relevant documents, keeping the vector distance of each result
+        
+        Args:
+            query (str): Search query
+            collection (Optional[chromadb.Collection]): Collection to search in
+            k (int): Number of results to return
+            
+        Returns:
+            List[Tuple[str, float]]: (chunk, distance) pairs, closest first
+        """
         try:
             if not query.strip():
                 return []
@@ -160,14 +241,15 @@ class EmbeddingService:
             # Perform search
             results = search_collection.query(
                 query_embeddings=[query_embedding],
-                n_results=min(k, 10)  # Limit max results
+                n_results=min(k, self.max_results)  # Limit max results
             )
             
             # Extract documents from results
             if "documents" in results and results["documents"]:
                 documents = results["documents"][0]
+                distances = (results.get("distances") or [[]])[0] or [None] * len(documents)
                 logger.info(f"Found {len(documents)} relevant documents")
-                return documents
+                return list(zip(documents, distances))
             
             return []
             
@@ -189,7 +271,7 @@ class EmbeddingService:
             count = self.collection.count()
             return {
                 "status": "Collection loaded",
-                "name": self.collection_name,
+                "name": self.collection.name,
                 "document_count": count
             }
             
@@ -8,8 +8,13 @@ from services.rag_service import rag_service
 
 logger = logging.getLogger(__name__)
 
-def initialize_rag_service():
-    """Initialize RAG service with default documents"""
+def initialize_rag_service(progress_callback=None):
+    """
+    Initialize RAG service with default documents
+    
+    Args:
+        progress_callback (Callable, optional): Called with (fraction, message) while indexing
+    """
     try:
         # Path to law documents (corrected path)
         pdf_path = os.path.join(
@@ -22,7 +27,7 @@ def initialize_rag_service():
         
         if os.path.exists(pdf_path):
             logger.info("🔄 Loading law documents for RAG service...")
-            result = rag_service.load_documents(pdf_path)
+            result = rag_service.load_documents(pdf_path, progress_callback)
             
             if result["success"]:
                 logger.info(f"✅ RAG service initialized with {result['chunks_count']} document chunks")
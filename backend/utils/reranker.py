@@ -0,0 +1,273 @@
+"""
+Reranking utilities for RAG system
+Re-scores oversampled search candidates before prompt building
+"""
+import math
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens (Vietnamese diacritics are kept)
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        List[str]: Tokens
+    """
+    return _TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class LexicalScorer:
+    """BM25 scorer computed over the candidate set, pure Python and CPU-cheap"""
+
+    name = "lexical"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        """
+        Score all documents against the query in one pass
+
+        Args:
+            query (str): Search query
+            documents (List[str]): Candidate documents
+
+        Returns:
+            List[float]: One score per document
+        """
+        query_terms = set(tokenize(query))
+        if not documents or not query_terms:
+            return [0.0] * len(documents)
+
+        doc_tokens = [tokenize(doc) for doc in documents]
+        avg_len = sum(len(tokens) for tokens in doc_tokens) / len(doc_tokens) or 1.0
+
+        # Document frequency inside the candidate set
+        doc_freq = Counter()
+        for tokens in doc_tokens:
+            doc_freq.update(query_terms.intersection(tokens))
+
+        n_docs = len(documents)
+        scores = []
+        for tokens in doc_tokens:
+            term_freq = Counter(tokens)
+            length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / avg_len)
+            score = 0.0
+            for term in query_terms:
+                tf = term_freq.get(term, 0)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + length_norm)
+            scores.append(score)
+        return scores
+
+
+class CrossEncoderScorer:
+    """Cross-encoder scorer loaded from a local model directory (no network access)"""
+
+    name = "cross_encoder"
+
+    def __init__(self, model_path: str, max_length: int = 512):
+        self.model_path = model_path
+        self.max_length = max_length
+        self.tokenizer = None
+        self.model = None
+        self._load_model()
+
+    def _load_model(self):
+        """Load tokenizer and model from disk, raising if unavailable"""
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path, local_files_only=True)
+        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path, local_files_only=True)
+        self.model.eval()
+        self._torch = torch
+        logger.info(f"✅ Cross-encoder reranker loaded from {self.model_path}")
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        """
+        Score (query, document) pairs in a single padded batch
+
+        Args:
+            query (str): Search query
+            documents (List[str]): Candidate documents
+
+        Returns:
+            List[float]: One score per document
+        """
+        if not documents:
+            return []
+
+        inputs = self.tokenizer(
+            [query] * len(documents),
+            documents,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt"
+        )
+        with self._torch.inference_mode():
+            logits = self.model(**inputs).logits
+
+        # Single-logit models output relevance directly, multi-class models use the last class
+        scores = logits[:, -1] if logits.shape[-1] > 1 else logits.squeeze(-1)
+        return scores.float().cpu().tolist()
+
+
+class Reranker:
+    """Batched reranking stage between vector search and prompt building"""
+
+    def __init__(self, model_path: Optional[str] = None, batch_size: Optional[int] = None):
+        """
+        Initialize the reranker
+
+        Args:
+            model_path (str, optional): Local cross-encoder directory, lexical scorer is used if missing
+            batch_size (int, optional): Number of candidates scored per batch
+        """
+        self.model_path = model_path if model_path is not None else Config.RAG_RERANK_MODEL_PATH
+        self.batch_size = batch_size or Config.RAG_RERANK_BATCH_SIZE
+        self.scorer = None
+        self.fallback_scorer = LexicalScorer()
+        self._load_lock = threading.Lock()
+
+    def warm_up(self):
+        """
+        Load the configured scorer ahead of the first request
+
+        Returns:
+            str: Name of the scorer that will be used
+        """
+        with self._load_lock:
+            return self._load_scorer().name
+
+    def _load_scorer(self):
+        """Load the configured scorer once (caller holds the load lock), falling back to lexical scoring"""
+        if self.scorer is None:
+            if self.model_path:
+                try:
+                    self.scorer = CrossEncoderScorer(self.model_path)
+                except Exception as e:
+                    logger.warning(f"⚠️  Could not load cross-encoder from {self.model_path}: {e}")
+                    logger.warning("Falling back to lexical reranking")
+                    self.scorer = self.fallback_scorer
+            else:
+                self.scorer = self.fallback_scorer
+        return self.scorer
+
+    def _get_scorer(self):
+        """Scorer for a request; lexical while the cross-encoder is still loading elsewhere (e.g. warm-up)"""
+        if self.scorer is not None:
+            return self.scorer
+        if not self._load_lock.acquire(blocking=False):
+            return self.fallback_scorer
+        try:
+            return self._load_scorer()
+        finally:
+            self._load_lock.release()
+
+    def _score_within_budget(self, scorer, query: str, candidates: List[str],
+                             start: float, budget_ms: float) -> List[Tuple[float, int]]:
+        """Score candidates batch by batch until the budget is spent"""
+        scored: List[Tuple[float, int]] = []
+        for offset in range(0, len(candidates), self.batch_size):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if offset and elapsed_ms >= budget_ms:
+                logger.warning(
+                    f"Rerank budget of {budget_ms}ms exhausted after {offset}/{len(candidates)} candidates"
+                )
+                break
+
+            batch = candidates[offset:offset + self.batch_size]
+            batch_scores = scorer.score(query, batch)
+            scored.extend((score, offset + i) for i, score in enumerate(batch_scores))
+        return scored
+
+    def rerank(self, query: str, candidates: List[str], top_n: int = 5,
+               budget_ms: Optional[float] = None) -> List[str]:
+        """
+        Re-order candidates by relevance and keep the best few
+
+        Candidates are scored batch by batch; once the latency budget is spent the
+        remaining candidates keep their original vector-search order behind the scored ones.
+        Loading the cross-encoder counts against the budget: when it takes the whole
+        budget, this request is scored lexically instead.
+
+        Args:
+            query (str): Original user query
+            candidates (List[str]): Oversampled candidates in vector-search order
+            top_n (int): Number of results to keep
+            budget_ms (float, optional): Latency budget in milliseconds
+
+        Returns:
+            List[str]: Reranked top candidates
+        """
+        return [candidate for candidate, _ in self.rerank_with_scores(query, candidates, top_n, budget_ms)]
+
+    def rerank_with_scores(self, query: str, candidates: List[str], top_n: int = 5,
+                           budget_ms: Optional[float] = None) -> List[Tuple[str, Optional[float]]]:
+        """
+        Rerank like rerank(), keeping the relevance score of each result
+
+        Returns:
+            List[Tuple[str, Optional[float]]]: (candidate, score) pairs, score is None
+            for candidates left unscored when the budget ran out
+        """
+        if not candidates:
+            return []
+
+        if budget_ms is None:
+            budget_ms = Config.RAG_RERANK_BUDGET_MS
+
+        start = time.perf_counter()
+        scorer = self._get_scorer()
+        load_ms = (time.perf_counter() - start) * 1000
+        if scorer is not self.fallback_scorer and load_ms >= budget_ms:
+            # Loading the model on this request used up the budget: the lexical scorer stays cheap
+            logger.warning(f"Rerank budget of {budget_ms}ms spent loading {scorer.name}, using lexical scorer")
+            scorer = self.fallback_scorer
+            start = time.perf_counter()
+        try:
+            scored = self._score_within_budget(scorer, query, candidates, start, budget_ms)
+        except Exception as e:
+            if scorer is self.fallback_scorer:
+                logger.error(f"Error reranking with {scorer.name}: {e}")
+                return [(candidate, None) for candidate in candidates[:top_n]]
+            logger.error(f"Error reranking with {scorer.name}, using lexical scorer: {e}")
+            scorer = self.fallback_scorer
+            scored = self._score_within_budget(scorer, query, candidates, start, budget_ms)
+
+        # Ties keep the original search rank
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        scores = {index: float(score) for score, index in scored}
+        scored_indices = set(scores)
+        order = [index for _, index in scored] + [
+            index for index in range(len(candidates)) if index not in scored_indices
+        ]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"Reranked {len(scored)}/{len(candidates)} candidates with {scorer.name} in {elapsed_ms:.1f}ms"
+        )
+        return [(candidates[index], scores.get(index)) for index in order[:top_n]]
+
+
+# Global instance
+reranker = Reranker()
@@ -0,0 +1,22 @@
+"""
+Statistics helpers shared by the benchmarks and the runtime metrics endpoints
+"""
+import math
+from typing import Iterable
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """
+    Nearest-rank percentile
+
+    Args:
+        values (Iterable[float]): Samples in any order
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: Smallest sample with at least pct% of the samples at or below it, 0.0 without samples
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
@@ -0,0 +1,206 @@
+"""
+Text segmentation and waveform stitching for long-form TTS
+Long texts are synthesized sentence by sentence and joined with short crossfades
+"""
+import re
+import struct
+from typing import List, Iterable, Iterator
+
+import numpy as np
+
+# Sentence ends (Vietnamese uses the same punctuation) and line breaks
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?…;:])\s+|\s*\n+\s*")
+# Clause breaks used to split sentences that are still too long
+_CLAUSE_BREAK = re.compile(r"(?<=[,–—])\s+")
+
+
+def _split_long(piece: str, max_chars: int) -> List[str]:
+    """Split a piece longer than max_chars at commas, then between words"""
+    if len(piece) <= max_chars:
+        return [piece]
+
+    parts: List[str] = []
+    for clause in _CLAUSE_BREAK.split(piece):
+        if len(clause) <= max_chars:
+            parts.append(clause)
+            continue
+        # No punctuation left: pack whole words up to max_chars, cutting words that are longer on their own
+        current = ""
+        for word in clause.split():
+            while len(word) > max_chars:
+                if current:
+                    parts.append(current)
+                    current = ""
+                parts.append(word[:max_chars])
+                word = word[max_chars:]
+            if current and len(current) + 1 + len(word) > max_chars:
+                parts.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            parts.append(current)
+
+    # Re-join neighbouring clauses that fit together
+    packed: List[str] = []
+    for part in parts:
+        if packed and len(packed[-1]) + 1 + len(part) <= max_chars:
+            packed[-1] = f"{packed[-1]} {part}"
+        else:
+            packed.append(part)
+    return packed
+
+
+def split_into_segments(text: str, max_chars: int = 300, min_chars: int = 20) -> List[str]:
+    """
+    Split text into sentence-sized segments for synthesis
+
+    Segments end at sentence punctuation or line breaks; sentences longer than
+    max_chars are split at clause boundaries, and fragments shorter than
+    min_chars (headings, list markers) are merged into the next segment.
+
+    Args:
+        text (str): Text to synthesize
+        max_chars (int): Maximum characters per segment
+        min_chars (int): Fragments shorter than this are merged forward
+
+    Returns:
+        List[str]: Non-empty segments in reading order
+    """
+    pieces: List[str] = []
+    for sentence in _SENTENCE_BREAK.split(text or ""):
+        sentence = sentence.strip()
+        if sentence:
+            pieces.extend(_split_long(sentence, max_chars))
+
+    segments: List[str] = []
+    pending = ""
+    for piece in pieces:
+        if pending:
+            if len(pending) + 1 + len(piece) <= max_chars:
+                piece = f"{pending} {piece}"
+            else:
+                segments.append(pending)
+            pending = ""
+        if len(piece) < min_chars:
+            pending = piece
+        else:
+            segments.append(piece)
+    if pending:
+        if segments and len(segments[-1]) + 1 + len(pending) <= max_chars:
+            segments[-1] = f"{segments[-1]} {pending}"
+        else:
+            segments.append(pending)
+    return segments
+
+
+class Crossfader:
+    """Joins consecutive waveforms with a linear crossfade, emitting audio as soon as it is final"""
+
+    def __init__(self, overlap_samples: int):
+        """
+        Args:
+            overlap_samples (int): Length of each crossfade in samples
+        """
+        self.overlap = max(0, int(overlap_samples))
+        self._tail = None
+
+    def push(self, waveform: np.ndarray) -> np.ndarray:
+        """
+        Add the next waveform
+
+        Returns:
+            np.ndarray: Samples that are final; the last `overlap` samples are
+            held back to blend with the next waveform
+        """
+        waveform = np.asarray(waveform, dtype=np.float32)
+        if not len(waveform):
+            # Segments with no speakable text: keep the pending tail for the next waveform
+            return waveform
+        if self._tail is None:
+            ready = np.zeros(0, dtype=np.float32)
+            current = waveform
+        else:
+            n = min(self.overlap, len(self._tail), len(waveform))
+            if n:
+                fade = np.linspace(0.0, 1.0, n, dtype=np.float32)
+                blended = self._tail[len(self._tail) - n:] * (1.0 - fade) + waveform[:n] * fade
+                ready = np.concatenate([self._tail[:len(self._tail) - n], blended])
+                current = waveform[n:]
+            else:
+                ready = self._tail
+                current = waveform
+
+        keep = min(self.overlap, len(current))
+        if keep:
+            ready = np.concatenate([ready, current[:len(current) - keep]])
+            self._tail = current[len(current) - keep:]
+        else:
+            ready = np.concatenate([ready, current])
+            self._tail = current[:0]
+        return ready
+
+    def flush(self) -> np.ndarray:
+        """Return the held-back samples at the end of the stream"""
+        tail = self._tail if self._tail is not None else np.zeros(0, dtype=np.float32)
+        self._tail = None
+        return tail
+
+
+def crossfade_concat(waveforms: Iterable[np.ndarray], overlap_samples: int) -> np.ndarray:
+    """
+    Concatenate waveforms with linear crossfades between neighbours
+
+    Args:
+        waveforms (Iterable[np.ndarray]): Float waveforms in order
+        overlap_samples (int): Crossfade length in samples
+
+    Returns:
+        np.ndarray: Single float32 waveform
+    """
+    crossfader = Crossfader(overlap_samples)
+    parts = [crossfader.push(waveform) for waveform in waveforms]
+    parts.append(crossfader.flush())
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+
+def limit_peak(waveform: np.ndarray, peak: float = 0.95) -> np.ndarray:
+    """Scale a float waveform down only if it would exceed the given peak"""
+    max_val = float(np.max(np.abs(waveform))) if len(waveform) else 0.0
+    return waveform * (peak / max_val) if max_val > peak else waveform
+
+
+def pcm16_bytes(waveform: np.ndarray) -> bytes:
+    """Encode a float waveform in [-1, 1] as little-endian 16-bit PCM"""
+    return (np.clip(waveform, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def streaming_wav_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """
+    WAV header for a stream of unknown length
+
+    The RIFF and data sizes are set to the maximum value, which players treat as
+    "read until the end of the stream".
+
+    Args:
+        sample_rate (int): Samples per second
+        channels (int): Number of channels
+        bits_per_sample (int): Sample width in bits
+
+    Returns:
+        bytes: 44-byte PCM WAV header
+    """
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                sample_rate * block_align, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def iter_batches(items: List[str], batch_size: int) -> Iterator[List[str]]:
+    """Yield consecutive batches of at most batch_size items"""
+    batch_size = max(1, batch_size)
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
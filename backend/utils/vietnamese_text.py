@@ -0,0 +1,61 @@
+"""
+Vietnamese-aware text normalization for full-text search
+Folds diacritics (NFD decomposition, đ -> d) so "Luật" and "luat" match
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+_COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fold_diacritics(text: str) -> str:
+    """
+    Lowercase text and strip Vietnamese diacritics
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        str: Folded text, e.g. "Đường phố" -> "duong pho"
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return _COMBINING_MARKS.sub("", text)
+
+
+@lru_cache(maxsize=4096)
+def _fold_char(char: str) -> str:
+    folded = fold_diacritics(char)
+    return folded if len(folded) == 1 else char
+
+
+def fold_aligned(text: str) -> str:
+    """
+    Fold diacritics character by character so offsets match the original text
+
+    Slower than fold_diacritics; used to locate matches for snippets.
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        str: Folded text with the same length as the input
+    """
+    return "".join(_fold_char(char) for char in text) if text else ""
+
+
+def search_tokens(text: str) -> List[str]:
+    """
+    Split text into folded word tokens (Vietnamese syllables)
+
+    Args:
+        text (str): Input text
+
+    Returns:
+        List[str]: Folded tokens
+    """
+    return _TOKEN_PATTERN.findall(fold_diacritics(text))